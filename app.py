@@ -4,14 +4,16 @@ This script defines how the web application works and renders HTML templates.
 
 """
 
+import atexit
 import logging.config
 
-import yaml
-from flask import Flask
+from flask import Flask, Response
 from flask import render_template, request
 
+from src.batcher import InferenceBatcher
 from src.database import TweetManager
-from src.predict import predict
+from src.metrics import CONTENT_TYPE, REGISTRY
+from src.registry import ModelRegistry
 
 # Initialize the Flask application
 app = Flask(__name__, template_folder="app/templates", static_folder="app/static")
@@ -25,8 +27,27 @@ logging.config.fileConfig(app.config["LOGGING_CONFIG"])
 logger = logging.getLogger(app.config["APP_NAME"])
 logger.debug('Web app log')
 
-# Initialize the database session
-tweet_manager = TweetManager(app)
+# Initialize the database session, and insert the queued tweets on exit in write-behind mode
+tweet_manager = TweetManager(app, write_behind=app.config["DB_WRITE_BEHIND"],
+                             flush_size=app.config["DB_FLUSH_SIZE"],
+                             flush_interval=app.config["DB_FLUSH_INTERVAL"],
+                             max_queue_size=app.config["DB_MAX_QUEUE"])
+atexit.register(tweet_manager.close)
+
+# Load the model once, reload it when its artifacts change, and cache its predictions
+model_registry = ModelRegistry(app.config["MODEL_CONFIG"],
+                               check_interval=app.config["MODEL_RELOAD_INTERVAL"],
+                               cache_size=app.config["PREDICTION_CACHE_SIZE"],
+                               cache_ttl=app.config["PREDICTION_CACHE_TTL"])
+
+# Group predictions of concurrent requests into batched forward passes
+inference_batcher = InferenceBatcher(model_registry.predict_many,
+                                     max_batch_size=app.config["BATCH_MAX_SIZE"],
+                                     max_wait_ms=app.config["BATCH_MAX_WAIT_MS"])
+
+# Time the answers to posted tweets and count the failed ones, exposed at /metrics
+tweet_request_time = REGISTRY.stage("tweet_request")
+tweet_errors = REGISTRY.counter("tweet_errors_total", "Posted tweets answered with an error page")
 
 
 @app.route('/', methods=['GET', 'POST'])
@@ -39,22 +60,21 @@ def index():
 @app.route('/tweet', methods=['POST'])
 def tweet():
     """Collect user input, calculate prediction, and persist data to database."""
+    with tweet_request_time.timer():
+        return _tweet()
+
+
+def _tweet():
+    """Helper function to answer a posted tweet."""
     # Get user input
     tweet_content = request.form['tweet_content']
     logger.info("User entered '%s'", tweet_content)
 
-    # Load model configuration file
-    try:
-        with open(app.config["MODEL_CONFIG"], "r") as f:
-            config = yaml.load(f, Loader=yaml.FullLoader)
-            logger.info("Model configurations loaded from %s", app.config["MODEL_CONFIG"])
-    except FileNotFoundError:
-        logger.error("Cannot find configuration file from the path: %s", app.config["MODEL_CONFIG"])
-
     # Calculate prediction
     logger.info("Calculating predictions...")
-    prediction = predict(tweet_content, **config["predict"]["predict"])
-    logger.info("The predicted number of retweet is %s", prediction)
+    prediction, model_version = inference_batcher.predict(tweet_content)
+    logger.info("The predicted number of retweet is %s (model version %s)", prediction,
+                model_version)
 
     # Save user input and predicted retweets to database
     try:
@@ -63,8 +83,15 @@ def tweet():
     except Exception as e:
         logger.warning("Unable to add to database, error page returned. "
                        "Here is the original error: %s", e)
+        tweet_errors.inc()
         return render_template('error.html')
 
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Expose the serving metrics in the Prometheus text format."""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
 if __name__ == '__main__':
     app.run(debug=app.config["DEBUG"], port=app.config["PORT"], host=app.config["HOST"])
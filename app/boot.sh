@@ -1,3 +1,8 @@
 #!/usr/bin/env bash
 
-python3 app.py
\ No newline at end of file
+# Set APP_SERVER=asgi to serve the app asynchronously with uvicorn
+if [ "$APP_SERVER" = "asgi" ]; then
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+else
+    python3 app.py
+fi
@@ -0,0 +1,53 @@
+"""ASGI entry point for running the model asynchronously.
+
+This script serves the same pages as app.py with an asyncio server, e.g.
+``uvicorn asgi:app --host 0.0.0.0 --port 5000``. Predictions are batched on a worker thread and
+tweets are saved to the database in the background.
+
+"""
+
+import logging.config
+
+from config import flaskconfig
+from src.batcher import InferenceBatcher
+from src.database import TweetManager
+from src.registry import ModelRegistry
+from src.serving import TweetService
+
+# Set up the logger the same way as the Flask app
+logging.config.fileConfig(flaskconfig.LOGGING_CONFIG)
+logger = logging.getLogger(flaskconfig.APP_NAME)
+
+# Load the model once, reload it when its artifacts change, and cache its predictions
+model_registry = ModelRegistry(flaskconfig.MODEL_CONFIG,
+                               check_interval=flaskconfig.MODEL_RELOAD_INTERVAL,
+                               cache_size=flaskconfig.PREDICTION_CACHE_SIZE,
+                               cache_ttl=flaskconfig.PREDICTION_CACHE_TTL)
+
+# Group predictions of concurrent requests into batched forward passes, and reject requests
+# once too many are waiting
+inference_batcher = InferenceBatcher(model_registry.predict_many,
+                                     max_batch_size=flaskconfig.BATCH_MAX_SIZE,
+                                     max_wait_ms=flaskconfig.BATCH_MAX_WAIT_MS,
+                                     max_queue_size=flaskconfig.ASYNC_MAX_PENDING)
+
+# Save tweets through a pooled SQLAlchemy engine from the service's database thread
+tweet_manager = TweetManager(engine_string=flaskconfig.SQLALCHEMY_DATABASE_URI,
+                             write_behind=flaskconfig.DB_WRITE_BEHIND,
+                             flush_size=flaskconfig.DB_FLUSH_SIZE,
+                             flush_interval=flaskconfig.DB_FLUSH_INTERVAL,
+                             max_queue_size=flaskconfig.DB_MAX_QUEUE,
+                             engine_options=flaskconfig.SQLALCHEMY_ENGINE_OPTIONS)
+
+# SQLite allows a single writer at a time, other databases get one writer per pooled connection
+sqlite = flaskconfig.SQLALCHEMY_DATABASE_URI.startswith('sqlite')
+db_workers = 1 if sqlite else flaskconfig.DB_POOL_SIZE
+
+app = TweetService(inference_batcher, tweet_manager, template_folder="app/templates",
+                   static_folder="app/static", db_workers=db_workers,
+                   max_pending_writes=flaskconfig.ASYNC_MAX_PENDING_WRITES)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host=flaskconfig.HOST, port=flaskconfig.PORT)
@@ -8,6 +8,17 @@ HOST = "0.0.0.0"
 SQLALCHEMY_ECHO = False  # If true, SQL for queries made will be printed
 MAX_ROWS_SHOW = 100
 MODEL_CONFIG = "config/config.yaml"
+MODEL_RELOAD_INTERVAL = 5  # Seconds between checks for changed model artifacts
+BATCH_MAX_SIZE = 32  # Maximum number of concurrent predictions run in one forward pass
+BATCH_MAX_WAIT_MS = 5  # Maximum time a prediction waits for others to join its batch
+PREDICTION_CACHE_SIZE = 10000  # Maximum number of cached predictions, 0 to disable the cache
+PREDICTION_CACHE_TTL = 3600  # Seconds a cached prediction stays valid
+ASYNC_MAX_PENDING = 256  # Predictions waiting in the ASGI app before requests are rejected with 503
+ASYNC_MAX_PENDING_WRITES = 1000  # Tweets waiting to be saved by the ASGI app, more are not saved
+DB_WRITE_BEHIND = False  # If true, tweets are queued and inserted in bulk by a background thread
+DB_FLUSH_SIZE = 100  # Number of queued tweets that triggers a bulk insert
+DB_FLUSH_INTERVAL = 1.0  # Maximum seconds a tweet stays queued
+DB_MAX_QUEUE = 10000  # Maximum number of queued tweets, more are dropped
 
 # Connection string
 DB_HOST = os.environ.get('MYSQL_HOST')
@@ -26,3 +37,14 @@ else:
         dialect=DB_DIALECT, user=DB_USER,
         pw=DB_PW, host=DB_HOST, port=DB_PORT,
         db=DATABASE)
+
+# Connection pool, ignored by SQLite which opens a connection per session
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))  # Connections kept open in the pool
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))  # Extra connections under load
+DB_POOL_TIMEOUT = 30  # Seconds to wait for a connection before giving up
+DB_POOL_RECYCLE = 3600  # Seconds after which connections are replaced, below MySQL's wait_timeout
+DB_POOL_PRE_PING = True  # If true, connections are tested before being used
+SQLALCHEMY_ENGINE_OPTIONS = {'pool_pre_ping': DB_POOL_PRE_PING}
+if not SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+    SQLALCHEMY_ENGINE_OPTIONS.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                                     pool_timeout=DB_POOL_TIMEOUT, pool_recycle=DB_POOL_RECYCLE)
@@ -1,25 +1,78 @@
 """Simplifies the execution of the src scripts.
 
-Provides options to create database and run model pipeline.
+Provides options to create database, run model pipeline and score tweets offline.
 
 """
 
 import argparse
+import contextlib
+import functools
+import json
 import logging.config
+import os
 
-import pandas as pd
 import yaml
 
 from config.flaskconfig import SQLALCHEMY_DATABASE_URI
-from src import model
-from src.database import create_db
-from src.clean import remove_outliers, drop_empty_content, drop_non_en_content
-from src.process import process_data
-from src.read import read_data, combine_data
+from src.cache import StepCache, TweetCache, fingerprint
+
+# The modules of the subcommands are imported by the subcommands that use them, so that e.g.
+# create_db does not pay for importing TensorFlow, pandas and NLTK
 
 logging.config.fileConfig('config/logging/local.conf', disable_existing_loggers=False)
 logger = logging.getLogger('tweets-pipeline')
 
+
+def run_process(df, config, tweet_cache=None, executor=None):
+    """Run the process step of the model pipeline on a DataFrame."""
+    from src.process import process_data
+    return process_data(df, cache=tweet_cache, executor=executor,
+                        **config['process']['process_data'])
+
+
+def run_clean(df, config):
+    """Run the clean step of the model pipeline on a DataFrame."""
+    from src.clean import clean_data
+    return clean_data(df, config['clean'])
+
+
+# Steps that transform each row independently and can therefore be streamed in chunks
+STREAMING_STEPS = {'process': run_process, 'clean': run_clean}
+
+
+def export_model(config):
+    """Export the weights of the trained model and their quantized variants."""
+    from src.numpy_model import export_weights, quantize_weights
+    export_weights(**config['model']['export_weights'])
+    for quantize_config in config['model']['quantize_weights']:
+        quantize_weights(**quantize_config)
+
+
+def step_dependencies(step, input_path, config):
+    """List the local files a pipeline step reads, or None if its output cannot be cached."""
+    if step == 'read':
+        paths = [config['read']['read_data'][file]['path'] for file in ('file1', 'file2')]
+    elif step in STREAMING_STEPS:
+        paths = [input_path]
+        lemma_table_path = config['process']['process_data'].get('lemma_table_path')
+        if step == 'process' and lemma_table_path and os.path.isfile(lemma_table_path):
+            paths.append(lemma_table_path)
+    else:
+        return None
+    if not all(path and os.path.isfile(path) for path in paths):
+        return None
+    return paths
+
+
+def tweet_cache_path(config):
+    """Get the path of the per-tweet cache for the current text processing configuration."""
+    process_config = config['process']['process_data']
+    lemma_table_path = process_config.get('lemma_table_path')
+    paths = [lemma_table_path] if lemma_table_path and os.path.isfile(lemma_table_path) else []
+    key = fingerprint('process', paths, process_config)
+    return os.path.join(config['cache']['cache_dir'], 'tweets-%s.json' % key[:16])
+
+
 if __name__ == '__main__':
     # Add parsers for creating a database and adding tweets to it
     parser = argparse.ArgumentParser(description="Creating database and running model pipeline")
@@ -30,25 +83,104 @@ if __name__ == '__main__':
     sb_create.add_argument('--engine_string', default=SQLALCHEMY_DATABASE_URI,
                            help='SQLAlchemy connection URI for database')
 
+    # Sub-parser for bulk loading tweets into the database
+    sb_load = subparsers.add_parser('load_db', description='Bulk load tweets into the database')
+    sb_load.add_argument('--input', '-i', required=True,
+                         help='Path to the tweets to load as .csv, .parquet or .feather')
+    sb_load.add_argument('--engine_string', default=SQLALCHEMY_DATABASE_URI,
+                         help='SQLAlchemy connection URI for database')
+    sb_load.add_argument('--chunksize', type=int, default=10000,
+                         help='Number of tweets inserted by each multi-row insert '
+                              '(optional, default=10000)')
+
     # Sub-parser for model pipeline
     sb_pipeline = subparsers.add_parser('pipeline', description='Run model pipeline')
     sb_pipeline.add_argument('step', help='Which step to run',
-                             choices=['read', 'process', 'clean', 'train'])
+                             choices=['read', 'lemmas', 'process', 'clean', 'train', 'export',
+                                      'evaluate'])
     sb_pipeline.add_argument('--config', default='config/config.yaml',
                              help='Path to configuration file')
     sb_pipeline.add_argument('--input', '-i', default=None,
                              help='Path to input data')
     sb_pipeline.add_argument('--output', '-o', default=None,
-                             help='Path to save output CSV (optional, default=None)')
+                             help='Path to save output data as .csv, .parquet or .feather '
+                                  '(optional, default=None)')
+    sb_pipeline.add_argument('--format', default=None, choices=['csv', 'parquet', 'feather'],
+                             help='Format of the output data, regardless of its file extension '
+                                  '(optional, default=None)')
+    sb_pipeline.add_argument('--chunksize', type=int, default=None,
+                             help='Stream the process and clean steps through chunks of this many '
+                                  'rows to keep memory flat (optional, default=None)')
+    sb_pipeline.add_argument('--resume', action='store_true',
+                             help='Continue the train step from its last checkpoint')
+    sb_pipeline.add_argument('--no-cache', action='store_true',
+                             help='Rerun the step even if its inputs have not changed, and do not '
+                                  'use cached processed tweets')
+
+    # Sub-parser for offline batch prediction
+    sb_predict = subparsers.add_parser('predict', description='Score tweets with the trained model')
+    sb_predict.add_argument('--config', default='config/config.yaml',
+                            help='Path to configuration file')
+    sb_predict.add_argument('--input', '-i', required=True,
+                            help='Path to the tweets to score as .csv, .parquet or .feather')
+    sb_predict.add_argument('--output', '-o', required=True,
+                            help='Path to save the scored tweets as .csv, .parquet or .feather')
+    sb_predict.add_argument('--format', default=None, choices=['csv', 'parquet', 'feather'],
+                            help='Format of the output data, regardless of its file extension '
+                                 '(optional, default=None)')
+    sb_predict.add_argument('--chunksize', type=int, default=100000,
+                            help='Number of tweets read, scored and written at a time '
+                                 '(optional, default=100000)')
+
+    # Sub-parser for hyperparameter sweeps
+    sb_sweep = subparsers.add_parser('sweep', description='Train candidate model configurations '
+                                                          'in parallel and compare them')
+    sb_sweep.add_argument('--grid', default='config/sweep.yaml',
+                          help='Path to the parameter grid of the sweep')
+    sb_sweep.add_argument('--config', default='config/config.yaml',
+                          help='Path to configuration file')
+    sb_sweep.add_argument('--input', '-i', required=True,
+                          help='Path to the cleaned data')
+    sb_sweep.add_argument('--output', '-o', default=None,
+                          help='Path to save the results table as CSV (optional, default=None)')
+    sb_sweep.add_argument('--workers', type=int, default=None,
+                          help='Number of candidates trained at a time (optional, default=number '
+                               'of CPU cores)')
+
+    # Sub-parser for performance benchmarks
+    sb_benchmark = subparsers.add_parser('benchmark', description='Run performance benchmarks')
+    sb_benchmark.add_argument('target', help='What to benchmark, or compare suite results with a '
+                                             'baseline',
+                              choices=['process', 'format', 'startup', 'suite', 'compare'])
+    sb_benchmark.add_argument('--config', default='config/config.yaml',
+                              help='Path to configuration file')
+    sb_benchmark.add_argument('--input', '-i', default=None,
+                              help='Path to input data, or to the suite results to compare')
+    sb_benchmark.add_argument('--output', '-o', default=None,
+                              help='Path to save benchmark results as CSV, or as JSON for the '
+                                   'suite (optional, default=None)')
+    sb_benchmark.add_argument('--baseline', default=None,
+                              help='Path to suite results to compare with and fail on regressions '
+                                   '(optional, default=None)')
 
     # Interpret and execute commands
     args = parser.parse_args()
     sp_used = args.subparser_name
 
     if sp_used == 'create_db':
+        from src.database import create_db
+        create_db(args.engine_string)
+
+    elif sp_used == 'load_db':
+        from src.database import create_db, load_tweets
+        from src.stream import read_chunks
         create_db(args.engine_string)
+        load_tweets(args.engine_string, read_chunks(args.input, args.chunksize))
 
     elif sp_used == "pipeline":
+        from src.storage import load_data, save_data
+        from src.stream import read_chunks, write_chunks
+
         # Load configuration file for parameters
         try:
             with open(args.config, "r") as f:
@@ -57,23 +189,65 @@ if __name__ == '__main__':
         except FileNotFoundError:
             logger.error("Cannot find configuration file from the path: %s", args.config)
 
-        # Read input csv into a DataFrame
-        if args.input is not None:
-            input = pd.read_csv(args.input)
+        streaming = args.chunksize is not None and args.step in STREAMING_STEPS
+        if streaming and (args.input is None or args.output is None):
+            parser.error("--chunksize requires both --input and --output")
+
+        # Skip the step if its output is cached for the same input data and configuration, which
+        # is fingerprinted from the input file without reading it
+        step_cache = None
+        dependencies = step_dependencies(args.step, args.input, config)
+        if not args.no_cache and args.output is not None and dependencies is not None:
+            step_cache = StepCache(config['cache']['cache_dir'], config['cache']['max_steps'])
+            step_key = fingerprint(args.step, dependencies,
+                                   {'config': config[args.step], 'format': args.format})
+        restored = step_cache is not None and step_cache.restore(step_key, args.output)
+
+        # Read input csv into a DataFrame, unless the step is cached or streams it in chunks
+        if args.input is not None and not streaming and not restored:
+            input = load_data(args.input, memory_map=args.step == 'train')
             logger.info('Input data loaded from %s', args.input)
 
+        # Only process the tweets that were not processed before
+        tweet_cache = None
+        if args.step == 'process' and not args.no_cache and not restored:
+            tweet_cache = TweetCache(tweet_cache_path(config), config['cache']['max_tweets'])
+        steps = dict(STREAMING_STEPS, process=functools.partial(run_process,
+                                                                tweet_cache=tweet_cache))
+
         # Interpret and execute commands
-        if args.step == 'read':
+        if restored:
+            logger.info("Inputs of the %s step have not changed, reused the cached output",
+                        args.step)
+            output = None
+        elif args.step == 'read':
+            from src.read import read_data, combine_data
             df1 = read_data(**config['read']['read_data']['file1'])
             df2 = read_data(**config['read']['read_data']['file2'])
             output = combine_data(df1, df2, **config['read']['combine_data'])
-        elif args.step == 'process':
-            output = process_data(input, **config['process']['process_data'])
-        elif args.step == 'clean':
-            df = remove_outliers(input, **config['clean']['remove_outliers'])
-            df = drop_empty_content(df, **config['clean']['drop_empty_content'])
-            output = drop_non_en_content(df, **config['clean']['drop_non_en_content'])
+        elif args.step == 'lemmas':
+            from src.process import build_lemma_table
+            build_lemma_table(input, **config['process']['build_lemma_table'])
+            output = None
+        elif streaming:
+            logger.info("Streaming %s in chunks of %s rows", args.input, args.chunksize)
+            with contextlib.ExitStack() as stack:
+                step = steps[args.step]
+                process_config = config['process']['process_data']
+                if args.step == 'process' and process_config.get('workers', 1) != 1:
+                    # Start the worker processes once for all the chunks
+                    from src.process import process_pool
+                    executor = stack.enter_context(process_pool(
+                        process_config['nltk_data_path'], process_config['workers'],
+                        process_config.get('lemma_table_path')))
+                    step = functools.partial(step, executor=executor)
+                chunks = read_chunks(args.input, args.chunksize)
+                write_chunks((step(chunk, config) for chunk in chunks), args.output, args.format)
+            output = None
+        elif args.step in steps:
+            output = steps[args.step](input, config)
         elif args.step == 'train':
+            from src import model
             model.set_seed(**config['model']['set_seed'])
             train_contents, test_contents, train_labels, test_labels = model.train_test_split(
                 input, **config['model']['train_test_split'])
@@ -81,13 +255,140 @@ if __name__ == '__main__':
             train_data = model.tokenize(train_contents, **config['model']['tokenize'])
             test_data = model.tokenize(test_contents, **config['model']['tokenize'])
             lstm_model = model.compile_model(vocab_size, **config['model']['compile_model'])
-            model.fit_model(lstm_model, train_data, train_labels, **config['model']['fit_model'])
+            model.fit_model(lstm_model, train_data, train_labels, resume=args.resume,
+                            **config['model']['fit_model'])
+            export_model(config)
+            model.calculate_mape(test_data, test_labels, **config['model']['calculate_mape'])
+            output = None
+        elif args.step == 'export':
+            export_model(config)
+            output = None
+        elif args.step == 'evaluate':
+            from src import model
+            _, test_contents, _, test_labels = model.train_test_split(
+                input, **config['model']['train_test_split'])
+            test_data = model.tokenize(test_contents, **config['model']['tokenize'])
             model.calculate_mape(test_data, test_labels, **config['model']['calculate_mape'])
+            output = None
+
+        # Save output DataFrame in the requested format
+        if args.output is not None and output is not None:
+            save_data(output, args.output, args.format)
+            logger.info("Output saved to %s" % args.output)
+
+        # Cache the output and the processed tweets for the next run
+        if step_cache is not None and not restored:
+            step_cache.store(step_key, args.output)
+        if tweet_cache is not None:
+            tweet_cache.save()
+
+    elif sp_used == 'predict':
+        from src.predict import score_data
+        from src.stream import read_chunks, write_chunks
+
+        try:
+            with open(args.config, "r") as f:
+                config = yaml.load(f, Loader=yaml.FullLoader)
+            logger.info("Configuration file loaded from %s", args.config)
+        except FileNotFoundError:
+            logger.error("Cannot find configuration file from the path: %s", args.config)
+
+        # Stream the tweets through the model, which is only loaded for the first chunk
+        logger.info("Scoring %s in chunks of %s rows", args.input, args.chunksize)
+        chunks = read_chunks(args.input, args.chunksize)
+        write_chunks((score_data(chunk, **config['predict']['score_data'],
+                                 **config['predict']['predict']) for chunk in chunks),
+                     args.output, args.format)
+        logger.info("Scored tweets saved to %s", args.output)
+
+    elif sp_used == 'sweep':
+        from src.storage import load_data
+        from src.sweep import expand_grid, run_sweep
+
+        try:
+            with open(args.config, "r") as f:
+                config = yaml.load(f, Loader=yaml.FullLoader)
+            logger.info("Configuration file loaded from %s", args.config)
+            with open(args.grid, "r") as f:
+                grid = yaml.load(f, Loader=yaml.FullLoader)
+            logger.info("Parameter grid loaded from %s", args.grid)
+        except FileNotFoundError as e:
+            logger.error("Cannot find configuration file: %s", e)
+            raise
+
+        input = load_data(args.input, memory_map=True)
+        logger.info('Input data loaded from %s', args.input)
+        candidates = expand_grid(grid['parameters'], grid.get('search', 'grid'),
+                                 grid.get('samples'), grid.get('seed'))
+        output = run_sweep(input, config['model'], candidates, grid['output_dir'],
+                           workers=args.workers)
+        logger.info("Sweep results:\n%s", output.to_string(index=False))
 
-        # Save output DataFrame to a csv
         if args.output is not None:
             output.to_csv(args.output, index=False)
-            logger.info("Output saved to %s" % args.output)
+            logger.info("Sweep results saved to %s" % args.output)
+
+    elif sp_used == 'benchmark':
+        try:
+            with open(args.config, "r") as f:
+                config = yaml.load(f, Loader=yaml.FullLoader)
+            logger.info("Configuration file loaded from %s", args.config)
+        except FileNotFoundError:
+            logger.error("Cannot find configuration file from the path: %s", args.config)
+
+        from src.benchmark import compare_results, format_io, process_throughput, run_suite, \
+            startup_cost
+        from src.storage import load_data
+        import pandas as pd
+
+        if args.target == 'startup':
+            output = startup_cost(**config['benchmark']['startup'])
+        elif args.target in ('suite', 'compare'):
+            if args.target == 'suite':
+                results = run_suite(**config['benchmark']['suite'])
+                output = pd.DataFrame(results['results'])
+            else:
+                if args.input is None or args.baseline is None:
+                    parser.error("comparing requires --input and --baseline")
+                with open(args.input, "r") as f:
+                    results = json.load(f)
+            if args.baseline is not None:
+                with open(args.baseline, "r") as f:
+                    baseline = json.load(f)
+                output = compare_results(results, baseline, **config['benchmark']['compare'])
+        else:
+            if args.input is None:
+                parser.error("the %s benchmark requires --input" % args.target)
+            input = load_data(args.input)
+            logger.info('Input data loaded from %s', args.input)
+            if args.target == 'process':
+                output = process_throughput(input, **config['benchmark']['process_throughput'])
+            elif args.target == 'format':
+                output = format_io(input, **config['benchmark']['format_io'])
+        logger.info("Benchmark results:\n%s", output.to_string(index=False))
+
+        if args.output is not None:
+            if args.target == 'suite':
+                with open(args.output, "w") as f:
+                    json.dump(results, f, indent=2)
+            else:
+                output.to_csv(args.output, index=False)
+            logger.info("Benchmark results saved to %s" % args.output)
+
+        # Fail the run when an entry point starts slower or bigger than its budget
+        if args.target == 'startup' and not output['within_budget'].all():
+            over_budget = output.loc[~output['within_budget'], 'command']
+            logger.error("Startup over budget: %s", ", ".join(over_budget))
+            parser.exit(1)
+
+        # Fail the run when a hot path got slower than the baseline
+        if args.target in ('suite', 'compare') and args.baseline is not None \
+                and output['regression'].any():
+            regressions = output.loc[output['regression']]
+            logger.error("Regressions against %s: %s", args.baseline,
+                         ", ".join("%s (%s tweets)" % (row.case, row.size)
+                                   for row in regressions.itertuples()))
+            parser.exit(1)
 
     else:
         parser.print_help()
@@ -0,0 +1,211 @@
+"""The inference batching module.
+
+This module provides a batcher that groups predictions requested concurrently by different threads
+into a single batched call of the model.
+
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from src.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+logger.setLevel("INFO")
+
+# Histogram buckets for the number of requests in a batch
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+# Marker put on the queue to stop the worker thread
+_STOP = object()
+
+
+class QueueFullError(RuntimeError):
+    """Raised when a request is submitted to a batcher whose queue is full."""
+
+
+class InferenceBatcher:
+    """Micro-batcher between concurrent callers and a batched prediction function.
+
+    Requests are queued and picked up by a single worker thread. The worker waits for more
+    requests for at most ``max_wait_ms`` after the first request of a batch was queued, or until
+    ``max_batch_size`` requests are collected, then calls the prediction function once for the
+    whole batch and hands each result back to its caller. Requests that queued up while the
+    previous batch was running are batched right away without waiting.
+
+    """
+
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=5.0, max_queue_size=None,
+                 metrics=REGISTRY):
+        """Initialize an InferenceBatcher object and start its worker thread.
+
+        Args:
+            predict_fn (callable): Function taking a list of inputs and returning the list of
+            their results in the same order.
+            max_batch_size (int): Maximum number of requests in a batch.
+            max_wait_ms (float): Maximum time in milliseconds a request waits for others to join
+            its batch.
+            max_queue_size (int): Maximum number of requests waiting to be batched. Requests
+            submitted beyond it are rejected (optional, default unbounded).
+            metrics (:py:class:`src.metrics.MetricsRegistry`): Registry to record the batch
+            sizes, queueing delays and inference times in.
+
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1, got %s" % max_batch_size)
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue_size = max_queue_size
+        self._pending = 0
+        self._queue = queue.Queue()
+        self._closed = False
+        self._close_lock = threading.Lock()
+
+        self.batch_size = metrics.histogram("inference_batch_size",
+                                            "Number of requests per batched forward pass",
+                                            buckets=BATCH_SIZE_BUCKETS)
+        self.queue_delay = metrics.histogram("inference_queue_delay_seconds",
+                                             "Time requests wait before their batch runs")
+        self.inference_time = metrics.histogram("inference_batch_seconds",
+                                                "Time taken by a batched forward pass")
+        self.queue_depth = metrics.gauge("inference_queue_depth",
+                                         "Number of requests waiting to be batched")
+        self.rejected = metrics.counter("inference_rejected_total",
+                                        "Requests rejected because the queue was full")
+
+        self._worker = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, item):
+        """Queue an input for prediction.
+
+        Args:
+            item: The input passed to the prediction function as part of a batch.
+
+        Returns:
+            :py:class:`concurrent.futures.Future`: Future that holds the result of the input.
+
+        Raises:
+            QueueFullError: If ``max_queue_size`` requests are already waiting.
+
+        """
+        future = Future()
+        with self._close_lock:
+            if self._closed:
+                raise RuntimeError("The batcher is closed")
+            if self.max_queue_size is not None and self._pending >= self.max_queue_size:
+                self.rejected.inc()
+                raise QueueFullError("%s requests are already waiting" % self._pending)
+            self._pending += 1
+            self._queue.put((item, future, time.perf_counter()))
+        self.queue_depth.inc()
+        return future
+
+    def predict(self, item, timeout=None):
+        """Predict a single input as part of the next batch.
+
+        Args:
+            item: The input passed to the prediction function as part of a batch.
+            timeout (float): Seconds to wait for the result (optional).
+
+        Returns:
+            The result of the prediction function for the input. Errors raised by the
+            prediction function are raised again here.
+
+        """
+        return self.submit(item).result(timeout)
+
+    def _collect(self):
+        """Helper function to take the next batch of requests from the queue.
+
+        Returns:
+            :obj:`tuple` of (list, bool): The requests of the batch and whether the batcher was
+            closed meanwhile.
+
+        """
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    request = self._queue.get(timeout=remaining)
+                else:
+                    request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is _STOP:
+                return batch, True
+            batch.append(request)
+        return batch, False
+
+    def _run_batch(self, batch):
+        """Helper function to predict a batch of requests and resolve their futures."""
+        with self._close_lock:
+            self._pending -= len(batch)
+        self.queue_depth.inc(-len(batch))
+        # Requests cancelled by their callers are left out of the batch
+        batch = [request for request in batch if request[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        start = time.perf_counter()
+        for _, _, queued_at in batch:
+            self.queue_delay.observe(start - queued_at)
+        self.batch_size.observe(len(batch))
+
+        try:
+            results = self.predict_fn([item for item, _, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError("Got %s results for a batch of %s inputs"
+                                 % (len(results), len(batch)))
+        except Exception as e:
+            logger.error("Batched prediction of %s inputs failed. Here is the original error: %s",
+                         len(batch), e)
+            for _, future, _ in batch:
+                future.set_exception(e)
+        else:
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+        elapsed = time.perf_counter() - start
+        self.inference_time.observe(elapsed)
+        logger.debug("Predicted a batch of %s inputs in %.1f ms", len(batch), elapsed * 1000)
+
+    def _run(self):
+        """Helper function run by the worker thread until the batcher is closed."""
+        stopped = False
+        while not stopped:
+            batch, stopped = self._collect()
+            if batch:
+                self._run_batch(batch)
+
+    def stats(self):
+        """Summarize the batch sizes, queueing delays and inference times recorded so far.
+
+        Returns:
+            dict: Count, mean, p50, p95 and p99 of each measure.
+
+        """
+        return {"batch_size": self.batch_size.summary(),
+                "queue_delay_seconds": self.queue_delay.summary(),
+                "inference_seconds": self.inference_time.summary()}
+
+    def close(self):
+        """Predict the requests still queued and stop the worker thread.
+
+        Returns:
+            None
+
+        """
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._worker.join()
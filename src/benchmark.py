@@ -0,0 +1,362 @@
+"""The benchmark module.
+
+This module provides functionalities to measure the throughput of the model pipeline steps, the
+startup cost of the entry points, and the speed of the text, tokenize and predict hot paths on a
+synthetic tweet corpus.
+
+"""
+
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.clean import drop_non_en_content
+from src.process import get_normalizer, process_data, process_data_parallel, process_tweet, \
+    remove_urls
+from src.storage import load_data, save_data
+
+logger = logging.getLogger(__name__)
+logger.setLevel("INFO")
+
+# Modules too slow to import to be loaded by code paths that do not use them
+HEAVY_MODULES = ["tensorflow", "sklearn", "nltk", "pandas", "pyarrow"]
+
+# Words of the synthetic tweets, so that the corpus does not depend on any data file
+CORPUS_WORDS = (
+    "the a and to of in is for on that with be this are was have it we our they will you not at "
+    "by great america american people country president news fake media democrats republicans "
+    "jobs economy border wall china trade deal tax cuts military vote election win winning big "
+    "thank today tonight rally crowd total endorsement strong tremendous very many years record "
+    "stock market high low historic nation freedom law order safe police support again "
+    "radical left witch hunt hoax collusion impeachment senate house congress governor state "
+    "running ran runs voters voted votes counted counting cities families children "
+    "businesses workers farmers leaders meeting meetings talked talks spoke speaking happened"
+).split()
+
+# Characters of the tweets that are not English, which drop_non_en_content removes
+NON_EN_PREFIXES = ["¡", "¿", "中国", "Россия", "…", "🇺🇸"]
+
+# Runs an entry point in the interpreter it is started with, then writes its peak RSS and the heavy
+# modules it imported to the file named by the STARTUP_REPORT environment variable
+_STARTUP_WRAPPER = """
+import atexit, importlib, json, os, resource, runpy, sys
+
+def peak_rss_kb():
+    # ru_maxrss carries over the peak of the forked parent, the peak of this image does not
+    try:
+        with open("/proc/self/status") as f:
+            return int(next(line for line in f if line.startswith("VmHWM:")).split()[1])
+    except (OSError, StopIteration):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def report():
+    with open(os.environ["STARTUP_REPORT"], "w") as f:
+        json.dump({"rss_mb": peak_rss_kb() / 1024,
+                   "modules": [name for name in %r if name in sys.modules]}, f)
+
+atexit.register(report)
+if sys.argv[1] == "--import":
+    importlib.import_module(sys.argv[2])
+else:
+    sys.argv = sys.argv[1:]
+    runpy.run_path(sys.argv[0], run_name="__main__")
+""" % HEAVY_MODULES
+
+
+def process_throughput(df, content_column, nltk_data_path, worker_counts, chunksize, repeat=1,
+                       lemma_table_path=None):
+    """Compare the throughput of serial and parallel text processing.
+
+    The serial path is timed first and used as the reference for both speedup and output. Every
+    parallel run must produce exactly the same output, in the same order, as the serial run.
+
+    Args:
+        df (:py:class:`pandas.DataFrame`): The data to process.
+        content_column (str): The name of the content column.
+        nltk_data_path (str): The path that points to the downloaded NLTK data.
+        worker_counts (:obj:`list` of :obj:`int`): Numbers of worker processes to benchmark. None
+        stands for all available cores.
+        chunksize (int): Number of tweets sent to a worker process at a time.
+        repeat (int): Number of timed runs per setting. The fastest run is reported.
+        lemma_table_path (str): The path that points to a precomputed lemma table (optional).
+
+    Returns:
+        :py:class:`pandas.DataFrame`: One row per setting with the number of workers, the elapsed
+        seconds, the throughput in tweets per second and the speedup over the serial path.
+
+    """
+    contents = list(df[content_column])
+    normalizer = get_normalizer(nltk_data_path, lemma_table_path=lemma_table_path)
+
+    # Time the serial path, which also serves as the expected output
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        expected = normalizer.normalize_many(contents)
+        elapsed.append(time.perf_counter() - start)
+    results = [{"mode": "serial", "workers": 1, "seconds": min(elapsed)}]
+    logger.info("Serial: %s tweets in %.3f seconds", len(contents), min(elapsed))
+
+    for workers in worker_counts:
+        workers = workers or os.cpu_count()
+        elapsed = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            output = process_data_parallel(contents, nltk_data_path, workers=workers,
+                                           chunksize=chunksize, lemma_table_path=lemma_table_path)
+            elapsed.append(time.perf_counter() - start)
+        if output != expected:
+            raise ValueError("Parallel output with %s workers differs from the serial output"
+                             % workers)
+        results.append({"mode": "parallel", "workers": workers, "seconds": min(elapsed)})
+        logger.info("Parallel (%s workers): %s tweets in %.3f seconds", workers, len(contents),
+                    min(elapsed))
+
+    results = pd.DataFrame(results)
+    results["tweets_per_second"] = len(contents) / results["seconds"]
+    results["speedup"] = results["seconds"].iloc[0] / results["seconds"]
+    return results
+
+
+def format_io(df, formats, repeat=1):
+    """Compare the write time, read time and file size of the pipeline storage formats.
+
+    Args:
+        df (:py:class:`pandas.DataFrame`): The data to save and load.
+        formats (:obj:`list` of :obj:`str`): The formats to benchmark, e.g. 'csv', 'parquet' and
+        'feather'. The first one is the reference for the relative numbers.
+        repeat (int): Number of timed runs per format. The fastest run is reported.
+
+    Returns:
+        :py:class:`pandas.DataFrame`: One row per format with the seconds to write and to read the
+        data, the file size in bytes, and each of them relative to the first format.
+
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for fmt in formats:
+            path = os.path.join(directory, "data." + fmt)
+            write_seconds, read_seconds = [], []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                save_data(df, path, fmt)
+                write_seconds.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                load_data(path, fmt, memory_map=True)
+                read_seconds.append(time.perf_counter() - start)
+            results.append({"format": fmt, "write_seconds": min(write_seconds),
+                            "read_seconds": min(read_seconds), "size_bytes": os.path.getsize(path)})
+
+    results = pd.DataFrame(results)
+    for column in ["write_seconds", "read_seconds", "size_bytes"]:
+        results[column + "_relative"] = results[column] / results[column].iloc[0]
+    return results
+
+
+def startup_cost(commands, repeat=1):
+    """Measure the time and peak memory taken by entry points started in a fresh interpreter.
+
+    Each command runs in its own process, so nothing imported by one command or by the caller is
+    shared with another. The time includes the start of the interpreter.
+
+    Args:
+        commands (dict): Commands to measure by name, each with either the ``argv`` of a script,
+        e.g. ``[run.py, create_db]``, or the name of a module to ``import``, along with its
+        ``max_seconds`` and ``max_rss_mb`` budgets. ``{tmp}`` in an argument is replaced by a
+        temporary directory.
+        repeat (int): Number of timed runs per command. The fastest run is reported.
+
+    Returns:
+        :py:class:`pandas.DataFrame`: One row per command with the seconds taken, the peak RSS in
+        megabytes, the heavy modules it imported, its budgets and whether it stayed within them.
+
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        report_path = os.path.join(directory, "report.json")
+        env = dict(os.environ, STARTUP_REPORT=report_path)
+        for name, command in commands.items():
+            if "import" in command:
+                argv = ["--import", command["import"]]
+            else:
+                argv = [arg.replace("{tmp}", directory) for arg in command["argv"]]
+
+            elapsed, rss_mb = [], []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                process = subprocess.run([sys.executable, "-c", _STARTUP_WRAPPER] + argv, env=env,
+                                         stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+                elapsed.append(time.perf_counter() - start)
+                if process.returncode != 0:
+                    raise RuntimeError("Startup command %s failed:\n%s"
+                                       % (name, process.stderr.decode("utf-8", "replace")))
+                with open(report_path, "r") as f:
+                    report = json.load(f)
+                rss_mb.append(report["rss_mb"])
+
+            results.append({"command": name, "seconds": min(elapsed), "rss_mb": max(rss_mb),
+                            "heavy_modules": " ".join(report["modules"]),
+                            "max_seconds": command["max_seconds"],
+                            "max_rss_mb": command["max_rss_mb"]})
+            logger.info("%s: %.2f seconds, %.0f MB", name, min(elapsed), max(rss_mb))
+
+    results = pd.DataFrame(results)
+    results["within_budget"] = (results["seconds"] <= results["max_seconds"]) \
+        & (results["rss_mb"] <= results["max_rss_mb"])
+    return results
+
+
+def synthetic_corpus(size, seed=0):
+    """Generate tweets from a fixed list of words, always the same ones for the same seed.
+
+    The tweets mix words, URLs, mentions, hashtags, numbers and punctuation, and a few of them are
+    not English.
+
+    Args:
+        size (int): Number of tweets.
+        seed (int): Seed of the generator.
+
+    Returns:
+        :py:class:`pandas.DataFrame`: The tweets in a ``content`` column.
+
+    """
+    rng = random.Random(seed)
+    tweets = []
+    for _ in range(size):
+        words = []
+        for _ in range(rng.randint(5, 40)):
+            roll = rng.random()
+            if roll < 0.03:
+                words.append("https://t.co/%08x" % rng.getrandbits(32))
+            elif roll < 0.06:
+                words.append("@" + rng.choice(CORPUS_WORDS))
+            elif roll < 0.09:
+                words.append("#" + rng.choice(CORPUS_WORDS).capitalize())
+            elif roll < 0.12:
+                words.append(str(rng.randint(1, 100000)))
+            else:
+                word = rng.choice(CORPUS_WORDS)
+                words.append(word.upper() if roll > 0.97 else word)
+            if rng.random() < 0.1:
+                words[-1] += rng.choice(".,!?:")
+        tweet = " ".join(words)
+        if rng.random() < 0.05:
+            tweet = rng.choice(NON_EN_PREFIXES) + tweet
+        tweets.append(tweet)
+    return pd.DataFrame({"content": tweets})
+
+
+def _best_time(function, repeat):
+    """Helper function to get the fastest wall time of a few calls of a function."""
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed.append(time.perf_counter() - start)
+    return min(elapsed)
+
+
+def run_suite(sizes, nltk_data_path, tokenizer_path, padding_type, max_length, fitted_model_path,
+              lemma_table_path=None, repeat=3, seed=0):
+    """Time the text, tokenize and predict hot paths on synthetic corpora of several sizes.
+
+    Every case is run once before it is timed, so that loading the stopwords, the vocabulary and
+    the model is not timed. The ``predict`` and ``end_to_end`` cases score every tweet with the
+    model, without a prediction cache.
+
+    Args:
+        sizes (:obj:`list` of :obj:`int`): Numbers of tweets of the corpora.
+        nltk_data_path (str): The path that points to the downloaded NLTK data.
+        tokenizer_path (str): The path that points to a trained tokenizer.
+        padding_type (str): Pad either before ('pre') or after ('post') each sequence.
+        max_length (int): Maximum length of all sequences.
+        fitted_model_path (str): The path that points to a trained model, or its exported weights.
+        lemma_table_path (str): The path that points to a precomputed lemma table (optional).
+        repeat (int): Number of timed runs per case. The fastest run is reported.
+        seed (int): Seed of the synthetic corpora.
+
+    Returns:
+        dict: The versions of the environment under ``metadata``, and under ``results`` the
+        seconds and throughput of each case and corpus size.
+
+    """
+    from src.model import tokenize
+    from src.predict import load_model, predict_batch
+
+    predict_config = dict(nltk_data_path=nltk_data_path, tokenizer_path=tokenizer_path,
+                          padding_type=padding_type, max_length=max_length,
+                          fitted_model_path=fitted_model_path, lemma_table_path=lemma_table_path)
+
+    def end_to_end(df):
+        processed = process_data(df.copy(), "content", nltk_data_path,
+                                 lemma_table_path=lemma_table_path)
+        sequences = tokenize(processed["content"], tokenizer_path, padding_type, max_length)
+        return load_model(fitted_model_path).predict(sequences)
+
+    results = []
+    for size in sizes:
+        df = synthetic_corpus(size, seed)
+        contents = list(df["content"])
+        processed = [process_tweet(content, nltk_data_path, lemma_table_path=lemma_table_path)
+                     for content in contents]
+        cases = {
+            "remove_urls": lambda: [remove_urls(content) for content in contents],
+            "process_tweet": lambda: [process_tweet(content, nltk_data_path,
+                                                    lemma_table_path=lemma_table_path)
+                                      for content in contents],
+            "drop_non_en_content": lambda: drop_non_en_content(df, "content"),
+            "tokenize": lambda: tokenize(processed, tokenizer_path, padding_type, max_length),
+            "predict": lambda: predict_batch(contents, **predict_config),
+            "end_to_end": lambda: end_to_end(df),
+        }
+        for case, function in cases.items():
+            function()
+            seconds = _best_time(function, repeat)
+            results.append({"case": case, "size": size, "seconds": seconds,
+                            "tweets_per_second": size / seconds})
+            logger.info("%s on %s tweets: %.4f seconds", case, size, seconds)
+
+    return {"metadata": {"python": platform.python_version(), "numpy": np.__version__,
+                         "pandas": pd.__version__, "machine": platform.machine(),
+                         "cpu_count": os.cpu_count(), "seed": seed, "repeat": repeat},
+            "results": results}
+
+
+def compare_results(results, baseline, threshold=0.2):
+    """Compare benchmark results with a baseline and flag the regressions.
+
+    Args:
+        results (dict): Results saved by :py:func:`run_suite`.
+        baseline (dict): Baseline results saved by :py:func:`run_suite`.
+        threshold (float): Relative slowdown above which a case counts as a regression, e.g. 0.2
+        for 20% slower.
+
+    Returns:
+        :py:class:`pandas.DataFrame`: One row per case and corpus size found in both results with
+        the baseline and current seconds, the relative change and whether it is a regression.
+
+    """
+    baseline_seconds = {(row["case"], row["size"]): row["seconds"]
+                        for row in baseline["results"]}
+    rows = []
+    for row in results["results"]:
+        key = (row["case"], row["size"])
+        if key not in baseline_seconds:
+            logger.warning("No baseline for %s on %s tweets", *key)
+            continue
+        change = row["seconds"] / baseline_seconds[key] - 1
+        rows.append({"case": row["case"], "size": row["size"],
+                     "baseline_seconds": baseline_seconds[key], "seconds": row["seconds"],
+                     "change": change, "regression": change > threshold})
+    return pd.DataFrame(rows, columns=["case", "size", "baseline_seconds", "seconds", "change",
+                                       "regression"])
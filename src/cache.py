@@ -0,0 +1,303 @@
+"""The caching module.
+
+This module provides functionalities to fingerprint pipeline inputs, reuse the outputs of pipeline
+steps whose inputs did not change, remember the processed text of individual tweets, and remember
+the predictions served for normalized tweets.
+
+"""
+
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+import yaml
+
+from src.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+logger.setLevel("INFO")
+
+
+def fingerprint(step, input_paths, config_section):
+    """Calculate a fingerprint of everything a pipeline step depends on.
+
+    Args:
+        step (str): Name of the pipeline step.
+        input_paths (:obj:`list` of :obj:`str`): Paths to the files the step reads.
+        config_section (dict): The configuration used by the step.
+
+    Returns:
+        str: The SHA-256 hex digest of the step name, the configuration and the input files.
+
+    """
+    digest = hashlib.sha256()
+    digest.update(step.encode("utf-8"))
+    digest.update(yaml.dump(config_section, sort_keys=True).encode("utf-8"))
+    for path in input_paths:
+        digest.update(path.encode("utf-8"))
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class StepCache:
+    """Content-addressed store of pipeline step outputs.
+
+    Outputs are saved under their fingerprint. When the cache holds more than ``max_entries``
+    outputs, the least recently used ones are evicted.
+
+    """
+
+    def __init__(self, cache_dir, max_entries=20):
+        """Initialize a StepCache object.
+
+        Args:
+            cache_dir (str): Directory to keep cached outputs in.
+            max_entries (int): Maximum number of outputs to keep.
+
+        """
+        self.cache_dir = os.path.join(cache_dir, "steps")
+        self.max_entries = max_entries
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _entry_path(self, key, output_path):
+        """Helper function to get where the output for a fingerprint is cached."""
+        return os.path.join(self.cache_dir, key + os.path.splitext(output_path)[1])
+
+    def restore(self, key, output_path):
+        """Copy a cached output to the output path if the cache has one for the fingerprint.
+
+        Args:
+            key (str): Fingerprint of the step inputs.
+            output_path (str): Path to save the output to.
+
+        Returns:
+            bool: Whether a cached output was found and restored.
+
+        """
+        entry_path = self._entry_path(key, output_path)
+        if not os.path.exists(entry_path):
+            return False
+        shutil.copyfile(entry_path, output_path)
+        # Mark the entry as recently used
+        os.utime(entry_path)
+        logger.info("Restored cached output %s to %s", entry_path, output_path)
+        return True
+
+    def store(self, key, output_path):
+        """Add a step output to the cache and evict the least recently used outputs.
+
+        Args:
+            key (str): Fingerprint of the step inputs.
+            output_path (str): Path of the output to cache.
+
+        Returns:
+            None
+
+        """
+        shutil.copyfile(output_path, self._entry_path(key, output_path))
+        entries = sorted(glob.glob(os.path.join(self.cache_dir, "*")), key=os.path.getmtime)
+        for entry_path in entries[:max(len(entries) - self.max_entries, 0)]:
+            os.remove(entry_path)
+            logger.info("Evicted cached output %s", entry_path)
+
+
+class TweetCache:
+    """Bounded cache of processed tweet contents keyed by a hash of the raw content.
+
+    The cache keeps at most ``max_entries`` tweets and evicts the least recently used ones.
+
+    """
+
+    def __init__(self, path, max_entries=500000):
+        """Initialize a TweetCache object, loading the saved entries if there are any.
+
+        Args:
+            path (str): Path to the JSON file the cache is saved to.
+            max_entries (int): Maximum number of tweets to keep.
+
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries.update(json.load(f))
+            logger.info("Loaded %s cached tweets from %s", len(self.entries), path)
+        except FileNotFoundError:
+            logger.info("No tweet cache found at %s, starting an empty one", path)
+
+    @staticmethod
+    def key(content):
+        """Get the cache key of a raw tweet content.
+
+        Args:
+            content (str): The raw tweet content.
+
+        Returns:
+            str: The SHA-1 hex digest of the content.
+
+        """
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Get the processed content cached under a key.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            str: The processed content, or None if it is not cached.
+
+        """
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """Cache the processed content for a key, evicting the least recently used tweets.
+
+        Args:
+            key (str): The cache key.
+            value (str): The processed content.
+
+        Returns:
+            None
+
+        """
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def save(self):
+        """Save the cache to its JSON file.
+
+        Returns:
+            None
+
+        """
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f)
+        logger.info("Saved %s cached tweets to %s (%s hits, %s misses)", len(self.entries),
+                    self.path, self.hits, self.misses)
+
+
+class PredictionCache:
+    """Bounded, thread-safe cache of predictions keyed by model version and normalized tweet.
+
+    Tweets that differ only in URLs, punctuation, case or stopwords normalize to the same text and
+    share an entry. Entries expire ``ttl`` seconds after they were stored, and the least recently
+    used entries are evicted beyond ``max_entries``. Since the model version is part of the key,
+    predictions of a previous model are never served after it is swapped out.
+
+    """
+
+    def __init__(self, max_entries=10000, ttl=3600.0, metrics=REGISTRY):
+        """Initialize a PredictionCache object.
+
+        Args:
+            max_entries (int): Maximum number of predictions to keep.
+            ttl (float): Seconds a prediction stays valid, or None to keep it until evicted.
+            metrics (:py:class:`src.metrics.MetricsRegistry`): Registry to count the hits and
+            misses in.
+
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self.hits_total = metrics.counter("prediction_cache_hits_total",
+                                          "Predictions served from the cache")
+        self.misses_total = metrics.counter("prediction_cache_misses_total",
+                                            "Predictions not found in the cache")
+
+    def get(self, version, text):
+        """Get the prediction cached for a normalized tweet.
+
+        Args:
+            version (str): Version of the model.
+            text (str): The normalized tweet.
+
+        Returns:
+            The cached prediction, or None if it is not cached or expired.
+
+        """
+        key = (version, text)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] <= time.monotonic():
+                del self.entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                self.misses_total.inc()
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        self.hits_total.inc()
+        return entry[1]
+
+    def put(self, version, text, value):
+        """Cache the prediction for a normalized tweet, evicting the least recently used ones.
+
+        Args:
+            version (str): Version of the model.
+            text (str): The normalized tweet.
+            value: The prediction.
+
+        Returns:
+            None
+
+        """
+        key = (version, text)
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self.entries[key] = (expires_at, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Remove all the cached predictions.
+
+        Returns:
+            None
+
+        """
+        with self._lock:
+            self.entries.clear()
+        logger.info("Prediction cache cleared")
+
+    def stats(self):
+        """Summarize the use of the cache.
+
+        Returns:
+            dict: Number of entries, hits, misses, expirations, evictions and the hit rate.
+
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self.entries), "hits": self.hits, "misses": self.misses,
+                    "expirations": self.expirations, "evictions": self.evictions,
+                    "hit_rate": self.hits / lookups if lookups else None}
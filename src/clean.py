@@ -6,12 +6,18 @@ This module provides functionalities to clean a DataFrame after text processing.
 
 import logging
 import re
+import string
 
 import numpy as np
+import pandas as pd
 
 logger = logging.getLogger(__name__)
 logger.setLevel("INFO")
 
+EN_REGEX = re.compile(r'[a-zA-Z1-9]')
+# The characters EN_REGEX matches, for checking the first character of a whole column at once
+EN_FIRST_CHARACTERS = frozenset(string.ascii_letters + "123456789")
+
 
 def remove_outliers(df, column, cutoff, left_tail=True):
     """Remove outliers based on conditions specified.
@@ -62,8 +68,7 @@ def is_en(text):
         bool: Whether or not the input text is English (contains only letters and numbers).
 
     """
-    en_regex = re.compile(r'[a-zA-Z1-9]')
-    match = en_regex.match(text)
+    match = EN_REGEX.match(text)
     return bool(match)
 
 
@@ -81,3 +86,107 @@ def drop_non_en_content(df, content_column):
     df = df[df[content_column].apply(is_en)]
     logger.info("Dropped non-English tweets")
     return df
+
+
+def outlier_mask(df, column, cutoff, left_tail=True):
+    """Flag the rows that :py:func:`remove_outliers` keeps.
+
+    Args:
+        df (:py:class:`pandas.DataFrame`): The DataFrame to check.
+        column (str): Name of the column that contains outliers.
+        cutoff (int/float): A number as a cutoff for outliers.
+        left_tail (bool): If True, flag the left tail of the distribution as outliers. Otherwise,
+        flag the right tail.
+
+    Returns:
+        :py:class:`pandas.Series`: True for the rows to keep.
+
+    """
+    if left_tail:
+        return df[column] > cutoff
+    return df[column] < cutoff
+
+
+def non_empty_mask(df, content_column):
+    """Flag the rows that :py:func:`drop_empty_content` keeps.
+
+    Args:
+        df (:py:class:`pandas.DataFrame`): The DataFrame to check.
+        content_column (str): Name of the column to detect empty contents.
+
+    Returns:
+        :py:class:`pandas.Series`: True for the rows to keep.
+
+    """
+    not_missing = np.logical_and.reduce([df[column].notna().to_numpy() for column in df.columns])
+    return df[content_column].ne('') & not_missing
+
+
+def en_mask(df, content_column):
+    """Flag the rows that :py:func:`drop_non_en_content` keeps.
+
+    Args:
+        df (:py:class:`pandas.DataFrame`): The DataFrame to check.
+        content_column (str): Name of the content column.
+
+    Returns:
+        :py:class:`pandas.Series`: True for the rows to keep.
+
+    """
+    return df[content_column].str[:1].isin(EN_FIRST_CHARACTERS)
+
+
+# Cleaning rules by configuration name, applied in the order they are configured
+CLEAN_RULES = {
+    "remove_outliers": outlier_mask,
+    "drop_empty_content": non_empty_mask,
+    "drop_non_en_content": en_mask,
+}
+
+
+def build_clean_mask(df, rules):
+    """Combine all configured cleaning rules into a single boolean mask.
+
+    A row is counted as removed by the first rule, in configuration order, that rejects it, so the
+    counts add up to the total number of removed rows.
+
+    Args:
+        df (:py:class:`pandas.DataFrame`): The DataFrame to clean.
+        rules (dict): Mapping from rule names in ``CLEAN_RULES`` to the rule parameters.
+
+    Returns:
+        :obj:`tuple` of (:py:class:`pandas.Series`, dict): True for the rows to keep, and the
+        number of rows removed by each rule.
+
+    """
+    keep = pd.Series(True, index=df.index)
+    removed = {}
+    for name, params in rules.items():
+        if name not in CLEAN_RULES:
+            raise ValueError("Unknown cleaning rule '%s', expected one of %s"
+                             % (name, list(CLEAN_RULES)))
+        rule_mask = CLEAN_RULES[name](df, **params)
+        removed[name] = int((keep & ~rule_mask).sum())
+        keep &= rule_mask
+    return keep, removed
+
+
+def clean_data(df, rules):
+    """Apply all configured cleaning rules in a single filtering pass.
+
+    The result is the same as applying :py:func:`remove_outliers`, :py:func:`drop_empty_content`
+    and :py:func:`drop_non_en_content` one after the other, without the intermediate copies.
+
+    Args:
+        df (:py:class:`pandas.DataFrame`): The DataFrame to clean.
+        rules (dict): Mapping from rule names in ``CLEAN_RULES`` to the rule parameters.
+
+    Returns:
+        :py:class:`pandas.DataFrame`: The DataFrame after cleaning.
+
+    """
+    keep, removed = build_clean_mask(df, rules)
+    for name, count in removed.items():
+        logger.info("Rule %s removed %s rows", name, count)
+    logger.info("Kept %s of %s rows", int(keep.sum()), len(df))
+    return df.loc[keep]
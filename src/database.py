@@ -1,10 +1,17 @@
+import contextlib
+import datetime
 import logging.config
+import queue
+import threading
+import time
 
 import sqlalchemy
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Column, Integer, BigInteger, String
+from sqlalchemy import Column, Integer, BigInteger, DateTime, String, event
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from src.metrics import REGISTRY
 
 logger = logging.getLogger(__name__)
 logger.setLevel("INFO")
@@ -18,7 +25,9 @@ class Tweets(Base):
 
     id = Column(Integer, primary_key=True)
     content = Column(String(280), unique=False, nullable=False)
-    retweets = Column(BigInteger, unique=False, nullable=False)
+    retweets = Column(BigInteger, unique=False, nullable=False, index=True)
+    # Nullable so that the column can be added to tables created before it existed
+    created_at = Column(DateTime, nullable=True, default=datetime.datetime.utcnow, index=True)
 
     def __repr__(self):
         return '<Tweet id %r>' % id
@@ -37,37 +46,210 @@ def create_db(engine_string):
     engine = sqlalchemy.create_engine(engine_string)
 
     Base.metadata.create_all(engine)
+    upgrade_schema(engine)
     logger.info("Database created.")
 
 
+def upgrade_schema(engine):
+    """Add the columns and indexes of the data models that are missing from existing tables.
+
+    Tables created before a column or index was added to their data model are not changed by
+    ``create_all``, so the missing columns are added as nullable columns and the missing indexes
+    are created.
+
+    Args:
+        engine (:py:class:`sqlalchemy.engine.Engine`): Engine of the database.
+
+    Returns:
+        None
+
+    """
+    inspector = sqlalchemy.inspect(engine)
+    quote = engine.dialect.identifier_preparer.quote
+    for table in Base.metadata.sorted_tables:
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                engine.execute("ALTER TABLE %s ADD COLUMN %s %s" % (
+                    quote(table.name), quote(column.name),
+                    column.type.compile(dialect=engine.dialect)))
+                logger.info("Added column %s to table %s", column.name, table.name)
+
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create(engine)
+                logger.info("Created index %s on table %s", index.name, table.name)
+
+
+def load_tweets(engine_string, chunks, content_column="content", retweets_column="retweets",
+                date_column="date"):
+    """Bulk load tweets into the database in a single transaction.
+
+    Each chunk is inserted with one multi-row insert, so loading does not go through the ORM
+    session nor commit once per tweet. Nothing is loaded if any chunk fails.
+
+    Args:
+        engine_string (str): Engine string.
+        chunks (iterable of :py:class:`pandas.DataFrame`): The tweets to load.
+        content_column (str): Name of the column with the tweet contents.
+        retweets_column (str): Name of the column with the number of retweets.
+        date_column (str): Name of the column with the time each tweet was posted, saved in UTC
+        as its creation time. Tweets without one are saved without a creation time.
+
+    Returns:
+        int: The number of tweets loaded.
+
+    """
+    import pandas as pd
+
+    engine = sqlalchemy.create_engine(engine_string)
+    insert = Tweets.__table__.insert()
+    rows = 0
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        for chunk in chunks:
+            contents = chunk[content_column].tolist()
+            retweets = chunk[retweets_column].astype("int64").tolist()
+            if date_column in chunk:
+                dates = pd.to_datetime(chunk[date_column], errors="coerce", utc=True)
+                created_at = [None if pd.isna(date) else date.tz_localize(None).to_pydatetime()
+                              for date in dates]
+            else:
+                created_at = [None] * len(chunk)
+            records = [{"content": content, "retweets": count, "created_at": date}
+                       for content, count, date in zip(contents, retweets, created_at)]
+            if records:
+                connection.execute(insert, records)
+            rows += len(records)
+            logger.debug("Inserted %s tweets", rows)
+    logger.info("Loaded %s tweets into the database in %.1f seconds", rows,
+                time.perf_counter() - start)
+    return rows
+
+
+def instrument_pool(engine, metrics=REGISTRY):
+    """Record the connection usage of the pool of an engine as metrics.
+
+    Args:
+        engine (:py:class:`sqlalchemy.engine.Engine`): Engine whose pool to instrument.
+        metrics (:py:class:`src.metrics.MetricsRegistry`): Registry to record the number of
+        opened and checked out connections in.
+
+    Returns:
+        None
+
+    """
+    opened = metrics.counter("db_pool_connections_opened_total",
+                             "Database connections opened by the pool")
+    checked_out = metrics.gauge("db_pool_checked_out",
+                                "Database connections currently checked out of the pool")
+    event.listen(engine, "connect", lambda dbapi_connection, record: opened.inc())
+    event.listen(engine, "checkout", lambda dbapi_connection, record, proxy: checked_out.inc())
+    event.listen(engine, "checkin", lambda dbapi_connection, record: checked_out.inc(-1))
+
+
 class TweetManager:
 
-    def __init__(self, app=None, engine_string=None):
+    def __init__(self, app=None, engine_string=None, write_behind=False, flush_size=100,
+                 flush_interval=1.0, max_queue_size=10000, engine_options=None,
+                 metrics=REGISTRY):
         """Initialize a TweetManager object.
 
+        Every thread gets its own session, which is removed after each use so that its
+        connection goes back to the pool. With a Flask app, the pool is configured by the
+        ``SQLALCHEMY_ENGINE_OPTIONS`` setting of the app instead of ``engine_options``.
+
+        In write-behind mode, :py:meth:`add_tweet` only queues the tweet. A background thread
+        inserts the queued tweets in bulk once ``flush_size`` of them are waiting or
+        ``flush_interval`` seconds after the first one was queued, and when the manager is closed.
+
         Args:
             app (Flask): Flask app.
             engine_string (str): Engine string.
+            write_behind (bool): Whether to queue tweets and insert them in bulk.
+            flush_size (int): Number of queued tweets that triggers a bulk insert.
+            flush_interval (float): Maximum seconds a tweet stays queued.
+            max_queue_size (int): Maximum number of queued tweets. Tweets added to a full queue
+            are dropped.
+            engine_options (dict): Keyword arguments for ``sqlalchemy.create_engine``, e.g. the
+            pool settings (optional).
+            metrics (:py:class:`src.metrics.MetricsRegistry`): Registry to record the pool
+            usage, commit latency, queue depth, flush latency, and written and dropped tweets in.
 
         """
         if app:
             self.db = SQLAlchemy(app)
             self.session = self.db.session
+            self.engine = self.db.engine
         elif engine_string:
-            engine = sqlalchemy.create_engine(engine_string)
-            Session = sessionmaker(bind=engine)
-            self.session = Session()
+            self.engine = sqlalchemy.create_engine(engine_string, **(engine_options or {}))
+            self.session = scoped_session(sessionmaker(bind=self.engine))
         else:
             raise ValueError("Need either an engine string or a Flask app to initialize")
+        instrument_pool(self.engine, metrics)
+        self.checkout_time = metrics.histogram("db_pool_checkout_seconds",
+                                               "Time taken to get a connection from the pool")
+        self.commit_time = metrics.stage("db_commit")
+
+        self.write_behind = write_behind
+        self._flusher = None
+        if write_behind:
+            self.flush_size = flush_size
+            self.flush_interval = flush_interval
+            self._queue = queue.Queue(maxsize=max_queue_size)
+            self._stopped = threading.Event()
+            self.queue_depth = metrics.gauge("db_write_queue_depth",
+                                             "Number of tweets waiting to be inserted")
+            self.flush_time = metrics.histogram("db_flush_seconds",
+                                                "Time taken by a bulk insert of queued tweets")
+            self.rows_written = metrics.counter("db_rows_written_total",
+                                                "Tweets inserted by bulk inserts")
+            self.rows_dropped = metrics.counter("db_rows_dropped_total",
+                                                "Tweets dropped because the queue was full or "
+                                                "their insert failed")
+            self._flusher = threading.Thread(target=self._run_flusher, name="tweet-writer",
+                                             daemon=True)
+            self._flusher.start()
 
     def close(self):
-        """Close session.
+        """Insert the queued tweets if any and close session.
 
         Returns:
             None
 
         """
-        self.session.close()
+        if self._flusher is not None and self._flusher.is_alive():
+            self._stopped.set()
+            self._flusher.join()
+            logger.info("Write-behind stopped: %s tweets written, %s dropped",
+                        self.rows_written.value, self.rows_dropped.value)
+        self.session.remove()
+
+    @contextlib.contextmanager
+    def session_scope(self):
+        """Provide the session of the current thread for a unit of work.
+
+        The work is committed if it succeeds and rolled back otherwise, then the session is
+        removed so that its connection goes back to the pool.
+
+        Yields:
+            :py:class:`sqlalchemy.orm.Session`: The session of the current thread.
+
+        """
+        session = self.session()
+        try:
+            start = time.perf_counter()
+            session.connection()
+            self.checkout_time.observe(time.perf_counter() - start)
+            yield session
+            with self.commit_time.timer():
+                session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            self.session.remove()
 
     def add_tweet(self, content, retweets):
         """Seed an existing database with additional tweets.
@@ -80,8 +262,87 @@ class TweetManager:
             None
 
         """
-        session = self.session
-        tweet = Tweets(content=content, retweets=retweets)
-        session.add(tweet)
-        session.commit()
+        if self.write_behind:
+            try:
+                self._queue.put_nowait({"content": content, "retweets": retweets})
+            except queue.Full:
+                self.rows_dropped.inc()
+                logger.warning("Write-behind queue is full, tweet dropped.")
+                return
+            self.queue_depth.inc()
+            logger.debug("Tweet queued for database.")
+            return
+
+        with self.session_scope() as session:
+            tweet = Tweets(content=content, retweets=retweets)
+            session.add(tweet)
         logger.info("Successfully added tweet to database.")
+
+    def _collect(self):
+        """Helper function to take the next rows to insert from the queue.
+
+        Returns:
+            :obj:`list` of dict: The rows, empty if the manager was closed and nothing is queued.
+
+        """
+        rows = []
+        while not rows:
+            try:
+                rows.append(self._queue.get(timeout=0.1))
+            except queue.Empty:
+                if self._stopped.is_set():
+                    return rows
+        deadline = time.monotonic() + self.flush_interval
+        while len(rows) < self.flush_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0 and not self._stopped.is_set():
+                    rows.append(self._queue.get(timeout=min(remaining, 0.1)))
+                else:
+                    rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                if remaining <= 0 or self._stopped.is_set():
+                    break
+        return rows
+
+    def _flush(self, rows):
+        """Helper function to insert rows in a single transaction."""
+        self.queue_depth.inc(-len(rows))
+        start = time.perf_counter()
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(Tweets.__table__.insert(), rows)
+        except Exception as e:
+            self.rows_dropped.inc(len(rows))
+            logger.error("Unable to insert %s queued tweets. Here is the original error: %s",
+                         len(rows), e)
+            return
+        elapsed = time.perf_counter() - start
+        self.flush_time.observe(elapsed)
+        self.rows_written.inc(len(rows))
+        logger.info("Inserted %s queued tweets in %.1f ms", len(rows), elapsed * 1000)
+
+    def _run_flusher(self):
+        """Helper function run by the background thread until the manager is closed."""
+        while True:
+            rows = self._collect()
+            if not rows:
+                return
+            self._flush(rows)
+
+    def stats(self):
+        """Summarize the connection pool and the write-behind queue.
+
+        Returns:
+            dict: The pool status and the connection checkout and commit latencies, and in
+            write-behind mode the number of queued, written and dropped tweets and the flush
+            latency.
+
+        """
+        stats = {"pool": self.engine.pool.status(),
+                 "checkout_seconds": self.checkout_time.summary(),
+                 "commit_seconds": self.commit_time.summary()}
+        if self.write_behind:
+            stats.update(queue_depth=self.queue_depth.value, written=self.rows_written.value,
+                         dropped=self.rows_dropped.value, flush_seconds=self.flush_time.summary())
+        return stats
@@ -0,0 +1,293 @@
+"""The metrics module.
+
+This module provides thread-safe counters, gauges and histograms to measure the serving path, a
+process-wide registry that holds them by name, and the rendering of the registry in the Prometheus
+text format.
+
+"""
+
+import bisect
+import contextlib
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+logger.setLevel("INFO")
+
+# Default histogram buckets for latencies in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Stages of serving a prediction, each timed by a histogram named <stage>_seconds
+STAGES = {"config_load": "Time taken to read the model configuration",
+          "tokenizer_load": "Time taken to load the vocabulary of the tokenizer",
+          "model_load": "Time taken to load the model",
+          "process_tweet": "Time taken to normalize a batch of tweets",
+          "tokenize": "Time taken to tokenize a batch of normalized tweets",
+          "inference": "Time taken by the forward pass of the model on a batch of tweets",
+          "db_commit": "Time taken to commit a tweet to the database",
+          "tweet_request": "Time taken to answer a posted tweet"}
+
+# Content type of the Prometheus text format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Counter:
+    """A value that only goes up, such as a number of requests."""
+
+    def __init__(self, name, description):
+        """Initialize a Counter object.
+
+        Args:
+            name (str): Name of the metric.
+            description (str): What the metric counts.
+
+        """
+        self.name = name
+        self.description = description
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        """Increase the counter.
+
+        Args:
+            amount (int/float): How much to increase the counter by.
+
+        Returns:
+            None
+
+        """
+        with self._lock:
+            self.value += amount
+
+
+class Gauge:
+    """A value that can go up and down, such as a queue depth."""
+
+    def __init__(self, name, description):
+        """Initialize a Gauge object.
+
+        Args:
+            name (str): Name of the metric.
+            description (str): What the metric measures.
+
+        """
+        self.name = name
+        self.description = description
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        """Set the gauge to a value.
+
+        Args:
+            value (int/float): The new value.
+
+        Returns:
+            None
+
+        """
+        self.value = value
+
+    def inc(self, amount=1):
+        """Increase the gauge.
+
+        Args:
+            amount (int/float): How much to increase the gauge by. Negative amounts decrease it.
+
+        Returns:
+            None
+
+        """
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    """Distribution of observed values, counted in cumulative buckets."""
+
+    def __init__(self, name, description, buckets=LATENCY_BUCKETS):
+        """Initialize a Histogram object.
+
+        Args:
+            name (str): Name of the metric.
+            description (str): What the metric measures.
+            buckets (:obj:`tuple` of float): Sorted upper bounds of the buckets. An unbounded
+            bucket is always added at the end.
+
+        """
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """Record an observed value.
+
+        Args:
+            value (int/float): The observed value.
+
+        Returns:
+            None
+
+        """
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q):
+        """Estimate a quantile of the observed values from the buckets.
+
+        The value is interpolated linearly within the bucket that contains the quantile, the same
+        way Prometheus' ``histogram_quantile`` does.
+
+        Args:
+            q (float): The quantile to estimate, between 0 and 1.
+
+        Returns:
+            float: The estimated quantile, or None if nothing was observed.
+
+        """
+        with self._lock:
+            counts = list(self.counts)
+            count = self.count
+        if count == 0:
+            return None
+        rank = q * count
+        cumulative = 0
+        for i, bucket_count in enumerate(counts):
+            if cumulative + bucket_count >= rank and bucket_count > 0:
+                if i == len(self.buckets):
+                    # The quantile is in the unbounded bucket
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i]
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+    def summary(self):
+        """Summarize the observed values.
+
+        Returns:
+            dict: The number of observations, their mean, and the estimated p50, p95 and p99.
+
+        """
+        return {"count": self.count, "mean": self.sum / self.count if self.count else None,
+                "p50": self.quantile(0.5), "p95": self.quantile(0.95),
+                "p99": self.quantile(0.99)}
+
+    @contextlib.contextmanager
+    def timer(self):
+        """Observe the seconds taken by the enclosed block, even if it raises.
+
+        Yields:
+            None
+
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class MetricsRegistry:
+    """Holder of all metrics of the process by name."""
+
+    def __init__(self):
+        """Initialize a MetricsRegistry object."""
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, description, **kwargs):
+        """Helper function to get a registered metric or register a new one."""
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = cls(name, description, **kwargs)
+                self.metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError("Metric %s is already registered as a %s"
+                                 % (name, type(metric).__name__))
+            return metric
+
+    def counter(self, name, description):
+        """Get the counter registered under a name, registering it on first use."""
+        return self._get_or_create(Counter, name, description)
+
+    def gauge(self, name, description):
+        """Get the gauge registered under a name, registering it on first use."""
+        return self._get_or_create(Gauge, name, description)
+
+    def histogram(self, name, description, buckets=LATENCY_BUCKETS):
+        """Get the histogram registered under a name, registering it on first use."""
+        return self._get_or_create(Histogram, name, description, buckets=buckets)
+
+    def stage(self, stage):
+        """Get the histogram timing a stage of serving a prediction.
+
+        Args:
+            stage (str): One of the stages listed in :py:data:`STAGES`.
+
+        Returns:
+            :py:class:`Histogram`: The histogram named ``<stage>_seconds``.
+
+        """
+        if stage not in STAGES:
+            raise ValueError("Expected one of the stages %s, got '%s'"
+                             % (", ".join(STAGES), stage))
+        return self.histogram(stage + "_seconds", STAGES[stage])
+
+    def render(self):
+        """Render all the metrics in the Prometheus text format.
+
+        The metrics are only read here, so recording them costs nothing more when nobody scrapes
+        them.
+
+        Returns:
+            str: The metrics, sorted by name, as served to Prometheus.
+
+        """
+        with self._lock:
+            metrics = sorted(self.metrics.items())
+        lines = []
+        for name, metric in metrics:
+            description = metric.description.replace("\\", "\\\\").replace("\n", "\\n")
+            lines.append("# HELP %s %s" % (name, description))
+            if isinstance(metric, Histogram):
+                with metric._lock:
+                    counts = list(metric.counts)
+                    total = metric.sum
+                lines.append("# TYPE %s histogram" % name)
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (math.inf,), counts):
+                    cumulative += count
+                    lines.append('%s_bucket{le="%s"} %s' % (name, _format_value(bound),
+                                                            cumulative))
+                lines.append("%s_sum %s" % (name, _format_value(total)))
+                lines.append("%s_count %s" % (name, cumulative))
+            else:
+                lines.append("# TYPE %s %s" % (name, type(metric).__name__.lower()))
+                lines.append("%s %s" % (name, _format_value(metric.value)))
+        return "\n".join(lines) + "\n"
+
+
+def _format_value(value):
+    """Helper function to format a sample value or bucket bound the way Prometheus parses it."""
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    return repr(value)
+
+
+# Registry shared by the whole process
+REGISTRY = MetricsRegistry()
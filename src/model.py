@@ -6,17 +6,20 @@ and evaluate and save the model's performance.
 """
 
 import logging
+import os
 import random
+import time
 
 import yaml
 import numpy as np
-import pickle5 as pickle
 import tensorflow as tf
 from sklearn import model_selection
 from tensorflow import keras
-from tensorflow.keras.preprocessing.sequence import pad_sequences
 from tensorflow.keras.preprocessing.text import Tokenizer
 
+from src.numpy_model import NumpyModel
+from src.tokenizer import Vocabulary, load_vocabulary
+
 logger = logging.getLogger(__name__)
 logger.setLevel("INFO")
 
@@ -70,10 +73,13 @@ def train_test_split(df, content_column, label_column, test_size, random_state):
 def fit_tokenizer(train_contents, oov_token, tokenizer_path):
     """Fit a tokenizer using training contents.
 
+    Only the vocabulary of the fitted tokenizer is saved, which is all that is needed to tokenize
+    contents afterwards.
+
     Args:
         train_contents (:py:class:`numpy.array`): The training texts as a numpy array.
         oov_token (str): Token to replace out-of-vocabulary words.
-        tokenizer_path (str): Path the save the trained tokenizer.
+        tokenizer_path (str): Path the save the vocabulary of the trained tokenizer.
 
     Returns:
         int: The vocabulary size of the trained tokenizer.
@@ -84,11 +90,10 @@ def fit_tokenizer(train_contents, oov_token, tokenizer_path):
     tokenizer.fit_on_texts(train_contents)
     logger.info("Successfully trained tokenizer")
 
-    # Save tokenizer
+    # Save tokenizer vocabulary
     try:
-        with open(tokenizer_path, 'wb') as handle:
-            pickle.dump(tokenizer, handle, protocol=pickle.HIGHEST_PROTOCOL)
-        logger.info("Tokenizer saved to %s", tokenizer_path)
+        Vocabulary.from_tokenizer(tokenizer).save(tokenizer_path)
+        logger.info("Tokenizer vocabulary saved to %s", tokenizer_path)
     except Exception as e:
         logger.error("Unable to save tokenizer. Here is the original error: %s", e)
 
@@ -99,11 +104,11 @@ def fit_tokenizer(train_contents, oov_token, tokenizer_path):
 
 
 def tokenize(contents, tokenizer_path, padding_type, max_length):
-    """Tokenize contents using a trained tokenizer.
+    """Tokenize contents using the vocabulary of a trained tokenizer.
 
     Args:
         contents (:py:class:`numpy.array`): The contents to tokenize as a pandas Series.
-        tokenizer_path (str): The path that points to the trained tokenizer.
+        tokenizer_path (str): The path that points to the vocabulary of the trained tokenizer.
         padding_type (str): Pad either before ('pre') or after ('post') each sequence.
         max_length (int): Maximum length of all sequences.
 
@@ -112,21 +117,16 @@ def tokenize(contents, tokenizer_path, padding_type, max_length):
         sub-array is the result of tokenizing and padding a input content.
 
     """
-    # Load tokenizer
+    # Load tokenizer vocabulary
     try:
-        with open(tokenizer_path, 'rb') as handle:
-            tokenizer = pickle.load(handle)
-        logger.info("Successfully loaded tokenizer from %s", tokenizer_path)
+        vocabulary = load_vocabulary(tokenizer_path)
     except FileNotFoundError:
         logger.error("Cannot find the specified tokenizer path %s", tokenizer_path)
     except Exception as e:
         logger.error("Unable to load tokenizer. Here is the original error: %s", e)
 
-    # Transform contents to sequences
-    sequences = tokenizer.texts_to_sequences(contents)
-
-    # Pad sequences
-    result = pad_sequences(sequences, padding=padding_type, maxlen=max_length)
+    # Transform contents to padded sequences
+    result = vocabulary.texts_to_padded(contents, max_length, padding_type)
     logger.info("Successfully tokenized tweet content")
     return result
 
@@ -168,7 +168,144 @@ def compile_model(vocab_size, embedding_params, lstm_params, dense_params, outpu
     return model
 
 
-def fit_model(model, train_data, train_labels, epochs, verbose, validation_split, model_path):
+class EpochTimer(keras.callbacks.Callback):
+    """Keras callback recording the wall time of each training epoch."""
+
+    def __init__(self):
+        """Initialize an EpochTimer object."""
+        super().__init__()
+        self.seconds = []
+        self._start = None
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.seconds.append(time.perf_counter() - self._start)
+        logger.info("Epoch %s took %.2f seconds", epoch + 1, self.seconds[-1])
+
+
+class TrainingCheckpoint(keras.callbacks.Callback):
+    """Keras callback saving the weights and optimizer state of a model every few epochs, so that
+    an interrupted training can be resumed from its last checkpoint."""
+
+    def __init__(self, model, checkpoint_dir, max_to_keep=3, save_every=1):
+        """Initialize a TrainingCheckpoint object.
+
+        Args:
+            model (:py:class:`tf.keras.Model`): The compiled model to checkpoint.
+            checkpoint_dir (str): Directory to save the checkpoints to.
+            max_to_keep (int): Number of most recent checkpoints to keep.
+            save_every (int): Number of epochs between checkpoints.
+
+        """
+        super().__init__()
+        self.save_every = save_every
+        self.epoch = tf.Variable(0, dtype=tf.int64, trainable=False)
+        self._checkpoint = tf.train.Checkpoint(model=model, optimizer=model.optimizer,
+                                               epoch=self.epoch)
+        self.manager = tf.train.CheckpointManager(self._checkpoint, checkpoint_dir,
+                                                  max_to_keep=max_to_keep)
+
+    def restore(self):
+        """Restore the model and optimizer from the last checkpoint, if any.
+
+        The optimizer state is restored once the optimizer creates its variables, at the start of
+        training.
+
+        Returns:
+            int: Number of epochs already trained.
+
+        """
+        if self.manager.latest_checkpoint is None:
+            logger.warning("No checkpoint to resume from in %s", self.manager.directory)
+            return 0
+        self._checkpoint.restore(self.manager.latest_checkpoint)
+        logger.info("Resumed from %s after %s epochs", self.manager.latest_checkpoint,
+                    int(self.epoch.numpy()))
+        return int(self.epoch.numpy())
+
+    def _save(self):
+        """Helper function to save a checkpoint numbered after the epochs trained so far."""
+        path = self.manager.save(checkpoint_number=int(self.epoch.numpy()))
+        logger.info("Checkpoint saved to %s", path)
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.epoch.assign(epoch + 1)
+        if (epoch + 1) % self.save_every == 0:
+            self._save()
+
+    def on_train_end(self, logs=None):
+        # Also save the last epoch, e.g. when early stopping ends training between checkpoints
+        if self.epoch.numpy() and self.epoch.numpy() % self.save_every != 0:
+            self._save()
+
+
+def sequence_lengths(data):
+    """Calculate the length of padded sequences without their trailing padding.
+
+    Args:
+        data (:py:class:`numpy.array`): Integer matrix with one padded sequence per row.
+
+    Returns:
+        :py:class:`numpy.array`: The length of each sequence, at least 1.
+
+    """
+    nonzero = np.asarray(data) != 0
+    # Position of the last word of each sequence, counted from the end
+    from_end = np.argmax(nonzero[:, ::-1], axis=1)
+    return np.where(nonzero.any(axis=1), nonzero.shape[1] - from_end, 1)
+
+
+def make_dataset(data, labels, batch_size, bucket_boundaries=None, shuffle_buffer=None,
+                 cache=True, seed=None):
+    """Build a tf.data pipeline that batches padded sequences with as little padding as possible.
+
+    The trailing padding of each sequence is cut off but for one step, then each batch is padded to
+    its longest sequence only. With bucket boundaries, sequences of similar lengths are batched
+    together so that batches of short sequences are not padded to the length of a long one.
+    Sequences padded at the front ('pre') keep their padding.
+
+    The model must mask the padding, e.g. with ``mask_zero`` in its embedding layer, to predict the
+    same for trimmed and fully padded sequences. The masked steps still output zeros to the max
+    pooling, so the step of padding that is kept makes sure every sequence that is padded when
+    served is also padded in training.
+
+    Args:
+        data (:py:class:`numpy.array`): The padded sequences.
+        labels (:py:class:`numpy.array`): The labels.
+        batch_size (int): Number of sequences per batch.
+        bucket_boundaries (:obj:`list` of :obj:`int`): Upper bounds (exclusive) of the sequence
+        lengths of each bucket but the last (optional, default no bucketing).
+        shuffle_buffer (int): Number of sequences to shuffle at a time, reshuffled every epoch
+        (optional, default no shuffling).
+        cache (bool): Whether to keep the trimmed sequences in memory after the first epoch.
+        seed (int): Seed of the shuffling (optional).
+
+    Returns:
+        :py:class:`tf.data.Dataset`: Batches of sequences and labels, prefetched in the
+        background.
+
+    """
+    lengths = np.minimum(sequence_lengths(data) + 1, np.shape(data)[1])
+    dataset = tf.data.Dataset.from_tensor_slices((data, lengths, labels))
+    dataset = dataset.map(lambda sequence, length, label: (sequence[:length], label),
+                          num_parallel_calls=tf.data.experimental.AUTOTUNE)
+    if cache:
+        dataset = dataset.cache()
+    if shuffle_buffer:
+        dataset = dataset.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+    if bucket_boundaries:
+        dataset = dataset.apply(tf.data.experimental.bucket_by_sequence_length(
+            lambda sequence, label: tf.shape(sequence)[0], bucket_boundaries,
+            [batch_size] * (len(bucket_boundaries) + 1)))
+    else:
+        dataset = dataset.padded_batch(batch_size, padded_shapes=([None], []))
+    return dataset.prefetch(tf.data.experimental.AUTOTUNE)
+
+
+def fit_model(model, train_data, train_labels, epochs, verbose, validation_split, model_path,
+              input_pipeline=None, early_stopping=None, checkpoint=None, resume=False):
     """Fit a keras model using provided training set.
 
     Args:
@@ -181,26 +318,187 @@ def fit_model(model, train_data, train_labels, epochs, verbose, validation_split
         that the validation data is selected from the last samples of the training data, and thus
         the process is deterministic.
         model_path (str): Path to save the trained model.
+        input_pipeline (dict): Keyword arguments of :py:func:`make_dataset` to feed the training
+        and validation data through a tf.data pipeline, e.g. the batch size and bucket boundaries
+        (optional, default the padded arrays are fed as they are). The validation data is neither
+        bucketed nor shuffled. The model must mask the padding, see :py:func:`make_dataset`.
+        early_stopping (dict): Keyword arguments of :py:class:`tf.keras.callbacks.EarlyStopping`
+        to stop training once the validation loss stops improving, e.g. the patience (optional).
+        checkpoint (dict): Keyword arguments of :py:class:`TrainingCheckpoint` to save the model
+        and optimizer state while training, e.g. the checkpoint directory (optional).
+        resume (bool): Whether to continue training from the last checkpoint.
 
     Returns:
-        None
+        :obj:`list` of float: The wall time of each epoch in seconds.
 
     """
+    if input_pipeline is not None and not getattr(model.layers[0], "mask_zero", False):
+        raise ValueError("The input pipeline trims the padding, which needs an embedding layer "
+                         "with mask_zero to predict the same as on the fully padded sequences")
     logger.info("Fitting neural network model")
-    model.fit(train_data, train_labels, epochs=epochs, verbose=verbose,
-              validation_split=validation_split)
+    timer = EpochTimer()
+    callbacks = [timer]
+    initial_epoch = 0
+    if checkpoint is not None:
+        checkpointer = TrainingCheckpoint(model, **checkpoint)
+        if resume:
+            initial_epoch = checkpointer.restore()
+        callbacks.append(checkpointer)
+    elif resume:
+        raise ValueError("Training can only be resumed with a checkpoint configuration")
+    if early_stopping is not None:
+        # The patience is counted again from the first epoch after resuming
+        callbacks.append(keras.callbacks.EarlyStopping(**early_stopping))
+
+    if input_pipeline is None:
+        model.fit(train_data, train_labels, epochs=epochs, verbose=verbose,
+                  validation_split=validation_split, callbacks=callbacks,
+                  initial_epoch=initial_epoch)
+    else:
+        # Hold out the last samples for validation, the same way as validation_split does
+        split = int(len(train_data) * (1 - validation_split))
+        train_dataset = make_dataset(train_data[:split], train_labels[:split], **input_pipeline)
+        validation_dataset = make_dataset(train_data[split:], train_labels[split:],
+                                          input_pipeline["batch_size"],
+                                          cache=input_pipeline.get("cache", True))
+        model.fit(train_dataset, epochs=epochs, verbose=verbose,
+                  validation_data=validation_dataset, callbacks=callbacks,
+                  initial_epoch=initial_epoch)
+    if timer.seconds:
+        logger.info("Trained %s epochs, mean epoch time: %.2f seconds (%.2f seconds for the first "
+                    "epoch)", len(timer.seconds), np.mean(timer.seconds), timer.seconds[0])
     model.save(model_path)
     logger.info("Training complete! Model saved to %s", model_path)
+    return timer.seconds
+
+
+def _path_size(path):
+    """Helper function to get the size in bytes of a file, or of all the files in a directory."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names)
+
+
+def accuracy_report(predictions, labels, retweet_buckets=None):
+    """Calculate the MAPE and MAE of predictions, overall and by number of retweets.
+
+    Args:
+        predictions (:py:class:`numpy.array`): The predicted number of retweets, rounded to whole
+        retweets before comparing.
+        labels (:py:class:`numpy.array`): The actual number of retweets.
+        retweet_buckets (:obj:`list` of :obj:`int`): Increasing bucket boundaries of the actual
+        number of retweets, e.g. ``[5000, 10000]`` for the buckets 0-5000, 5000-10000 and 10000+
+        (optional).
+
+    Returns:
+        dict: The MAPE and MAE, and per bucket the number of tweets along with their MAPE and MAE.
+
+    """
+    predictions = np.round(np.asarray(predictions, dtype=np.float64).reshape(-1))
+    labels = np.asarray(labels, dtype=np.float64).reshape(-1)
+    if len(predictions) != len(labels):
+        raise ValueError("Got %s predictions for %s labels" % (len(predictions), len(labels)))
+    errors = np.abs(predictions - labels)
+    report = {"mape": float(np.mean(errors / labels) * 100), "mae": float(np.mean(errors))}
+
+    if retweet_buckets:
+        edges = [0] + list(retweet_buckets) + [np.inf]
+        report["buckets"] = []
+        for low, high in zip(edges[:-1], edges[1:]):
+            in_bucket = (labels >= low) & (labels < high)
+            bucket = {"retweets": "%s-%s" % (low, high) if high != np.inf else "%s+" % low,
+                      "count": int(in_bucket.sum())}
+            if bucket["count"]:
+                bucket.update(mape=float(np.mean(errors[in_bucket] / labels[in_bucket]) * 100),
+                              mae=float(np.mean(errors[in_bucket])))
+            report["buckets"].append(bucket)
+    return report
+
+
+def latency_report(predict_fn, test_data, batch_size, max_batches=None):
+    """Time the predictions of a model for batches of a given size.
+
+    Args:
+        predict_fn (callable): Function returning the outputs of the model for a batch.
+        test_data (:py:class:`numpy.array`): The test data.
+        batch_size (int): Number of test samples predicted at a time.
+        max_batches (int): Maximum number of batches to time (optional, default the whole test
+        data).
+
+    Returns:
+        dict: The number of batches timed, the throughput in tweets per second, and the median,
+        95th and 99th percentile latency of a batch in milliseconds.
+
+    """
+    # Warm up the model so that the one-off setup of the first call is not timed
+    predict_fn(test_data[:batch_size])
+
+    latencies, tweets = [], 0
+    for start in range(0, len(test_data), batch_size):
+        if max_batches and len(latencies) >= max_batches:
+            break
+        batch = test_data[start:start + batch_size]
+        batch_start = time.perf_counter()
+        predict_fn(batch)
+        latencies.append(time.perf_counter() - batch_start)
+        tweets += len(batch)
+    latencies_ms = np.array(latencies) * 1000
+    return {"batches": len(latencies), "tweets_per_second": float(tweets / sum(latencies)),
+            "latency_ms": {"p50": float(np.percentile(latencies_ms, 50)),
+                           "p95": float(np.percentile(latencies_ms, 95)),
+                           "p99": float(np.percentile(latencies_ms, 99))}}
+
+
+def evaluate_model(predict_fn, test_data, test_labels, batch_sizes, retweet_buckets=None,
+                   max_batches=None):
+    """Measure the accuracy of a model on the test data along with its inference cost.
+
+    Args:
+        predict_fn (callable): Function returning the outputs of the model for a batch.
+        test_data (:py:class:`numpy.array`): The test data.
+        test_labels (:py:class:`numpy.array`): The test labels.
+        batch_sizes (:obj:`list` of :obj:`int`): Batch sizes to time the model with. The whole
+        test data is predicted in batches of the largest one to measure the accuracy.
+        retweet_buckets (:obj:`list` of :obj:`int`): Bucket boundaries of the number of retweets
+        to break the accuracy down by (optional).
+        max_batches (int): Maximum number of batches to time per batch size (optional).
+
+    Returns:
+        dict: The ``accuracy`` as calculated by :py:func:`accuracy_report`, and the ``serving``
+        cost of each batch size as calculated by :py:func:`latency_report`.
+
+    """
+    largest = max(batch_sizes)
+    predictions = [predict_fn(test_data[start:start + largest])
+                   for start in range(0, len(test_data), largest)]
+    return {"accuracy": accuracy_report(np.concatenate(predictions), test_labels,
+                                        retweet_buckets),
+            "serving": {batch_size: latency_report(predict_fn, test_data, batch_size, max_batches)
+                        for batch_size in batch_sizes}}
 
 
-def calculate_mape(test_data, test_labels, fitted_model_path, output_path):
+def calculate_mape(test_data, test_labels, fitted_model_path, output_path, variants=None,
+                   batch_sizes=(1024,), retweet_buckets=None, max_batches=None):
     """Calculate the Mean Absolute Percentage Error (MAPE) of a trained model.
 
+    The MAE, the accuracy by number of retweets, and the throughput and latency for each batch
+    size are saved along with the MAPE. The variants of the model exported to NumPy weights, e.g.
+    quantized ones, are evaluated on the same test data, so that their accuracy, size and serving
+    cost can be compared with the trained model.
+
     Args:
         fitted_model_path (str): The path that points to a fitted model.
         test_data (:py:class:`numpy.array`): The test data.
         test_labels (:py:class:`numpy.array`): The test labels.
         output_path (str): The path to a yaml file to save the calculated MAPE.
+        variants (dict): Paths of the weights of the model variants by name, as saved by
+        :py:func:`src.numpy_model.export_weights` or :py:func:`src.numpy_model.quantize_weights`
+        (optional).
+        batch_sizes (:obj:`list` of :obj:`int`): Batch sizes to time the models with.
+        retweet_buckets (:obj:`list` of :obj:`int`): Bucket boundaries of the number of retweets
+        to break the accuracy down by (optional).
+        max_batches (int): Maximum number of batches to time per batch size (optional).
 
     Returns:
         None
@@ -213,11 +511,30 @@ def calculate_mape(test_data, test_labels, fitted_model_path, output_path):
         logger.error("Fitted model does not exist at the specified path %s", fitted_model_path)
 
     logger.info("Calculating predictions using %s test samples", len(test_labels))
-    pred = np.round(model.predict(test_data))
-    mape = float(np.mean(abs(pred - test_labels) / test_labels) * 100)
+    models = {"keras": (model.predict_on_batch, fitted_model_path, None)}
+    for name, weights_path in (variants or {}).items():
+        variant = NumpyModel.load(weights_path)
+        models[name] = (lambda batch, variant=variant: variant.predict(batch, len(batch)),
+                        weights_path, variant.nbytes)
+
+    performance = {"models": {}}
+    for name, (predict_fn, path, memory_bytes) in models.items():
+        result = evaluate_model(predict_fn, test_data, test_labels, batch_sizes, retweet_buckets,
+                                max_batches)
+        result["size_bytes"] = _path_size(path)
+        if memory_bytes is not None:
+            result["memory_bytes"] = memory_bytes
+        performance["models"][name] = result
+        logger.info("Test MAPE of %s: %s, MAE: %s", name, result["accuracy"]["mape"],
+                    result["accuracy"]["mae"])
+        for batch_size, serving in result["serving"].items():
+            logger.info("%s with batches of %s: %.0f tweets per second, p99 latency %.1f ms", name,
+                        batch_size, serving["tweets_per_second"], serving["latency_ms"]["p99"])
+
+    # The MAPE of the trained model stays at the top for the readers of the single number
+    mape = performance["models"]["keras"]["accuracy"]["mape"]
     logger.info("Test MAPE: %s", mape)
-
-    mape_dict = {"mape": mape}
+    performance.update(mape=mape, mae=performance["models"]["keras"]["accuracy"]["mae"])
     with open(output_path, 'w') as f:
-        yaml.dump(mape_dict, f)
+        yaml.dump(performance, f)
     logger.info("Result saved to %s", output_path)
@@ -0,0 +1,250 @@
+"""The NumPy model module.
+
+This module provides an exporter that saves the weights of a trained model built by
+:py:func:`src.model.compile_model` to a flat array file, and a forward pass of the same network in
+NumPy, so that predictions can be calculated without importing TensorFlow. The exported weights can
+be quantized to int8 or float16 to shrink the model.
+
+"""
+
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+logger.setLevel("INFO")
+
+# Layers built by src.model.compile_model, in order
+ARCHITECTURE = ["Embedding", "Bidirectional", "GlobalMaxPooling1D", "Dropout", "Dense", "Dropout",
+                "Dense"]
+
+# Activations of the dense layers supported by the forward pass
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0),
+}
+
+
+# Weight matrices that are quantized, the biases stay in float32
+QUANTIZED_WEIGHTS = ["embedding", "forward_kernel", "forward_recurrent_kernel", "backward_kernel",
+                     "backward_recurrent_kernel", "dense_kernel", "output_kernel"]
+
+
+def _sigmoid(x):
+    """Helper function to calculate the logistic sigmoid without overflow warnings."""
+    return 0.5 * (np.tanh(0.5 * x) + 1)
+
+
+def export_weights(fitted_model_path, weights_path):
+    """Save the weights of a trained Keras model as arrays in a single ``.npz`` file.
+
+    Args:
+        fitted_model_path (str): The path that points to a trained model.
+        weights_path (str): Path to save the weights to.
+
+    Returns:
+        None
+
+    """
+    from tensorflow import keras
+
+    model = keras.models.load_model(fitted_model_path)
+    layers = [type(layer).__name__ for layer in model.layers]
+    if layers != ARCHITECTURE:
+        raise ValueError("Expected the layers %s built by compile_model, got %s"
+                         % (ARCHITECTURE, layers))
+    embedding, bidirectional, _, _, dense, _, output = model.layers
+    if bidirectional.merge_mode != "concat":
+        raise ValueError("Merge modes other than concat are not supported")
+
+    arrays = {"embedding": embedding.embeddings.numpy(), "mask_zero": np.array(embedding.mask_zero)}
+    for direction, lstm in [("forward", bidirectional.forward_layer),
+                            ("backward", bidirectional.backward_layer)]:
+        config = lstm.get_config()
+        if (config["activation"], config["recurrent_activation"]) != ("tanh", "sigmoid") \
+                or not config["use_bias"]:
+            raise ValueError("Only LSTM layers with tanh and sigmoid activations and a bias are "
+                             "supported")
+        kernel, recurrent_kernel, bias = [weight.numpy() for weight in lstm.weights]
+        arrays[direction + "_kernel"] = kernel
+        arrays[direction + "_recurrent_kernel"] = recurrent_kernel
+        arrays[direction + "_bias"] = bias
+    for name, layer in [("dense", dense), ("output", output)]:
+        activation = layer.get_config()["activation"]
+        if activation not in ACTIVATIONS:
+            raise ValueError("Activation '%s' of layer %s is not supported"
+                             % (activation, layer.name))
+        arrays[name + "_kernel"], arrays[name + "_bias"] = [w.numpy() for w in layer.weights]
+        arrays[name + "_activation"] = np.array(activation)
+
+    np.savez(weights_path, **arrays)
+    logger.info("Weights of %s exported to %s", fitted_model_path, weights_path)
+
+
+def quantize_weights(weights_path, quantized_path, dtype="int8"):
+    """Save a quantized copy of the weights exported by :py:func:`export_weights`.
+
+    With int8, each column of a weight matrix is scaled so that its largest absolute value maps to
+    127, and the scales are saved along with the matrix. With float16, the matrices are cast.
+
+    Args:
+        weights_path (str): The path that points to the exported weights.
+        quantized_path (str): Path to save the quantized weights to.
+        dtype (str): Either 'int8' or 'float16'.
+
+    Returns:
+        None
+
+    """
+    if dtype not in ("int8", "float16"):
+        raise ValueError("Expected dtype 'int8' or 'float16', got '%s'" % dtype)
+    with np.load(weights_path, allow_pickle=False) as weights:
+        arrays = dict(weights)
+
+    for name in QUANTIZED_WEIGHTS:
+        weight = arrays[name].astype(np.float32)
+        if dtype == "float16":
+            arrays[name] = weight.astype(np.float16)
+            continue
+        scale = np.abs(weight).max(axis=0) / 127
+        scale[scale == 0] = 1
+        arrays[name] = np.clip(np.rint(weight / scale), -127, 127).astype(np.int8)
+        arrays[name + "_scale"] = scale.astype(np.float32)
+
+    np.savez(quantized_path, **arrays)
+    logger.info("Weights of %s quantized to %s and saved to %s", weights_path, dtype,
+                quantized_path)
+
+
+def _dequantize(weights, name):
+    """Helper function to get a weight matrix in float32, scaling it back if it was quantized."""
+    weight = np.asarray(weights[name]).astype(np.float32)
+    if name + "_scale" in weights:
+        weight *= weights[name + "_scale"]
+    return weight
+
+
+class NumpyModel:
+    """Forward pass of the Embedding, bidirectional LSTM, global max pooling and dense layers
+    built by :py:func:`src.model.compile_model`, in inference mode."""
+
+    def __init__(self, weights):
+        """Initialize a NumpyModel object.
+
+        Args:
+            weights (dict): The arrays saved by :py:func:`export_weights`.
+
+        """
+        # The embedding stays quantized in memory and only the looked up rows are scaled back,
+        # the other weights are small and scaled back once
+        self.embedding = np.asarray(weights["embedding"])
+        self.embedding_scale = weights.get("embedding_scale")
+        # Weights exported before masking was supported are of models without masking
+        self.mask_zero = bool(weights.get("mask_zero", False))
+        self.lstms = [tuple(_dequantize(weights, direction + suffix)
+                            for suffix in ("_kernel", "_recurrent_kernel", "_bias"))
+                      for direction in ("forward", "backward")]
+        self.dense = [(_dequantize(weights, name + "_kernel"),
+                       np.asarray(weights[name + "_bias"], dtype=np.float32),
+                       ACTIVATIONS[str(weights[name + "_activation"])])
+                      for name in ("dense", "output")]
+
+    @classmethod
+    def load(cls, weights_path):
+        """Load a NumpyModel from the weights saved by :py:func:`export_weights`.
+
+        Args:
+            weights_path (str): The path that points to the saved weights.
+
+        Returns:
+            :py:class:`NumpyModel`: The model.
+
+        """
+        with np.load(weights_path, allow_pickle=False) as weights:
+            model = cls(dict(weights))
+        logger.info("Loaded NumPy model from %s", weights_path)
+        return model
+
+    @property
+    def nbytes(self):
+        """int: Memory taken by the weights of the model in bytes."""
+        arrays = [self.embedding] + [array for lstm in self.lstms for array in lstm] \
+            + [array for kernel, bias, _ in self.dense for array in (kernel, bias)]
+        if self.embedding_scale is not None:
+            arrays.append(self.embedding_scale)
+        return sum(array.nbytes for array in arrays)
+
+    @staticmethod
+    def _lstm_max(inputs, kernel, recurrent_kernel, bias, reverse, mask=None):
+        """Helper function to run an LSTM over sequences and max-pool its outputs over time.
+
+        The order of the time steps does not matter to the max pooling, so the outputs of the
+        backward direction do not need to be reversed back. As in Keras, masked steps keep the
+        state of the previous step and output zeros, which are max-pooled too.
+
+        Args:
+            inputs (:py:class:`numpy.array`): Embedded sequences of shape (batch, time, features).
+            kernel (:py:class:`numpy.array`): Input weights of the gates i, f, c, o.
+            recurrent_kernel (:py:class:`numpy.array`): Recurrent weights of the gates.
+            bias (:py:class:`numpy.array`): Biases of the gates.
+            reverse (bool): Whether to read the sequences backwards.
+            mask (:py:class:`numpy.array`): Boolean matrix of shape (batch, time), False for the
+            steps to skip (optional).
+
+        Returns:
+            :py:class:`numpy.array`: The maximum output of each unit, of shape (batch, units).
+
+        """
+        batch_size, steps, _ = inputs.shape
+        units = recurrent_kernel.shape[0]
+        # Input contributions to the gates of all the time steps at once
+        gates_x = inputs @ kernel + bias
+        h = np.zeros((batch_size, units), dtype=np.float32)
+        c = np.zeros((batch_size, units), dtype=np.float32)
+        pooled = np.full((batch_size, units), -np.inf, dtype=np.float32)
+        for t in (reversed(range(steps)) if reverse else range(steps)):
+            z = gates_x[:, t] + h @ recurrent_kernel
+            i = _sigmoid(z[:, :units])
+            f = _sigmoid(z[:, units:2 * units])
+            g = np.tanh(z[:, 2 * units:3 * units])
+            o = _sigmoid(z[:, 3 * units:])
+            if mask is None:
+                c = f * c + i * g
+                h = o * np.tanh(c)
+                np.maximum(pooled, h, out=pooled)
+            else:
+                step = mask[:, t, None]
+                c = np.where(step, f * c + i * g, c)
+                h_step = o * np.tanh(c)
+                h = np.where(step, h_step, h)
+                np.maximum(pooled, np.where(step, h_step, 0), out=pooled)
+        return pooled
+
+    def predict(self, sequences, batch_size=1024):
+        """Calculate the outputs of the model for padded sequences of word indices.
+
+        Args:
+            sequences (:py:class:`numpy.array`): Integer matrix with one row per sequence.
+            batch_size (int): Number of sequences in each forward pass.
+
+        Returns:
+            :py:class:`numpy.array`: The outputs of the model, of shape (sequences, outputs).
+
+        """
+        sequences = np.asarray(sequences)
+        outputs = []
+        for start in range(0, len(sequences), batch_size):
+            batch = sequences[start:start + batch_size]
+            inputs = self.embedding[batch].astype(np.float32, copy=False)
+            if self.embedding_scale is not None:
+                inputs *= self.embedding_scale
+            mask = batch != 0 if self.mask_zero else None
+            x = np.concatenate([self._lstm_max(inputs, *self.lstms[0], reverse=False, mask=mask),
+                                self._lstm_max(inputs, *self.lstms[1], reverse=True, mask=mask)],
+                               axis=1)
+            for kernel, bias, activation in self.dense:
+                x = activation(x @ kernel + bias)
+            outputs.append(x)
+        if not outputs:
+            return np.zeros((0, self.dense[-1][0].shape[1]), dtype=np.float32)
+        return np.concatenate(outputs)
@@ -1,21 +1,138 @@
 """The prediction module.
 
-This module provides the functionality to calculate predictions using a pre-trained model.
+This module provides the functionality to calculate predictions using a pre-trained model. Models
+exported to NumPy weights by :py:func:`src.numpy_model.export_weights` are run without importing
+TensorFlow.
 
 """
 
 import logging
+from collections import OrderedDict
 
-from tensorflow import keras
+import numpy as np
 
-from src.model import tokenize
-from src.process import process_tweet
+from src.cache import PredictionCache
+from src.metrics import REGISTRY
+from src.numpy_model import NumpyModel
+from src.process import get_normalizer
+from src.registry import artifact_version
+from src.tokenizer import load_vocabulary
 
 logger = logging.getLogger(__name__)
 logger.setLevel("INFO")
 
+# One loaded model per path along with the version it was loaded at, shared by all callers in the
+# process
+_models = {}
 
-def predict(input_tweet, nltk_data_path, tokenizer_path, padding_type, max_length, fitted_model_path):
+# Predictions of the normalized tweets scored by predict, shared by all callers in the process
+_prediction_cache = PredictionCache()
+
+# Time taken by each stage of a prediction
+_model_load_time = REGISTRY.stage("model_load")
+_process_time = REGISTRY.stage("process_tweet")
+_tokenize_time = REGISTRY.stage("tokenize")
+_inference_time = REGISTRY.stage("inference")
+
+
+def load_model(fitted_model_path):
+    """Get the shared model saved at a path, loading it on first use or when it changed.
+
+    Args:
+        fitted_model_path (str): The path that points to a trained Keras model, or to its weights
+        exported as a ``.npz`` file.
+
+    Returns:
+        :py:class:`src.numpy_model.NumpyModel` or :py:class:`tensorflow.keras.Model`: The
+        trained model.
+
+    """
+    version = artifact_version([fitted_model_path])
+    loaded_version, model = _models.get(fitted_model_path, (None, None))
+    if model is None or loaded_version != version:
+        try:
+            logger.info("Loading pre-trained model from %s", fitted_model_path)
+            with _model_load_time.timer():
+                if fitted_model_path.endswith(".npz"):
+                    model = NumpyModel.load(fitted_model_path)
+                else:
+                    from tensorflow import keras
+                    model = keras.models.load_model(fitted_model_path)
+        except OSError:
+            logger.error("Fitted model does not exist at the specified path %s",
+                         fitted_model_path)
+            raise
+        _models[fitted_model_path] = (version, model)
+    return model
+
+
+def predict_batch(texts, nltk_data_path, tokenizer_path, padding_type, max_length,
+                  fitted_model_path, lemma_table_path=None, batch_size=1024, cache=None):
+    """Predict number of retweets of many tweets at once using a pre-trained model.
+
+    The text normalizer, the vocabulary and the model are loaded once per process, and the tweets
+    are normalized, tokenized and scored as whole batches.
+
+    Args:
+        texts (iterable of str): The input tweets.
+        nltk_data_path (str): The path that points to the downloaded NLTK data.
+        tokenizer_path (str): The path that points to a trained tokenizer.
+        padding_type (str): Pad either before ('pre') or after ('post') each sequence.
+        max_length (int): Maximum length of all sequences.
+        fitted_model_path (str): The path that points to a trained Keras model, or to its weights
+        exported as a ``.npz`` file.
+        lemma_table_path (str): The path that points to a precomputed lemma table (optional).
+        batch_size (int): Number of tweets in each forward pass of the model.
+        cache (:py:class:`src.cache.PredictionCache`): Cache of the predictions of normalized
+        tweets, keyed by the version of the model, vocabulary and lemma table files (optional).
+
+    Returns:
+        :py:class:`numpy.array`: The predicted number of retweets of each tweet.
+
+    """
+    texts = list(texts)
+    if not texts:
+        return np.zeros(0, dtype=np.int64)
+
+    # Process
+    with _process_time.timer():
+        processed = get_normalizer(nltk_data_path,
+                                   lemma_table_path=lemma_table_path).normalize_many(texts)
+
+    # Only score the distinct normalized tweets that are not cached
+    cached = {}
+    if cache is not None:
+        version = artifact_version([fitted_model_path, tokenizer_path, lemma_table_path])
+        for text in processed:
+            prediction = cache.get(version, text)
+            if prediction is not None:
+                cached[text] = prediction
+    missing = list(OrderedDict.fromkeys(text for text in processed if text not in cached))
+
+    if missing:
+        # Tokenize
+        vocabulary = load_vocabulary(tokenizer_path)
+        with _tokenize_time.timer():
+            tokenized = vocabulary.texts_to_padded(missing, max_length, padding_type)
+
+        # Calculate predictions
+        model = load_model(fitted_model_path)
+        with _inference_time.timer():
+            if isinstance(model, NumpyModel):
+                predictions = model.predict(tokenized, batch_size=batch_size)
+            else:
+                predictions = model.predict(tokenized, batch_size=batch_size, verbose=0)
+        for text, prediction in zip(missing, np.rint(predictions[:, 0]).astype(np.int64)):
+            cached[text] = int(prediction)
+            if cache is not None:
+                cache.put(version, text, int(prediction))
+    logger.info("Calculated predictions for %s tweets, %s of them with the model", len(texts),
+                len(missing))
+    return np.array([cached[text] for text in processed], dtype=np.int64)
+
+
+def predict(input_tweet, nltk_data_path, tokenizer_path, padding_type, max_length, fitted_model_path,
+            lemma_table_path=None):
     """Predict number of retweets using a pre-trained model.
 
     Args:
@@ -25,27 +142,32 @@ def predict(input_tweet, nltk_data_path, tokenizer_path, padding_type, max_lengt
         padding_type (str): Pad either before ('pre') or after ('post') each sequence.
         max_length (int): Maximum length of all sequences.
         fitted_model_path (str): The path that points to a trained model.
+        lemma_table_path (str): The path that points to a precomputed lemma table (optional).
 
     Returns:
         int: The predicted number of retweets.
 
     """
-    # Process
-    processed = process_tweet(input_tweet, nltk_data_path)
-    logger.info("Input tweet processed.")
-
-    # Tokenize
-    tokenized = tokenize([processed], tokenizer_path, padding_type, max_length)
-
-    # Load fitted model
-    try:
-        logger.info("Loading pre-trained model from %s", fitted_model_path)
-        model = keras.models.load_model(fitted_model_path)
-    except OSError:
-        logger.error("Fitted model does not exist at the specified path %s", fitted_model_path)
-
-    # Calculate prediction
-    logger.info("Calculating predictions.")
-    prediction = round(model.predict(tokenized)[0][0])
+    prediction = int(predict_batch([input_tweet], nltk_data_path, tokenizer_path, padding_type,
+                                   max_length, fitted_model_path, lemma_table_path,
+                                   cache=_prediction_cache)[0])
     logger.info("The predicted number of retweets is %s", prediction)
     return prediction
+
+
+def score_data(df, content_column, prediction_column, **kwargs):
+    """Add the predicted number of retweets of each tweet to a DataFrame.
+
+    Args:
+        df (:py:class:`pandas.DataFrame`): The tweets to score.
+        content_column (str): Name of the column with the tweet contents.
+        prediction_column (str): Name of the column to store the predictions in.
+        **kwargs: Arguments passed on to :py:func:`predict_batch`.
+
+    Returns:
+        :py:class:`pandas.DataFrame`: The tweets with the predictions column added.
+
+    """
+    df = df.copy()
+    df[prediction_column] = predict_batch(df[content_column].fillna("").astype(str), **kwargs)
+    return df
@@ -5,16 +5,28 @@ DataFrame.
 
 """
 
+import functools
 import logging
+import os
 import re
-
-import nltk
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
+import sys
+from concurrent.futures import ProcessPoolExecutor
 
 logger = logging.getLogger(__name__)
 logger.setLevel("INFO")
 
+URL_REGEX = re.compile(
+    r"(?i)\b((?:https?://|www\d{0,3}[.]|[a-z0-9.\-]+[.][a-z]{2,4}/)"
+    r"(?:[^\s()<>]+|\(([^\s()<>]+|(\([^\s()<>]+\)))*\))+(?:\(([^\s()<>]+|"
+    r"(\([^\s()<>]+\)))*\)|[^\s`!()\[\]{};:'\".,<>?«»“”‘’]))")
+PUNCTUATION_REGEX = re.compile(r"[^\w]")
+
+# One normalizer per NLTK data path and lemma table, shared by all callers in the process
+_normalizers = {}
+
+# NLTK data paths to register once NLTK is imported
+_nltk_data_paths = []
+
 
 def remove_urls(input_str):
     """Remove all URLs from the input text.
@@ -26,10 +38,7 @@ def remove_urls(input_str):
         str: Output text with URLs removed.
 
     """
-    url_regex = r"(?i)\b((?:https?://|www\d{0,3}[.]|[a-z0-9.\-]+[.][a-z]{2,4}/)" \
-                r"(?:[^\s()<>]+|\(([^\s()<>]+|(\([^\s()<>]+\)))*\))+(?:\(([^\s()<>]+|" \
-                r"(\([^\s()<>]+\)))*\)|[^\s`!()\[\]{};:'\".,<>?«»“”‘’]))"
-    output_str = re.sub(url_regex, " ", input_str)
+    output_str = URL_REGEX.sub(" ", input_str)
     return output_str
 
 
@@ -43,35 +52,267 @@ def remove_punctuations(input_str):
         str: Output text with punctuations removed.
 
     """
-    punctuation_regex = r"[^\w]"
-    output_str = re.sub(punctuation_regex, " ", input_str)
+    output_str = PUNCTUATION_REGEX.sub(" ", input_str)
     return output_str
 
 
-def remove_stopwords(input_str, nltk_data_path):
-    """Remove all stopwords from the input text.
+def _import_nltk():
+    """Helper function to import NLTK on first use and register the NLTK data paths with it.
+
+    Importing NLTK takes more than a second, so it is only imported by the code paths that need
+    its corpora.
+
+    Returns:
+        module: The ``nltk`` module.
+
+    """
+    import nltk
+    for nltk_data_path in _nltk_data_paths:
+        if nltk_data_path not in nltk.data.path:
+            nltk.data.path.append(nltk_data_path)
+    return nltk
+
+
+@functools.lru_cache(maxsize=None)
+def _wordnet_lemmatizer():
+    """Helper function to create the shared WordNet lemmatizer on first use."""
+    return _import_nltk().stem.WordNetLemmatizer()
+
+
+def add_nltk_data_path(nltk_data_path):
+    """Register a path to search for NLTK data, unless it is already registered.
 
     Args:
-        input_str (str): The input text.
         nltk_data_path (str): The path that points to the downloaded NLTK data.
 
     Returns:
-        :obj:`list` of :obj:`str`: Output text as a list of words.
+        None
+
+    """
+    if nltk_data_path not in _nltk_data_paths:
+        _nltk_data_paths.append(nltk_data_path)
+    if "nltk" in sys.modules:
+        _import_nltk()
+
+
+def load_stopwords(nltk_data_path, language="english"):
+    """Load the NLTK stopword list of a language.
+
+    The list is read straight from the NLTK data path when it is there, so that NLTK does not
+    need to be imported. Otherwise it is looked up in every path known to NLTK.
+
+    Args:
+        nltk_data_path (str): The path that points to the downloaded NLTK data.
+        language (str): The language of the stopwords.
+
+    Returns:
+        :obj:`list` of :obj:`str`: The stopwords.
+
+    """
+    path = os.path.join(nltk_data_path, "corpora", "stopwords", language)
+    if os.path.isfile(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    add_nltk_data_path(nltk_data_path)
+    return _import_nltk().corpus.stopwords.words(language)
+
+
+class LemmaLookup:
+    """Look up lemmas in a precomputed table and fall back to WordNet for unknown words.
+
+    WordNet lemmas of words missing from the table are memoized in a size-bounded LRU cache, so
+    the WordNet corpus is only loaded once a word outside the table shows up.
+
+    """
+
+    def __init__(self, table=None, cache_size=10000):
+        """Initialize a LemmaLookup object.
+
+        Args:
+            table (dict): Precomputed mapping from words to their lemmas.
+            cache_size (int): Maximum number of WordNet lemmas to keep in memory.
+
+        """
+        self.table = table or {}
+        self.table_hits = 0
+        self._wordnet_lemma = functools.lru_cache(maxsize=cache_size)(
+            lambda word: _wordnet_lemmatizer().lemmatize(word))
+
+    @classmethod
+    def load(cls, lemma_table_path, cache_size=10000):
+        """Create a LemmaLookup from a lemma table saved by :py:func:`build_lemma_table`.
+
+        Args:
+            lemma_table_path (str): The path that points to the lemma table.
+            cache_size (int): Maximum number of WordNet lemmas to keep in memory.
+
+        Returns:
+            :py:class:`LemmaLookup`: The lookup backed by the saved table. The table is empty if
+            it cannot be found.
+
+        """
+        table = {}
+        try:
+            with open(lemma_table_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    word, _, lemma = line.rstrip("\n").partition("\t")
+                    table[word] = lemma or word
+            logger.info("Loaded %s lemmas from %s", len(table), lemma_table_path)
+        except FileNotFoundError:
+            logger.warning("Cannot find lemma table at %s. Every word will be lemmatized with "
+                           "WordNet, which is loaded on the first word. Build the table with "
+                           "'python3 run.py pipeline lemmas --input=<raw data>' or 'make lemmas'",
+                           lemma_table_path)
+        return cls(table, cache_size)
+
+    def lemmatize(self, word):
+        """Get the lemma of a word.
+
+        Args:
+            word (str): The input word.
+
+        Returns:
+            str: The lemma of the word.
+
+        """
+        lemma = self.table.get(word)
+        if lemma is None:
+            return self._wordnet_lemma(word)
+        self.table_hits += 1
+        return lemma
+
+    def stats(self):
+        """Report how lemmas were found.
+
+        Returns:
+            dict: Number of table hits, WordNet cache hits and misses, and cache size.
+
+        """
+        info = self._wordnet_lemma.cache_info()
+        return {"table_size": len(self.table), "table_hits": self.table_hits,
+                "cache_hits": info.hits, "cache_misses": info.misses,
+                "cache_size": info.currsize}
+
+
+class TweetNormalizer:
+    """Apply all text processing steps to tweets with resources loaded only once.
+
+    The stopword set and the lemma lookup are created when the normalizer is initialized and
+    reused for every tweet, so normalizing a single tweet does not repeat any setup work.
+
+    """
+
+    def __init__(self, nltk_data_path, download=False, lemma_table_path=None, cache_size=10000):
+        """Initialize a TweetNormalizer object.
+
+        Args:
+            nltk_data_path (str): The path that points to the downloaded NLTK data or where the
+            data should be downloaded.
+            download (bool): Whether to download NLTK data.
+            lemma_table_path (str): The path that points to a precomputed lemma table. Every word
+            is lemmatized with WordNet if None.
+            cache_size (int): Maximum number of WordNet lemmas to keep in memory.
+
+        """
+        if download:
+            download_nltk_data(nltk_data_path)
+        add_nltk_data_path(nltk_data_path)
+
+        self.nltk_data_path = nltk_data_path
+        self.stopwords = frozenset(load_stopwords(nltk_data_path))
+        if lemma_table_path is None:
+            self.lemmas = LemmaLookup(cache_size=cache_size)
+        else:
+            self.lemmas = LemmaLookup.load(lemma_table_path, cache_size)
+
+    def remove_stopwords(self, input_str):
+        """Lowercase the input text and remove all stopwords from it.
+
+        Args:
+            input_str (str): The input text.
+
+        Returns:
+            :obj:`list` of :obj:`str`: Output text as a list of words.
+
+        """
+        return [word for word in input_str.lower().split() if word not in self.stopwords]
+
+    def lemmatize(self, input_lst):
+        """Apply lemmatization to each word in the input list.
+
+        Args:
+            input_lst (:obj:`list` of :obj:`str`): Input text as a list of words.
+
+        Returns:
+            str: Output text after lemmatization.
+
+        """
+        lemmatize = self.lemmas.lemmatize
+        return " ".join([lemmatize(word) for word in input_lst])
+
+    def normalize(self, text):
+        """Apply all processing steps to a single text.
+
+        Args:
+            text (str): The input text.
+
+        Returns:
+            str: Output text after all processing steps.
+
+        """
+        punctuation_removed = PUNCTUATION_REGEX.sub(" ", URL_REGEX.sub(" ", text))
+        return self.lemmatize(self.remove_stopwords(punctuation_removed))
+
+    def normalize_many(self, texts):
+        """Apply all processing steps to each text in an iterable.
+
+        Args:
+            texts (iterable of str): The input texts.
+
+        Returns:
+            :obj:`list` of :obj:`str`: Output texts after all processing steps, in input order.
+
+        """
+        normalize = self.normalize
+        return [normalize(text) for text in texts]
+
+
+def get_normalizer(nltk_data_path, download=False, lemma_table_path=None):
+    """Get the shared TweetNormalizer for an NLTK data path, creating it on first use.
+
+    Args:
+        nltk_data_path (str): The path that points to the downloaded NLTK data or where the data
+        should be downloaded.
+        download (bool): Whether to download NLTK data.
+        lemma_table_path (str): The path that points to a precomputed lemma table (optional).
+
+    Returns:
+        :py:class:`TweetNormalizer`: The normalizer for the given paths.
 
     """
-    # Specify path to nltk data
-    nltk.data.path.append(nltk_data_path)
+    if download:
+        download_nltk_data(nltk_data_path)
+    key = (nltk_data_path, lemma_table_path)
+    normalizer = _normalizers.get(key)
+    if normalizer is None:
+        normalizer = TweetNormalizer(nltk_data_path, lemma_table_path=lemma_table_path)
+        _normalizers[key] = normalizer
+        logger.info("Text normalizer initialized with NLTK data from %s", nltk_data_path)
+    return normalizer
 
-    # Turn input str into lowercase
-    lowercase = input_str.lower()
 
-    # Split input str into list of words
-    word_lst = lowercase.split()
+def remove_stopwords(input_str, nltk_data_path):
+    """Remove all stopwords from the input text.
+
+    Args:
+        input_str (str): The input text.
+        nltk_data_path (str): The path that points to the downloaded NLTK data.
 
-    # Remove stopwords
-    output_lst = [word for word in word_lst if word not in set(stopwords.words("english"))]
+    Returns:
+        :obj:`list` of :obj:`str`: Output text as a list of words.
 
-    return output_lst
+    """
+    return get_normalizer(nltk_data_path).remove_stopwords(input_str)
 
 
 def lemmatize(input_lst):
@@ -84,8 +325,8 @@ def lemmatize(input_lst):
         str: Output text after lemmatization.
 
     """
-    lem = WordNetLemmatizer()
-    lemmatized = [lem.lemmatize(word) for word in input_lst]
+    lemmatizer = _wordnet_lemmatizer()
+    lemmatized = [lemmatizer.lemmatize(word) for word in input_lst]
 
     # Join the list of words into a str
     result = " ".join(lemmatized)
@@ -104,6 +345,7 @@ def download_nltk_data(nltk_data_path):
     """
     try:
         logger.info("Downloading NLTK corpora data to %s", nltk_data_path)
+        nltk = _import_nltk()
         nltk.download("wordnet", download_dir=nltk_data_path)
         nltk.download("stopwords", download_dir=nltk_data_path)
         logger.info("Successfully downloaded nltk data")
@@ -111,7 +353,44 @@ def download_nltk_data(nltk_data_path):
         logger.error("Unable to download NLTK data. Here is the original error: %s", e)
 
 
-def process_tweet(content, nltk_data_path, download=False):
+def build_lemma_table(df, content_column, nltk_data_path, lemma_table_path):
+    """Precompute the lemma of every word in the corpus vocabulary and save it as a table.
+
+    The table is saved as a text file with one word per line. A word is followed by a tab and its
+    lemma only if the two differ.
+
+    Args:
+        df (:py:class:`pandas.DataFrame`): The raw data with tweet contents.
+        content_column (str): The name of the content column.
+        nltk_data_path (str): The path that points to the downloaded NLTK data.
+        lemma_table_path (str): Path to save the lemma table.
+
+    Returns:
+        int: The number of words in the lemma table.
+
+    """
+    normalizer = get_normalizer(nltk_data_path)
+
+    # Collect the vocabulary as it reaches the lemmatization step
+    vocabulary = set()
+    for content in df[content_column]:
+        punctuation_removed = remove_punctuations(remove_urls(content))
+        vocabulary.update(normalizer.remove_stopwords(punctuation_removed))
+    logger.info("Lemmatizing a vocabulary of %s words", len(vocabulary))
+
+    lemmatizer = _wordnet_lemmatizer()
+    try:
+        with open(lemma_table_path, "w", encoding="utf-8") as f:
+            for word in sorted(vocabulary):
+                lemma = lemmatizer.lemmatize(word)
+                f.write(word + "\n" if lemma == word else word + "\t" + lemma + "\n")
+        logger.info("Lemma table saved to %s", lemma_table_path)
+    except Exception as e:
+        logger.error("Unable to save lemma table. Here is the original error: %s", e)
+    return len(vocabulary)
+
+
+def process_tweet(content, nltk_data_path, download=False, lemma_table_path=None):
     """Apply all processing steps to a tweet.
 
     Args:
@@ -119,37 +398,87 @@ def process_tweet(content, nltk_data_path, download=False):
         nltk_data_path (str): The path that points to the downloaded NLTK data or where the data
         should be downloaded.
         download (bool): Whether to download NLTK data.
+        lemma_table_path (str): The path that points to a precomputed lemma table (optional).
 
     Returns:
         str: Output text after all processing steps.
 
     """
-    # Download nltk data if specified
-    if download:
-        download_nltk_data(nltk_data_path)
-
     logger.debug("Processing the tweet with the following content: %s", content)
+    result = get_normalizer(nltk_data_path, download, lemma_table_path).normalize(content)
+    logger.debug("Processed the tweet and this is the final result: %s", result)
+    return result
 
-    # Remove URLs
-    url_removed = remove_urls(content)
-    logger.debug("Removed URL from the tweet: %s", url_removed)
 
-    # Remove punctuations
-    punctuation_removed = remove_punctuations(url_removed)
-    logger.debug("Removed punctuations from the tweet: %s", punctuation_removed)
+def _normalize_chunk(texts, nltk_data_path, lemma_table_path):
+    """Normalize a chunk of texts inside a worker process.
+
+    Args:
+        texts (:obj:`list` of :obj:`str`): The texts to normalize.
+        nltk_data_path (str): The path that points to the downloaded NLTK data.
+        lemma_table_path (str): The path that points to a precomputed lemma table.
 
-    # Remove stopwords
-    stopwords_removed = remove_stopwords(punctuation_removed, nltk_data_path)
-    logger.debug("Removed stopwords from the tweet: %s", stopwords_removed)
+    Returns:
+        :obj:`list` of :obj:`str`: The normalized texts, in input order.
 
-    # Lemmatize
-    result = lemmatize(stopwords_removed)
-    logger.debug("Lemmatized the tweet and this is the final result: %s", result)
+    """
+    return get_normalizer(nltk_data_path, lemma_table_path=lemma_table_path).normalize_many(texts)
 
-    return result
 
+def process_pool(nltk_data_path, workers=None, lemma_table_path=None):
+    """Start a pool of worker processes that normalize texts.
+
+    Each worker loads the NLTK data once in its initializer and reuses it for every chunk it
+    receives, so a pool shared by several calls of :py:func:`process_data` only pays for starting
+    up once.
+
+    Args:
+        nltk_data_path (str): The path that points to the downloaded NLTK data.
+        workers (int): Number of worker processes. Use all available cores if None.
+        lemma_table_path (str): The path that points to a precomputed lemma table (optional).
+
+    Returns:
+        :py:class:`concurrent.futures.ProcessPoolExecutor`: The pool, to be shut down by the
+        caller.
+
+    """
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=get_normalizer,
+                               initargs=(nltk_data_path, False, lemma_table_path))
 
-def process_data(df, content_column, nltk_data_path, download=False):
+
+def process_data_parallel(contents, nltk_data_path, workers=None, chunksize=1000,
+                          lemma_table_path=None, executor=None):
+    """Process a sequence of texts in chunks using a pool of worker processes.
+
+    The chunks are collected in submission order, so the output order always matches the input
+    order.
+
+    Args:
+        contents (sequence of str): The texts to process.
+        nltk_data_path (str): The path that points to the downloaded NLTK data.
+        workers (int): Number of worker processes. Use all available cores if None.
+        chunksize (int): Number of texts sent to a worker at a time.
+        lemma_table_path (str): The path that points to a precomputed lemma table (optional).
+        executor (:py:class:`concurrent.futures.ProcessPoolExecutor`): A pool started by
+        :py:func:`process_pool` to reuse. A new pool is started and shut down if None.
+
+    Returns:
+        :obj:`list` of :obj:`str`: The processed texts, in input order.
+
+    """
+    contents = list(contents)
+    chunks = [contents[i:i + chunksize] for i in range(0, len(contents), chunksize)]
+    normalize_chunk = functools.partial(_normalize_chunk, nltk_data_path=nltk_data_path,
+                                        lemma_table_path=lemma_table_path)
+    if executor is not None:
+        return [text for chunk in executor.map(normalize_chunk, chunks) for text in chunk]
+
+    with process_pool(nltk_data_path, workers, lemma_table_path) as executor:
+        return [text for chunk in executor.map(normalize_chunk, chunks) for text in chunk]
+
+
+def process_data(df, content_column, nltk_data_path, download=False, workers=1, chunksize=1000,
+                 lemma_table_path=None, cache=None, executor=None):
     """Process all texts in a DataFrame column.
 
     Args:
@@ -158,17 +487,48 @@ def process_data(df, content_column, nltk_data_path, download=False):
         nltk_data_path (str): The path that points to the downloaded NLTK data or where the data
         should be downloaded.
         download (bool): Whether to download NLTK data.
+        workers (int): Number of worker processes. 1 processes the column in the current process,
+        None uses all available cores.
+        chunksize (int): Number of tweets sent to a worker process at a time.
+        lemma_table_path (str): The path that points to a precomputed lemma table (optional).
+        cache (:py:class:`src.cache.TweetCache`): Cache of processed tweets. Only the tweets
+        missing from the cache are processed, and they are added to it (optional).
+        executor (:py:class:`concurrent.futures.ProcessPoolExecutor`): A pool started by
+        :py:func:`process_pool` to process the column with instead of ``workers``, e.g. one
+        shared by all the chunks of a streamed file (optional).
 
     Returns:
         :py:class:`pandas.DataFrame`: The processed data as a DataFrame object.
 
     """
-    # Download nltk data if specified
-    if download:
-        download_nltk_data(nltk_data_path)
-
-    # Apply the function above to process all the tweets
-    logger.info("Processing %s tweet contents. This may take a while.", len(df))
-    df[content_column] = df[content_column].apply(process_tweet, nltk_data_path=nltk_data_path)
+    normalizer = get_normalizer(nltk_data_path, download, lemma_table_path)
+    contents = list(df[content_column])
+
+    # Look up the tweets that were already processed
+    if cache is None:
+        todo = contents
+    else:
+        keys = [cache.key(content) for content in contents]
+        results = [cache.get(key) for key in keys]
+        todo_index = [i for i, result in enumerate(results) if result is None]
+        todo = [contents[i] for i in todo_index]
+        logger.info("Found %s of %s tweets in the cache", len(contents) - len(todo), len(contents))
+
+    # Apply the normalizer to process the remaining tweets
+    logger.info("Processing %s tweet contents. This may take a while.", len(todo))
+    if workers == 1 and executor is None:
+        processed = normalizer.normalize_many(todo)
+    else:
+        processed = process_data_parallel(todo, nltk_data_path, workers=workers,
+                                          chunksize=chunksize, lemma_table_path=lemma_table_path,
+                                          executor=executor)
+
+    if cache is not None:
+        for i, result in zip(todo_index, processed):
+            results[i] = result
+            cache.put(keys[i], result)
+        processed = results
+
+    df[content_column] = processed
     logger.info("Successfully processed all the tweets")
     return df
@@ -0,0 +1,283 @@
+"""The model registry module.
+
+This module provides a registry that loads the model, its vocabulary and its configuration once,
+serves predictions from memory, and swaps in a new version when the artifacts change on disk.
+
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import yaml
+
+from src.cache import PredictionCache
+from src.metrics import REGISTRY
+from src.numpy_model import NumpyModel
+from src.process import TweetNormalizer
+from src.tokenizer import Vocabulary
+
+logger = logging.getLogger(__name__)
+logger.setLevel("INFO")
+
+# Time taken by each stage of loading and serving a model bundle
+_config_load_time = REGISTRY.stage("config_load")
+_tokenizer_load_time = REGISTRY.stage("tokenizer_load")
+_model_load_time = REGISTRY.stage("model_load")
+_process_time = REGISTRY.stage("process_tweet")
+_tokenize_time = REGISTRY.stage("tokenize")
+_inference_time = REGISTRY.stage("inference")
+
+
+def artifact_version(paths):
+    """Calculate a version identifier for a set of files and directories.
+
+    The version changes whenever a file is added, removed, resized or modified.
+
+    Args:
+        paths (:obj:`list` of :obj:`str`): The files and directories to watch. Paths that do not
+        exist are ignored.
+
+    Returns:
+        str: A short hex digest identifying the current state of the paths.
+
+    """
+    digest = hashlib.sha1()
+    for path in paths:
+        if path is None or not os.path.exists(path):
+            continue
+        if os.path.isdir(path):
+            files = sorted(os.path.join(root, name)
+                           for root, _, names in os.walk(path) for name in names)
+        else:
+            files = [path]
+        for file in files:
+            stat = os.stat(file)
+            digest.update(("%s:%s:%s;" % (file, stat.st_size, stat.st_mtime_ns)).encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+
+class ModelBundle:
+    """A loaded model together with everything needed to turn tweets into its predictions."""
+
+    def __init__(self, config, version, prediction_cache=None):
+        """Load the model, vocabulary and text normalizer specified in a configuration.
+
+        Args:
+            config (dict): The model configuration, with a ``predict.predict`` section.
+            version (str): Version identifier of the loaded artifacts.
+            prediction_cache (:py:class:`src.cache.PredictionCache`): Cache of the predictions
+            of normalized tweets (optional).
+
+        """
+        params = config["predict"]["predict"]
+        self.config = config
+        self.version = version
+        self.prediction_cache = prediction_cache
+        self.padding_type = params["padding_type"]
+        self.max_length = params["max_length"]
+        self.normalizer = TweetNormalizer(params["nltk_data_path"],
+                                          lemma_table_path=params.get("lemma_table_path"))
+        with _tokenizer_load_time.timer():
+            self.vocabulary = Vocabulary.load(params["tokenizer_path"])
+        logger.info("Loading pre-trained model from %s", params["fitted_model_path"])
+        if params["fitted_model_path"].endswith(".npz"):
+            # Exported weights are run with NumPy, without importing TensorFlow
+            with _model_load_time.timer():
+                self.model = NumpyModel.load(params["fitted_model_path"])
+            self._forward = self.model.predict
+        else:
+            import tensorflow as tf
+            with _model_load_time.timer():
+                self.model = tf.keras.models.load_model(params["fitted_model_path"])
+
+            # Trace the forward pass once for any batch size instead of running it eagerly
+            forward = tf.function(
+                lambda tokenized: self.model(tokenized, training=False),
+                input_signature=[tf.TensorSpec([None, self.max_length], tf.int32)])
+            self._forward = lambda tokenized: forward(tokenized).numpy()
+
+    def predict_many(self, texts):
+        """Predict the number of retweets of several tweets with one forward pass.
+
+        Tweets whose normalized text is cached are not tokenized nor passed to the model, and
+        tweets of the batch that normalize to the same text are predicted once.
+
+        Args:
+            texts (:obj:`list` of :obj:`str`): The input tweets.
+
+        Returns:
+            :obj:`list` of int: The predicted number of retweets of each tweet.
+
+        """
+        with _process_time.timer():
+            processed = self.normalizer.normalize_many(texts)
+        predictions = [None] * len(processed)
+        cache = self.prediction_cache
+        if cache is not None:
+            for i, text in enumerate(processed):
+                predictions[i] = cache.get(self.version, text)
+
+        missing = list(OrderedDict.fromkeys(text for text, prediction in zip(processed, predictions)
+                                            if prediction is None))
+        if missing:
+            with _tokenize_time.timer():
+                tokenized = self.vocabulary.texts_to_padded(missing, self.max_length,
+                                                            self.padding_type)
+            with _inference_time.timer():
+                forwarded = self._forward(tokenized)
+            computed = dict(zip(missing, (round(float(prediction))
+                                          for prediction in forwarded[:, 0])))
+            if cache is not None:
+                for text, prediction in computed.items():
+                    cache.put(self.version, text, prediction)
+            predictions = [computed[text] if prediction is None else prediction
+                           for text, prediction in zip(processed, predictions)]
+        return predictions
+
+    def warm_up(self):
+        """Run one inference so that the first request does not pay for tracing the forward pass.
+
+        Returns:
+            None
+
+        """
+        self.predict_many([""])
+        logger.info("Model version %s warmed up", self.version)
+
+
+class ModelRegistry:
+    """Process-wide holder of the model bundle currently used for serving.
+
+    The registry checks the model, vocabulary, lemma table and configuration files in a background
+    thread. When any of them changes, a new bundle is loaded and warmed up next to the current one
+    and then swapped in with a single reference assignment. Requests that already picked up the
+    old bundle finish with it. The predictions cached for the old bundle are dropped.
+
+    """
+
+    def __init__(self, config_path, check_interval=5.0, watch=True, cache_size=10000,
+                 cache_ttl=3600.0):
+        """Initialize a ModelRegistry object and load the current model.
+
+        Args:
+            config_path (str): The path that points to the model configuration file.
+            check_interval (float): Seconds between checks for changed artifacts.
+            watch (bool): Whether to start the background thread that reloads changed artifacts.
+            cache_size (int): Maximum number of cached predictions, or 0 to disable the cache.
+            cache_ttl (float): Seconds a cached prediction stays valid, or None to keep it until
+            evicted.
+
+        """
+        self.config_path = config_path
+        self.check_interval = check_interval
+        self.prediction_cache = PredictionCache(cache_size, cache_ttl) if cache_size else None
+        self._reload_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._bundle = self._load()
+
+        self._watcher = None
+        if watch:
+            self._watcher = threading.Thread(target=self._watch, name="model-registry",
+                                             daemon=True)
+            self._watcher.start()
+
+    @property
+    def bundle(self):
+        """:py:class:`ModelBundle`: The bundle currently used for serving."""
+        return self._bundle
+
+    @property
+    def version(self):
+        """str: Version identifier of the bundle currently used for serving."""
+        return self._bundle.version
+
+    def _load_config(self):
+        """Helper function to read the model configuration file."""
+        with _config_load_time.timer(), open(self.config_path, "r") as f:
+            return yaml.load(f, Loader=yaml.FullLoader)
+
+    def _watched_paths(self, config):
+        """Helper function to list the artifacts a configuration depends on."""
+        params = config["predict"]["predict"]
+        return [self.config_path, params["fitted_model_path"], params["tokenizer_path"],
+                params.get("lemma_table_path")]
+
+    def _load(self):
+        """Helper function to load and warm up the bundle for the current artifacts."""
+        config = self._load_config()
+        version = artifact_version(self._watched_paths(config))
+        bundle = ModelBundle(config, version, self.prediction_cache)
+        bundle.warm_up()
+        logger.info("Model version %s loaded from %s", version, self.config_path)
+        return bundle
+
+    def reload_if_changed(self):
+        """Load and swap in a new bundle if any artifact changed since the current one was loaded.
+
+        Returns:
+            bool: Whether a new bundle was swapped in.
+
+        """
+        with self._reload_lock:
+            config = self._load_config()
+            if artifact_version(self._watched_paths(config)) == self._bundle.version:
+                return False
+            logger.info("Model artifacts changed, loading a new version")
+            self._bundle = self._load()
+            if self.prediction_cache is not None:
+                self.prediction_cache.clear()
+            return True
+
+    def _watch(self):
+        """Helper function run by the background thread to reload changed artifacts."""
+        while not self._stopped.wait(self.check_interval):
+            try:
+                self.reload_if_changed()
+            except Exception as e:
+                # Keep serving the current version if the new artifacts cannot be loaded
+                logger.error("Unable to reload the model, keeping version %s. Here is the "
+                             "original error: %s", self._bundle.version, e)
+
+    def predict(self, text):
+        """Predict the number of retweets of a tweet with the current model.
+
+        Args:
+            text (str): The input tweet.
+
+        Returns:
+            :obj:`tuple` of (int, str): The predicted number of retweets and the version of the
+            model that calculated it.
+
+        """
+        return self.predict_many([text])[0]
+
+    def predict_many(self, texts):
+        """Predict the number of retweets of several tweets with one forward pass.
+
+        All the tweets are predicted by the same version of the model, even if a new version is
+        swapped in meanwhile.
+
+        Args:
+            texts (:obj:`list` of :obj:`str`): The input tweets.
+
+        Returns:
+            :obj:`list` of :obj:`tuple` of (int, str): The predicted number of retweets of each
+            tweet and the version of the model that calculated it.
+
+        """
+        bundle = self._bundle
+        return [(prediction, bundle.version) for prediction in bundle.predict_many(texts)]
+
+    def close(self):
+        """Stop watching the artifacts for changes.
+
+        Returns:
+            None
+
+        """
+        self._stopped.set()
+        if self._watcher is not None:
+            self._watcher.join()
@@ -0,0 +1,251 @@
+"""The asynchronous serving module.
+
+This module provides an ASGI application that serves the same pages as the Flask app. Predictions
+run on the inference batcher's worker thread and tweets are saved to the database by background
+threads, so the event loop only parses requests and renders responses.
+
+"""
+
+import asyncio
+import json
+import logging
+import mimetypes
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import jinja2
+
+from src.batcher import QueueFullError
+from src.metrics import CONTENT_TYPE, REGISTRY
+
+logger = logging.getLogger(__name__)
+logger.setLevel("INFO")
+
+# Paths of the endpoints, used by url_for in the templates
+ROUTES = {"index": "/", "tweet": "/tweet", "metrics": "/metrics"}
+
+
+class TweetService:
+    """ASGI application predicting the number of retweets of the tweets posted to it.
+
+    ``POST /tweet`` accepts either a form with a ``tweet_content`` field, answered with the HTML
+    page of the Flask app, or a JSON object with a ``tweet_content`` key, answered with JSON. When
+    the inference batcher's queue is full, requests are rejected right away with a 503 status
+    instead of piling up. ``GET /metrics`` exposes the serving metrics in the Prometheus text
+    format.
+
+    """
+
+    def __init__(self, batcher, tweet_manager, template_folder, static_folder,
+                 max_body_size=16384, retry_after=1, db_workers=1, max_pending_writes=1000,
+                 metrics=REGISTRY):
+        """Initialize a TweetService object.
+
+        Args:
+            batcher (:py:class:`src.batcher.InferenceBatcher`): Batcher returning the prediction
+            and model version of each tweet.
+            tweet_manager (:py:class:`src.database.TweetManager`): Manager of the database the
+            tweets are saved to.
+            template_folder (str): The path that points to the HTML templates.
+            static_folder (str): The path that points to the static files.
+            max_body_size (int): Maximum size of a request body in bytes.
+            retry_after (int): Seconds clients are asked to wait when the service is overloaded.
+            db_workers (int): Number of threads saving tweets to the database, each with its own
+            session.
+            max_pending_writes (int): Maximum number of tweets waiting to be saved. Tweets
+            predicted while that many are waiting are not saved, so that a slow database does not
+            grow the memory of the service nor the time it takes to close.
+            metrics (:py:class:`src.metrics.MetricsRegistry`): Registry to record the request
+            latency and errors, and the pending and dropped database writes in, and to expose at
+            ``GET /metrics``.
+
+        """
+        self.batcher = batcher
+        self.tweet_manager = tweet_manager
+        self.static_folder = os.path.abspath(static_folder)
+        self.max_body_size = max_body_size
+        self.retry_after = retry_after
+        self.templates = jinja2.Environment(loader=jinja2.FileSystemLoader(template_folder),
+                                            autoescape=jinja2.select_autoescape(["html"]))
+        self.templates.globals["url_for"] = self.url_for
+        self.metrics = metrics
+        self.request_time = metrics.stage("tweet_request")
+        self.errors = metrics.counter("tweet_errors_total",
+                                      "Posted tweets answered with an error page")
+
+        # Database writes run on their own threads so that they never block the event loop
+        self._db_executor = ThreadPoolExecutor(max_workers=db_workers)
+        self.max_pending_writes = max_pending_writes
+        self.pending_writes = metrics.gauge("db_pending_writes",
+                                            "Tweets waiting for a database thread to save them")
+        self.writes_dropped = metrics.counter("db_writes_dropped_total",
+                                              "Tweets not saved because too many were waiting")
+
+    @staticmethod
+    def url_for(endpoint, filename=None):
+        """Build the URL of an endpoint the same way Flask's url_for does in the templates."""
+        if endpoint == "static":
+            return "/static/" + filename
+        return ROUTES[endpoint]
+
+    async def __call__(self, scope, receive, send):
+        """Handle an ASGI connection."""
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        method = scope["method"]
+        path = scope["path"]
+        started = False
+
+        async def send_tracked(message):
+            nonlocal started
+            started = started or message["type"] == "http.response.start"
+            await send(message)
+
+        try:
+            if path == ROUTES["index"] and method in ("GET", "POST"):
+                logger.info("Index page rendered.")
+                await self._html(send_tracked, 200, "index.html")
+            elif path == ROUTES["tweet"] and method == "POST":
+                with self.request_time.timer():
+                    await self._tweet(scope, receive, send_tracked)
+            elif path == ROUTES["metrics"] and method == "GET":
+                await self._respond(send_tracked, 200, self.metrics.render().encode("utf-8"),
+                                    CONTENT_TYPE)
+            elif path.startswith("/static/") and method == "GET":
+                await self._static(send_tracked, path[len("/static/"):])
+            else:
+                await self._respond(send_tracked, 404, b"Not Found", "text/plain")
+        except Exception as e:
+            logger.error("Unable to handle %s %s. Here is the original error: %s", method, path, e)
+            if path == ROUTES["tweet"]:
+                self.errors.inc()
+            # An error page can only be sent if the response has not started
+            if not started:
+                await self._html(send, 500, "error.html")
+
+    async def _tweet(self, scope, receive, send):
+        """Helper function to predict the retweets of a posted tweet and save it."""
+        headers = dict(scope["headers"])
+        is_json = headers.get(b"content-type", b"").split(b";")[0].strip() == b"application/json"
+
+        body = await self._read_body(receive)
+        if body is None:
+            await self._respond(send, 413, b"Request body too large", "text/plain")
+            return
+        try:
+            if is_json:
+                tweet_content = json.loads(body.decode("utf-8"))["tweet_content"]
+            else:
+                tweet_content = parse_qs(body.decode("utf-8"),
+                                         keep_blank_values=True)["tweet_content"][0]
+            if not isinstance(tweet_content, str):
+                raise TypeError("tweet_content must be a string")
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning("Invalid tweet submitted: %s", e)
+            await self._respond(send, 400, b"Expected a tweet_content field", "text/plain")
+            return
+        logger.info("User entered '%s'", tweet_content)
+
+        # Calculate prediction without blocking the event loop
+        try:
+            future = self.batcher.submit(tweet_content)
+        except QueueFullError:
+            logger.warning("Too many pending predictions, request rejected")
+            await self._respond(send, 503, b"Service overloaded, retry later", "text/plain",
+                                [(b"retry-after", str(self.retry_after).encode("latin-1"))])
+            return
+        prediction, model_version = await asyncio.wrap_future(future)
+        logger.info("The predicted number of retweet is %s (model version %s)", prediction,
+                    model_version)
+
+        # Save user input and predicted retweets to database after responding, unless too many
+        # tweets are already waiting
+        if self.pending_writes.value >= self.max_pending_writes:
+            self.writes_dropped.inc()
+            logger.warning("Too many tweets waiting for the database, tweet not saved")
+        else:
+            self.pending_writes.inc()
+            self._db_executor.submit(self._save_tweet, tweet_content, prediction)
+
+        if is_json:
+            body = json.dumps({"tweet_content": tweet_content, "prediction": prediction,
+                               "model_version": model_version}).encode("utf-8")
+            await self._respond(send, 200, body, "application/json")
+        else:
+            await self._html(send, 200, "tweet.html", tweet_content=tweet_content,
+                             prediction=prediction)
+
+    def _save_tweet(self, tweet_content, prediction):
+        """Helper function run by a database thread to save a tweet and log a failed write."""
+        try:
+            self.tweet_manager.add_tweet(tweet_content, prediction)
+        except Exception as e:
+            logger.warning("Unable to add to database. Here is the original error: %s", e)
+        finally:
+            self.pending_writes.inc(-1)
+
+    async def _static(self, send, filename):
+        """Helper function to serve a file from the static folder."""
+        path = os.path.abspath(os.path.join(self.static_folder, filename))
+        if os.path.commonpath([path, self.static_folder]) != self.static_folder \
+                or not os.path.isfile(path):
+            await self._respond(send, 404, b"Not Found", "text/plain")
+            return
+        with open(path, "rb") as f:
+            body = f.read()
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        await self._respond(send, 200, body, content_type)
+
+    async def _read_body(self, receive):
+        """Helper function to read a request body, or None if it is larger than allowed."""
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if len(body) > self.max_body_size:
+                return None
+        return body
+
+    async def _html(self, send, status, template, **context):
+        """Helper function to render a template and send it."""
+        body = self.templates.get_template(template).render(**context).encode("utf-8")
+        await self._respond(send, status, body, "text/html; charset=utf-8")
+
+    @staticmethod
+    async def _respond(send, status, body, content_type, headers=()):
+        """Helper function to send a complete response."""
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", content_type.encode("latin-1")),
+                                (b"content-length", str(len(body)).encode("latin-1"))]
+                    + list(headers)})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _lifespan(self, receive, send):
+        """Helper function to handle the startup and shutdown of the server."""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await asyncio.get_event_loop().run_in_executor(None, self.close)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def close(self):
+        """Finish the pending predictions and database writes, then release the database.
+
+        Returns:
+            None
+
+        """
+        self.batcher.close()
+        self._db_executor.shutdown(wait=True)
+        self.tweet_manager.close()
+        logger.info("Serving stopped.")
@@ -0,0 +1,91 @@
+"""The data storage module.
+
+This module provides functionalities to save and load the data handed between pipeline steps as
+CSV or as a binary columnar format (Parquet or Arrow IPC).
+
+"""
+
+import logging
+import os
+
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+
+logger = logging.getLogger(__name__)
+logger.setLevel("INFO")
+
+# Supported formats by file extension
+FORMATS = {".csv": "csv", ".parquet": "parquet", ".feather": "feather", ".arrow": "feather"}
+
+
+def get_format(path, fmt=None):
+    """Get the storage format of a file.
+
+    Args:
+        path (str): The path that points to the file.
+        fmt (str): The format to use regardless of the file extension (optional).
+
+    Returns:
+        str: One of 'csv', 'parquet' or 'feather'.
+
+    """
+    if fmt is not None:
+        if fmt not in FORMATS.values():
+            raise ValueError("Unknown format '%s', expected one of %s"
+                             % (fmt, sorted(set(FORMATS.values()))))
+        return fmt
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError("Cannot infer the format of %s, expected one of the extensions %s"
+                         % (path, list(FORMATS)))
+    return FORMATS[extension]
+
+
+def load_data(path, fmt=None, memory_map=False):
+    """Load data saved by a pipeline step.
+
+    Args:
+        path (str): The path that points to the file.
+        fmt (str): The format to use regardless of the file extension (optional).
+        memory_map (bool): Whether to memory-map an Arrow IPC file instead of reading it into
+        memory. Ignored for the other formats.
+
+    Returns:
+        :py:class:`pandas.DataFrame`: The data as a DataFrame object.
+
+    """
+    fmt = get_format(path, fmt)
+    if fmt == "csv":
+        df = pd.read_csv(path)
+    elif fmt == "parquet":
+        df = pd.read_parquet(path)
+    else:
+        df = feather.read_table(path, memory_map=memory_map).to_pandas()
+    logger.info("Loaded %s rows from %s (%s)", len(df), path, fmt)
+    return df
+
+
+def save_data(df, path, fmt=None):
+    """Save the output of a pipeline step.
+
+    Arrow IPC files are written uncompressed so that they can be memory-mapped.
+
+    Args:
+        df (:py:class:`pandas.DataFrame`): The data to save.
+        path (str): Path to save the file to.
+        fmt (str): The format to use regardless of the file extension (optional).
+
+    Returns:
+        None
+
+    """
+    fmt = get_format(path, fmt)
+    if fmt == "csv":
+        df.to_csv(path, index=False)
+    elif fmt == "parquet":
+        df.to_parquet(path, index=False)
+    else:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        feather.write_feather(table, path, compression="uncompressed")
+    logger.info("Saved %s rows to %s (%s)", len(df), path, fmt)
@@ -0,0 +1,167 @@
+"""The streaming module.
+
+This module provides functionalities to read, transform and write a pipeline file in chunks, so
+that the memory used by a pipeline step does not grow with the size of its input.
+
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pyarrow import ipc, parquet
+
+from src.storage import get_format
+
+logger = logging.getLogger(__name__)
+logger.setLevel("INFO")
+
+
+def _common_dtype(dtypes):
+    """Helper function to find the dtype pandas would use for a column parsed all at once.
+
+    Args:
+        dtypes (:obj:`list` of :py:class:`numpy.dtype`): The dtypes of the column in each chunk.
+
+    Returns:
+        :py:class:`numpy.dtype`: The dtype for the whole column.
+
+    """
+    dtypes = set(dtypes)
+    if len(dtypes) == 1:
+        return dtypes.pop()
+    if all(np.issubdtype(dtype, np.number) for dtype in dtypes):
+        return np.result_type(*dtypes)
+    return np.dtype(object)
+
+
+def infer_dtypes(path, chunksize):
+    """Infer the column dtypes of a CSV file chunk by chunk.
+
+    Parsing chunks independently may give a column different dtypes in different chunks, e.g.
+    integers in one chunk and floats in another chunk with missing values. The dtypes inferred
+    here are the ones the column would get if the whole file were read at once.
+
+    Args:
+        path (str): The path that points to the CSV file.
+        chunksize (int): Number of rows to read at a time.
+
+    Returns:
+        dict: Mapping from column names to dtypes.
+
+    """
+    chunk_dtypes = {}
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        for column, dtype in chunk.dtypes.items():
+            chunk_dtypes.setdefault(column, []).append(dtype)
+    return {column: _common_dtype(dtypes) for column, dtypes in chunk_dtypes.items()}
+
+
+def _read_csv_chunks(path, chunksize):
+    """Helper function to read a CSV file in chunks with the dtypes of a full read."""
+    dtypes = infer_dtypes(path, chunksize)
+    yield from pd.read_csv(path, chunksize=chunksize, dtype=dtypes)
+
+
+def _read_arrow_chunks(path, chunksize, fmt):
+    """Helper function to read a Parquet or Arrow IPC file in chunks."""
+    if fmt == "parquet":
+        batches = parquet.ParquetFile(path).iter_batches(batch_size=chunksize)
+    else:
+        reader = ipc.open_file(pa.memory_map(path))
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    for batch in batches:
+        # Record batches of an Arrow IPC file may be larger than the chunksize
+        for start in range(0, batch.num_rows, chunksize):
+            yield batch.slice(start, chunksize).to_pandas()
+
+
+def read_chunks(path, chunksize, fmt=None):
+    """Read a pipeline file as a stream of DataFrames.
+
+    Args:
+        path (str): The path that points to the file.
+        chunksize (int): Number of rows in each chunk.
+        fmt (str): The format to use regardless of the file extension (optional).
+
+    Yields:
+        :py:class:`pandas.DataFrame`: The next chunk of rows.
+
+    """
+    fmt = get_format(path, fmt)
+    if fmt == "csv":
+        chunks = _read_csv_chunks(path, chunksize)
+    else:
+        chunks = _read_arrow_chunks(path, chunksize, fmt)
+    for i, chunk in enumerate(chunks):
+        logger.debug("Read chunk %s with %s rows from %s", i, len(chunk), path)
+        yield chunk
+
+
+def _chunk_schema(chunk):
+    """Helper function to get the Arrow schema of a chunk, with object columns as strings.
+
+    Columns with no values in the chunk, e.g. all missing, would otherwise get the null type that
+    no later chunk with values can be cast to.
+
+    """
+    schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+    for i, field in enumerate(schema):
+        if pa.types.is_null(field.type):
+            schema = schema.set(i, field.with_type(pa.string()))
+    return schema
+
+
+def _open_writer(path, fmt, schema):
+    """Helper function to open a Parquet or Arrow IPC file for writing tables of a schema."""
+    if fmt == "parquet":
+        return parquet.ParquetWriter(path, schema)
+    return ipc.new_file(path, schema)
+
+
+def write_chunks(chunks, path, fmt=None):
+    """Write a stream of DataFrames to a single pipeline file.
+
+    For CSV, the header is written with the first chunk and every other chunk is appended, so the
+    file is identical to writing all the chunks concatenated. For Parquet and Arrow IPC, the schema
+    is taken from the first chunk with rows, and every chunk is cast to it. Empty chunks before it
+    are skipped, and if every chunk is empty, an empty file with the schema of the last one is
+    written.
+
+    Args:
+        chunks (iterable of :py:class:`pandas.DataFrame`): The chunks to write.
+        path (str): Path to save the file.
+        fmt (str): The format to use regardless of the file extension (optional).
+
+    Returns:
+        int: The number of rows written.
+
+    """
+    fmt = get_format(path, fmt)
+    rows = 0
+    writer = None
+    schema = None
+    empty = None
+    try:
+        for i, chunk in enumerate(chunks):
+            if fmt == "csv":
+                chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+            elif writer is None and chunk.empty:
+                empty = chunk
+            else:
+                if writer is None:
+                    schema = _chunk_schema(chunk)
+                    writer = _open_writer(path, fmt, schema)
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema,
+                                                        preserve_index=False))
+            rows += len(chunk)
+        if writer is None and empty is not None:
+            schema = _chunk_schema(empty)
+            writer = _open_writer(path, fmt, schema)
+            writer.write_table(pa.Table.from_pandas(empty, schema=schema, preserve_index=False))
+    finally:
+        if writer is not None:
+            writer.close()
+    logger.info("Wrote %s rows to %s", rows, path)
+    return rows
@@ -0,0 +1,211 @@
+"""The hyperparameter sweep module.
+
+This module provides functionalities to train candidate configurations of the ``compile_model`` and
+``fit_model`` sections of the model configuration in parallel worker processes, and to compare
+their MAPE, training time and inference latency.
+
+"""
+
+import copy
+import itertools
+import logging
+import multiprocessing
+import os
+import random
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+logger.setLevel("INFO")
+
+# Sections of the model configuration a sweep may change
+SWEPT_SECTIONS = ("compile_model", "fit_model")
+
+
+def expand_grid(parameters, search="grid", samples=None, seed=None):
+    """List the candidate parameters of a sweep.
+
+    Args:
+        parameters (dict): Values to try by dotted parameter name, e.g.
+        ``{"compile_model.lstm_params.units": [32, 64]}``.
+        search (str): Either 'grid' for every combination of the values, or 'random' for a random
+        sample of the combinations.
+        samples (int): Number of combinations to sample in a random search.
+        seed (int): Seed of the random search (optional).
+
+    Returns:
+        :obj:`list` of dict: The parameters of each candidate by dotted name.
+
+    """
+    for name in parameters:
+        if name.split(".")[0] not in SWEPT_SECTIONS:
+            raise ValueError("Parameter %s is not in one of the sections %s"
+                             % (name, ", ".join(SWEPT_SECTIONS)))
+    names = list(parameters)
+    candidates = [dict(zip(names, values))
+                  for values in itertools.product(*(parameters[name] for name in names))]
+    if search == "random":
+        if not samples:
+            raise ValueError("A random search needs a number of samples")
+        candidates = random.Random(seed).sample(candidates, min(samples, len(candidates)))
+    elif search != "grid":
+        raise ValueError("Expected search 'grid' or 'random', got '%s'" % search)
+    return candidates
+
+
+def apply_parameters(model_config, parameters):
+    """Override the model configuration with the parameters of a candidate.
+
+    Args:
+        model_config (dict): The ``model`` section of the configuration.
+        parameters (dict): Values by dotted parameter name.
+
+    Returns:
+        dict: A copy of the configuration with the values set.
+
+    """
+    model_config = copy.deepcopy(model_config)
+    for name, value in parameters.items():
+        section = model_config
+        keys = name.split(".")
+        for key in keys[:-1]:
+            section = section.setdefault(key, {})
+        section[keys[-1]] = value
+    return model_config
+
+
+def thread_budget(workers, cpu_count=None):
+    """Split the CPU cores evenly between worker processes.
+
+    Args:
+        workers (int): Number of worker processes.
+        cpu_count (int): Number of CPU cores (optional, default all the cores of the machine).
+
+    Returns:
+        int: Number of threads each worker may use, at least 1.
+
+    """
+    return max(1, (cpu_count or os.cpu_count()) // workers)
+
+
+def _init_worker(threads):
+    """Helper function to limit the threads of a worker process before TensorFlow starts."""
+    for variable in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[variable] = str(threads)
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(threads)
+
+
+def _train_candidate(task):
+    """Helper function run by a worker process to train and evaluate one candidate.
+
+    Args:
+        task (tuple): The index and parameters of the candidate, the model configuration, the
+        directory holding the tokenized data, and the vocabulary size.
+
+    Returns:
+        dict: The parameters of the candidate along with its MAPE, training time and latency, or
+        the error that stopped it.
+
+    """
+    from src import model
+
+    index, parameters, model_config, data_dir, vocab_size = task
+    result = dict(candidate=index, **parameters)
+    try:
+        # The arrays are shared read-only by all the workers through the page cache
+        arrays = {name: np.load(os.path.join(data_dir, name + ".npy"), mmap_mode="r")
+                  for name in ("train_data", "train_labels", "test_data", "test_labels")}
+        model_config = apply_parameters(model_config, parameters)
+        model_config["fit_model"]["model_path"] = os.path.join(data_dir, "candidate-%s" % index)
+        if model_config["fit_model"].get("checkpoint"):
+            model_config["fit_model"]["checkpoint"]["checkpoint_dir"] = os.path.join(
+                data_dir, "candidate-%s-checkpoints" % index)
+
+        model.set_seed(**model_config["set_seed"])
+        lstm_model = model.compile_model(vocab_size, **model_config["compile_model"])
+        epoch_seconds = model.fit_model(lstm_model, arrays["train_data"], arrays["train_labels"],
+                                        **model_config["fit_model"])
+        result["train_seconds"] = sum(epoch_seconds)
+
+        # The serving cost is measured with the largest batch size of the evaluation
+        batch_size = max(model_config["calculate_mape"].get("batch_sizes", [1024]))
+        evaluation = model.evaluate_model(lstm_model.predict_on_batch, arrays["test_data"],
+                                          arrays["test_labels"], [batch_size])
+        serving = evaluation["serving"][batch_size]
+        result.update(mape=evaluation["accuracy"]["mape"], mae=evaluation["accuracy"]["mae"],
+                      tweets_per_second=serving["tweets_per_second"],
+                      latency_p50_ms=serving["latency_ms"]["p50"],
+                      latency_p95_ms=serving["latency_ms"]["p95"])
+    except Exception as e:
+        logger.error("Candidate %s failed. Here is the original error: %s", index, e)
+        result["error"] = str(e)
+    return result
+
+
+def run_sweep(df, model_config, candidates, output_dir, workers=None):
+    """Train candidate configurations of the model in parallel and compare them.
+
+    The data is split and tokenized once, then saved as ``.npy`` files that every worker memory
+    maps. Workers are started fresh rather than forked from this process, since TensorFlow cannot
+    be used in a forked process, and each of them gets an even share of the CPU cores.
+
+    Args:
+        df (:py:class:`pandas.DataFrame`): The cleaned data.
+        model_config (dict): The ``model`` section of the configuration.
+        candidates (:obj:`list` of dict): The parameters of each candidate by dotted name, as
+        listed by :py:func:`expand_grid`.
+        output_dir (str): Directory to save the tokenizer, the tokenized data and the models of the
+        candidates to.
+        workers (int): Number of candidates trained at a time (optional, default as many as the
+        CPU cores or the candidates).
+
+    Returns:
+        :py:class:`pandas.DataFrame`: One row per candidate with its parameters, MAPE, MAE,
+        training time in seconds, and throughput and median and 95th percentile latency with the
+        largest batch size of the evaluation, sorted by MAPE.
+
+    """
+    from src import model
+
+    os.makedirs(output_dir, exist_ok=True)
+    model_config = copy.deepcopy(model_config)
+    model_config["fit_tokenizer"]["tokenizer_path"] = os.path.join(output_dir, "vocab.json")
+    model_config["tokenize"]["tokenizer_path"] = os.path.join(output_dir, "vocab.json")
+
+    # Prepare the data once for all the candidates
+    model.set_seed(**model_config["set_seed"])
+    train_contents, test_contents, train_labels, test_labels = model.train_test_split(
+        df, **model_config["train_test_split"])
+    vocab_size = model.fit_tokenizer(train_contents, **model_config["fit_tokenizer"])
+    arrays = {"train_data": model.tokenize(train_contents, **model_config["tokenize"]),
+              "train_labels": train_labels.astype(np.float32),
+              "test_data": model.tokenize(test_contents, **model_config["tokenize"]),
+              "test_labels": test_labels.astype(np.float32)}
+    for name, array in arrays.items():
+        np.save(os.path.join(output_dir, name + ".npy"), array)
+
+    workers = workers or min(len(candidates), os.cpu_count())
+    threads = thread_budget(workers)
+    logger.info("Training %s candidates with %s workers of %s threads each", len(candidates),
+                workers, threads)
+    tasks = [(index, parameters, model_config, output_dir, vocab_size)
+             for index, parameters in enumerate(candidates)]
+    pool = multiprocessing.get_context("spawn").Pool(workers, initializer=_init_worker,
+                                                     initargs=(threads,))
+    try:
+        results = []
+        for result in pool.imap_unordered(_train_candidate, tasks):
+            logger.info("Candidate %s done: %s", result["candidate"],
+                        result.get("error") or "MAPE %.2f" % result["mape"])
+            results.append(result)
+    finally:
+        pool.close()
+        pool.join()
+
+    results = pd.DataFrame(results)
+    if "mape" in results:
+        results = results.sort_values("mape", na_position="last")
+    return results.reset_index(drop=True)
@@ -0,0 +1,181 @@
+"""The tokenizer module.
+
+This module provides a compact vocabulary that turns texts into padded sequences of word indices
+the same way a fitted Keras ``Tokenizer`` and ``pad_sequences`` do, without loading TensorFlow.
+
+"""
+
+import json
+import logging
+import os
+
+import numpy as np
+
+from src.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+logger.setLevel("INFO")
+
+# Default filters of the Keras Tokenizer
+DEFAULT_FILTERS = '!"#$%&()*+,-./:;<=>?@[\\]^_`{|}~\t\n'
+
+# One vocabulary per path along with the modification time it was loaded at, shared by all callers
+# in the process
+_vocabularies = {}
+
+# Time taken to load a vocabulary
+_load_time = REGISTRY.stage("tokenizer_load")
+
+
+class Vocabulary:
+    """Word to index mapping of a fitted tokenizer, with everything needed for inference only."""
+
+    def __init__(self, words, oov_token=None, filters=DEFAULT_FILTERS, lower=True, split=" "):
+        """Initialize a Vocabulary object.
+
+        Args:
+            words (:obj:`list` of :obj:`str`): The words ordered by index, starting at index 1.
+            oov_token (str): Token that replaces out-of-vocabulary words (optional).
+            filters (str): Characters removed from the texts before they are split.
+            lower (bool): Whether to lowercase the texts.
+            split (str): Separator between words.
+
+        """
+        self.words = list(words)
+        self.oov_token = oov_token
+        self.filters = filters
+        self.lower = lower
+        self.split = split
+        self.word_index = {word: i for i, word in enumerate(self.words, start=1)}
+        self.oov_index = self.word_index.get(oov_token)
+        self._translate_map = str.maketrans({character: split for character in filters})
+
+    def __len__(self):
+        return len(self.words)
+
+    @classmethod
+    def from_tokenizer(cls, tokenizer):
+        """Create a Vocabulary from a fitted Keras Tokenizer.
+
+        Args:
+            tokenizer (:py:class:`tf.keras.preprocessing.text.Tokenizer`): A fitted tokenizer
+            without a ``num_words`` limit.
+
+        Returns:
+            :py:class:`Vocabulary`: The vocabulary of the tokenizer.
+
+        """
+        if tokenizer.num_words is not None or tokenizer.char_level:
+            raise ValueError("Only word-level tokenizers without a num_words limit are supported")
+        words = sorted(tokenizer.word_index, key=tokenizer.word_index.get)
+        if [tokenizer.word_index[word] for word in words] != list(range(1, len(words) + 1)):
+            raise ValueError("The word indices of the tokenizer are not contiguous")
+        return cls(words, tokenizer.oov_token, tokenizer.filters, tokenizer.lower, tokenizer.split)
+
+    @classmethod
+    def load(cls, path):
+        """Load a Vocabulary saved by :py:meth:`save`.
+
+        Args:
+            path (str): The path that points to the saved vocabulary.
+
+        Returns:
+            :py:class:`Vocabulary`: The loaded vocabulary.
+
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(**json.load(f))
+
+    def save(self, path):
+        """Save the Vocabulary as a JSON file.
+
+        Args:
+            path (str): Path to save the vocabulary to.
+
+        Returns:
+            None
+
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"words": self.words, "oov_token": self.oov_token, "filters": self.filters,
+                       "lower": self.lower, "split": self.split}, f, ensure_ascii=False)
+
+    def text_to_sequence(self, text):
+        """Turn a text into a sequence of word indices.
+
+        Args:
+            text (str): The input text.
+
+        Returns:
+            :obj:`list` of int: The indices of the words in the text. Unknown words are replaced
+            by the index of the OOV token, or dropped if there is none.
+
+        """
+        if self.lower:
+            text = text.lower()
+        words = text.translate(self._translate_map).split(self.split)
+        get = self.word_index.get
+        oov_index = self.oov_index
+        sequence = []
+        for word in words:
+            if word:
+                i = get(word, oov_index)
+                if i is not None:
+                    sequence.append(i)
+        return sequence
+
+    def texts_to_padded(self, texts, max_length, padding="pre", truncating="pre"):
+        """Turn texts into a matrix of padded sequences of word indices.
+
+        The result is identical to ``texts_to_sequences`` followed by ``pad_sequences`` with
+        the same arguments, but the sequences are written straight into one preallocated matrix.
+
+        Args:
+            texts (iterable of str): The input texts.
+            max_length (int): Length of every sequence.
+            padding (str): Pad either before ('pre') or after ('post') each sequence.
+            truncating (str): Remove words either from the beginning ('pre') or the end ('post')
+            of sequences longer than max_length.
+
+        Returns:
+            :py:class:`numpy.array`: An int32 matrix with one row per text.
+
+        """
+        if padding not in ("pre", "post"):
+            raise ValueError("Padding type '%s' not understood" % padding)
+        if truncating not in ("pre", "post"):
+            raise ValueError("Truncating type '%s' not understood" % truncating)
+
+        texts = list(texts)
+        result = np.zeros((len(texts), max_length), dtype=np.int32)
+        for row, text in enumerate(texts):
+            sequence = self.text_to_sequence(text)
+            if not sequence:
+                continue
+            if len(sequence) > max_length:
+                sequence = sequence[-max_length:] if truncating == "pre" else sequence[:max_length]
+            if padding == "post":
+                result[row, :len(sequence)] = sequence
+            else:
+                result[row, max_length - len(sequence):] = sequence
+        return result
+
+
+def load_vocabulary(path):
+    """Get the shared Vocabulary saved at a path, loading it on first use or when it changed.
+
+    Args:
+        path (str): The path that points to the saved vocabulary.
+
+    Returns:
+        :py:class:`Vocabulary`: The vocabulary.
+
+    """
+    mtime = os.path.getmtime(path)
+    loaded_mtime, vocabulary = _vocabularies.get(path, (None, None))
+    if vocabulary is None or loaded_mtime != mtime:
+        with _load_time.timer():
+            vocabulary = Vocabulary.load(path)
+        _vocabularies[path] = (mtime, vocabulary)
+        logger.info("Loaded vocabulary of %s words from %s", len(vocabulary), path)
+    return vocabulary
@@ -0,0 +1,84 @@
+import threading
+
+import pytest
+
+from src import batcher, metrics
+
+
+def test_inference_batcher():
+    """Happy path for the InferenceBatcher class."""
+    calls = []
+
+    def predict_fn(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    inference_batcher = batcher.InferenceBatcher(predict_fn, max_batch_size=4, max_wait_ms=200,
+                                                 metrics=metrics.MetricsRegistry())
+    futures = [inference_batcher.submit(i) for i in range(6)]
+    assert [future.result(5) for future in futures] == [0, 2, 4, 6, 8, 10]
+    inference_batcher.close()
+
+    # Concurrent requests are grouped up to the maximum batch size
+    assert [len(call) for call in calls] == [4, 2]
+    stats = inference_batcher.stats()
+    assert stats["batch_size"]["count"] == 2
+    assert stats["queue_delay_seconds"]["count"] == 6
+
+
+def test_inference_batcher_concurrent_threads():
+    """Happy path for the InferenceBatcher class with callers in different threads."""
+    inference_batcher = batcher.InferenceBatcher(lambda items: [-item for item in items],
+                                                 max_batch_size=8, max_wait_ms=20,
+                                                 metrics=metrics.MetricsRegistry())
+    results = {}
+
+    def call(i):
+        results[i] = inference_batcher.predict(i, timeout=5)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    inference_batcher.close()
+    assert results == {i: -i for i in range(16)}
+
+
+def test_inference_batcher_error():
+    """Unhappy path for the InferenceBatcher class."""
+    def predict_fn(items):
+        raise ValueError("model failure")
+
+    inference_batcher = batcher.InferenceBatcher(predict_fn, max_wait_ms=1,
+                                                 metrics=metrics.MetricsRegistry())
+    with pytest.raises(ValueError):
+        inference_batcher.predict("tweet", timeout=5)
+    inference_batcher.close()
+
+    # No more requests are accepted once closed
+    with pytest.raises(RuntimeError):
+        inference_batcher.submit("tweet")
+
+
+def test_inference_batcher_queue_full():
+    """Unhappy path for the InferenceBatcher class when its queue is full."""
+    release = threading.Event()
+
+    def predict_fn(items):
+        release.wait(5)
+        return items
+
+    inference_batcher = batcher.InferenceBatcher(predict_fn, max_batch_size=1, max_wait_ms=0,
+                                                 max_queue_size=2,
+                                                 metrics=metrics.MetricsRegistry())
+    running = inference_batcher.submit("running")
+    while not running.running():
+        pass
+    waiting = [inference_batcher.submit(i) for i in range(2)]
+    with pytest.raises(batcher.QueueFullError):
+        inference_batcher.submit("rejected")
+    release.set()
+    assert [future.result(5) for future in waiting] == [0, 1]
+    assert inference_batcher.rejected.value == 1
+    inference_batcher.close()
@@ -0,0 +1,95 @@
+import json
+import os
+
+import pytest
+import yaml
+
+from src import benchmark, process
+
+
+def test_startup_cost():
+    """Happy path for the startup_cost function."""
+    commands = {"cli": {"argv": ["run.py", "--help"], "max_seconds": 60, "max_rss_mb": 1000},
+                "create_db": {"argv": ["run.py", "create_db", "--engine_string",
+                                       "sqlite:///{tmp}/startup.db"],
+                              "max_seconds": 60, "max_rss_mb": 1000}}
+    results = benchmark.startup_cost(commands)
+    assert list(results["command"]) == ["cli", "create_db"]
+    assert results["within_budget"].all()
+    # Creating the database only needs SQLAlchemy
+    assert list(results["heavy_modules"]) == ["", ""]
+
+
+def test_startup_cost_over_budget():
+    """Unhappy path for the startup_cost function."""
+    results = benchmark.startup_cost({"numpy": {"import": "numpy", "max_seconds": 60,
+                                                "max_rss_mb": 1}})
+    assert not results["within_budget"].any()
+
+    with pytest.raises(RuntimeError):
+        benchmark.startup_cost({"missing": {"import": "not_a_module", "max_seconds": 60,
+                                            "max_rss_mb": 1000}})
+
+
+@pytest.mark.skipif(not os.environ.get("CHECK_STARTUP_BUDGET"),
+                    reason="Wall clock budgets depend on the machine, set CHECK_STARTUP_BUDGET=1 "
+                           "to check them")
+def test_startup_budget():
+    """The CLI and the web apps start within the budgets set in the configuration."""
+    with open("config/config.yaml", "r") as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+    results = benchmark.startup_cost(config["benchmark"]["startup"]["commands"])
+    assert results["within_budget"].all(), results.to_string(index=False)
+
+
+def test_synthetic_corpus():
+    """Happy path for the synthetic_corpus function."""
+    corpus = benchmark.synthetic_corpus(200, seed=1)["content"]
+    assert len(corpus) == 200
+    assert corpus.tolist() == benchmark.synthetic_corpus(200, seed=1)["content"].tolist()
+    assert corpus.tolist() != benchmark.synthetic_corpus(200, seed=2)["content"].tolist()
+    assert corpus.str.contains("https://").any()
+
+
+def test_synthetic_corpus_invalid_size():
+    """Unhappy path for the synthetic_corpus function."""
+    assert benchmark.synthetic_corpus(0).empty
+    with pytest.raises(TypeError):
+        benchmark.synthetic_corpus("ten")
+
+
+def test_run_suite(tmp_path):
+    """Happy path for the run_suite function."""
+    # Every word of the corpus is in the lemma table, so WordNet is not needed
+    lemma_table_path = tmp_path / "lemmas.tsv"
+    words = set()
+    for content in benchmark.synthetic_corpus(20)["content"]:
+        words.update(process.remove_punctuations(process.remove_urls(content)).lower().split())
+    lemma_table_path.write_text("".join("%s\t%s\n" % (word, word) for word in sorted(words)))
+
+    results = benchmark.run_suite([20], "data/external/nltk_data", "models/vocab.json", "post", 45,
+                                  "models/lstm_weights.npz", str(lemma_table_path), repeat=1)
+    assert [row["case"] for row in results["results"]] == [
+        "remove_urls", "process_tweet", "drop_non_en_content", "tokenize", "predict",
+        "end_to_end"]
+    assert all(row["size"] == 20 and row["seconds"] > 0 for row in results["results"])
+    assert results["metadata"]["seed"] == 0
+    json.dumps(results)
+
+
+def test_compare_results():
+    """Happy path for the compare_results function."""
+    baseline = {"results": [{"case": "predict", "size": 10, "seconds": 1.0},
+                            {"case": "tokenize", "size": 10, "seconds": 1.0}]}
+    results = {"results": [{"case": "predict", "size": 10, "seconds": 1.1},
+                           {"case": "tokenize", "size": 10, "seconds": 1.5}]}
+    comparison = benchmark.compare_results(results, baseline, threshold=0.2)
+    assert comparison["regression"].tolist() == [False, True]
+    assert comparison["change"].tolist() == pytest.approx([0.1, 0.5])
+
+
+def test_compare_results_missing_baseline():
+    """Unhappy path for the compare_results function with cases missing from the baseline."""
+    comparison = benchmark.compare_results(
+        {"results": [{"case": "predict", "size": 10, "seconds": 1.0}]}, {"results": []})
+    assert comparison.empty
@@ -0,0 +1,111 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+import yaml
+
+from src import cache, metrics
+
+
+def test_fingerprint(tmp_path):
+    """Happy path for the fingerprint function."""
+    path = tmp_path / "input.csv"
+    path.write_text("content,retweets\na,1\n")
+    key = cache.fingerprint("clean", [str(path)], {"cutoff": 2500})
+
+    # Same inputs give the same fingerprint, changed data or configuration do not
+    assert key == cache.fingerprint("clean", [str(path)], {"cutoff": 2500})
+    assert key != cache.fingerprint("clean", [str(path)], {"cutoff": 2000})
+    path.write_text("content,retweets\na,2\n")
+    assert key != cache.fingerprint("clean", [str(path)], {"cutoff": 2500})
+
+
+def test_fingerprint_missing_file():
+    """Unhappy path for the fingerprint function."""
+    with pytest.raises(FileNotFoundError):
+        cache.fingerprint("clean", ["data/pipeline/does_not_exist.csv"], {})
+
+
+def test_step_cache(tmp_path):
+    """Happy path for storing, restoring and evicting step outputs."""
+    step_cache = cache.StepCache(str(tmp_path / "cache"), max_entries=1)
+    output_path = tmp_path / "output.csv"
+
+    output_path.write_text("first")
+    step_cache.store("first", str(output_path))
+    os.utime(tmp_path / "cache" / "steps" / "first.csv", (0, 0))
+    output_path.write_text("second")
+    step_cache.store("second", str(output_path))
+
+    # The first output was evicted to keep a single entry
+    assert not step_cache.restore("first", str(output_path))
+    output_path.write_text("")
+    assert step_cache.restore("second", str(output_path))
+    assert output_path.read_text() == "second"
+
+
+def test_step_cache_skips_reading_input(tmp_path):
+    """A pipeline step restored from the cache does not read its input."""
+    with open("config/config.yaml", "r") as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+    config["cache"]["cache_dir"] = str(tmp_path / "cache")
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text(yaml.dump(config))
+    input_path = tmp_path / "input.csv"
+    input_path.write_text("content,retweets\nmake america great again,1\n")
+
+    command = [sys.executable, "run.py", "pipeline", "clean", "--config", str(config_path),
+               "--input", str(input_path), "--output", str(tmp_path / "cleaned.csv")]
+    logs = [subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                           universal_newlines=True, check=True).stderr for _ in range(2)]
+    assert "Input data loaded" in logs[0]
+    assert "Input data loaded" not in logs[1] and "reused the cached output" in logs[1]
+
+
+def test_tweet_cache(tmp_path):
+    """Happy path for the TweetCache class."""
+    path = str(tmp_path / "tweets.json")
+    tweet_cache = cache.TweetCache(path, max_entries=2)
+    for content in ["a", "b", "c"]:
+        tweet_cache.put(tweet_cache.key(content), content.upper())
+    tweet_cache.save()
+
+    # The least recently used tweet was evicted
+    tweet_cache = cache.TweetCache(path, max_entries=2)
+    assert tweet_cache.get(tweet_cache.key("a")) is None
+    assert tweet_cache.get(tweet_cache.key("c")) == "C"
+    assert (tweet_cache.hits, tweet_cache.misses) == (1, 1)
+
+
+def test_tweet_cache_key_non_str():
+    """Unhappy path for the TweetCache.key method."""
+    with pytest.raises(AttributeError):
+        cache.TweetCache.key(123.456)
+
+
+def test_prediction_cache():
+    """Happy path for the PredictionCache class."""
+    prediction_cache = cache.PredictionCache(max_entries=2, ttl=None,
+                                             metrics=metrics.MetricsRegistry())
+    prediction_cache.put("v1", "make america great", 10)
+    prediction_cache.put("v1", "fake news", 20)
+    assert prediction_cache.get("v1", "make america great") == 10
+    assert prediction_cache.get("v2", "make america great") is None
+
+    # The least recently used prediction is evicted
+    prediction_cache.put("v1", "witch hunt", 30)
+    assert prediction_cache.get("v1", "fake news") is None
+    assert prediction_cache.get("v1", "make america great") == 10
+    assert prediction_cache.stats() == {"size": 2, "hits": 2, "misses": 2, "expirations": 0,
+                                        "evictions": 1, "hit_rate": 0.5}
+
+
+def test_prediction_cache_expired():
+    """Unhappy path for the PredictionCache class with expired predictions."""
+    prediction_cache = cache.PredictionCache(ttl=0.01, metrics=metrics.MetricsRegistry())
+    prediction_cache.put("v1", "make america great", 10)
+    time.sleep(0.02)
+    assert prediction_cache.get("v1", "make america great") is None
+    assert prediction_cache.stats()["expirations"] == 1
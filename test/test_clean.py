@@ -66,4 +66,42 @@ def test_drop_non_en_content_wrong_type():
         clean.drop_non_en_content(df_in, "content")
 
 
+def test_build_clean_mask():
+    """Happy path for the build_clean_mask function."""
+    df_in = pd.DataFrame([["a", 1], ["b", 5], ["", 6], ["%", 7], ["c", 8]],
+                         columns=["content", "retweets"])
+    rules = {"remove_outliers": {"column": "retweets", "cutoff": 2},
+             "drop_empty_content": {"content_column": "content"},
+             "drop_non_en_content": {"content_column": "content"}}
+    mask_true = pd.Series([False, True, False, False, True])
+    removed_true = {"remove_outliers": 1, "drop_empty_content": 1, "drop_non_en_content": 1}
+    mask_test, removed_test = clean.build_clean_mask(df_in, rules)
+    pd.testing.assert_series_equal(mask_test, mask_true)
+    assert removed_test == removed_true
+
+
+def test_build_clean_mask_unknown_rule():
+    """Unhappy path for the build_clean_mask function."""
+    df_in = pd.DataFrame(["a", "b"], columns=["content"])
+    with pytest.raises(ValueError):
+        clean.build_clean_mask(df_in, {"drop_everything": {}})
+
+
+def test_clean_data():
+    """Happy path for the clean_data function."""
+    df_in = pd.DataFrame([["a", 5], ["", 6], ["%", 7], [None, 8], ["c", 1]],
+                         columns=["content", "retweets"])
+    rules = {"remove_outliers": {"column": "retweets", "cutoff": 2},
+             "drop_empty_content": {"content_column": "content"},
+             "drop_non_en_content": {"content_column": "content"}}
+    df_true = pd.DataFrame([["a", 5]], columns=["content", "retweets"])
+    df_test = clean.clean_data(df_in, rules)
+    pd.testing.assert_frame_equal(df_test, df_true)
+
 
+def test_clean_data_wrong_type():
+    """Unhappy path for the clean_data function."""
+    # Column is numeric
+    df_in = pd.DataFrame([1, 2, 3, 4, 5], columns=["content"])
+    with pytest.raises(AttributeError):
+        clean.clean_data(df_in, {"drop_non_en_content": {"content_column": "content"}})
@@ -0,0 +1,129 @@
+import threading
+
+import pandas as pd
+import pytest
+import sqlalchemy
+
+from src import database, metrics
+
+
+def count_tweets(engine_string):
+    """Count the tweets saved in a database."""
+    engine = sqlalchemy.create_engine(engine_string)
+    return engine.execute("SELECT COUNT(*) FROM tweets").scalar()
+
+
+def test_tweet_manager_write_behind(tmp_path):
+    """Happy path for the TweetManager class in write-behind mode."""
+    engine_string = "sqlite:///%s" % (tmp_path / "tweets.db")
+    database.create_db(engine_string)
+    tweet_manager = database.TweetManager(engine_string=engine_string, write_behind=True,
+                                          flush_size=10, flush_interval=60,
+                                          metrics=metrics.MetricsRegistry())
+    for i in range(25):
+        tweet_manager.add_tweet(content="tweet %s" % i, retweets=i)
+
+    # The remaining tweets are inserted when the manager is closed
+    tweet_manager.close()
+    assert count_tweets(engine_string) == 25
+    stats = tweet_manager.stats()
+    assert stats["written"] == 25 and stats["dropped"] == 0 and stats["queue_depth"] == 0
+    assert stats["flush_seconds"]["count"] >= 3
+
+
+def test_tweet_manager_write_behind_failed_insert(tmp_path):
+    """Unhappy path for the TweetManager class in write-behind mode without a table."""
+    engine_string = "sqlite:///%s" % (tmp_path / "tweets.db")
+    tweet_manager = database.TweetManager(engine_string=engine_string, write_behind=True,
+                                          metrics=metrics.MetricsRegistry())
+    tweet_manager.add_tweet(content="tweet", retweets=1)
+    tweet_manager.close()
+    assert tweet_manager.stats()["dropped"] == 1
+
+
+def test_create_db_upgrade(tmp_path):
+    """Happy path for the create_db function on a table created before the indexes existed."""
+    engine_string = "sqlite:///%s" % (tmp_path / "tweets.db")
+    engine = sqlalchemy.create_engine(engine_string)
+    engine.execute("CREATE TABLE tweets (id INTEGER NOT NULL, content VARCHAR(280) NOT NULL, "
+                   "retweets BIGINT NOT NULL, PRIMARY KEY (id))")
+    engine.execute("INSERT INTO tweets (content, retweets) VALUES ('old tweet', 1)")
+
+    database.create_db(engine_string)
+    inspector = sqlalchemy.inspect(engine)
+    assert "created_at" in {column["name"] for column in inspector.get_columns("tweets")}
+    assert {index["name"] for index in inspector.get_indexes("tweets")} == {
+        "ix_tweets_retweets", "ix_tweets_created_at"}
+    assert count_tweets(engine_string) == 1
+
+
+def test_load_tweets(tmp_path):
+    """Happy path for the load_tweets function."""
+    engine_string = "sqlite:///%s" % (tmp_path / "tweets.db")
+    database.create_db(engine_string)
+    chunks = [pd.DataFrame({"content": ["a", "b"], "retweets": [1.0, 2.0],
+                            "date": ["2020-07-20 19:43:46", None]}),
+              pd.DataFrame({"content": [], "retweets": [], "date": []}),
+              pd.DataFrame({"content": ["c"], "retweets": [3.0]})]
+    assert database.load_tweets(engine_string, chunks) == 3
+    engine = sqlalchemy.create_engine(engine_string)
+    rows = engine.execute("SELECT content, retweets, created_at FROM tweets ORDER BY id")
+    # The creation time is when the tweet was posted, not when it was loaded
+    assert [tuple(row) for row in rows.fetchall()] == [("a", 1, "2020-07-20 19:43:46.000000"),
+                                                       ("b", 2, None), ("c", 3, None)]
+
+
+def test_load_tweets_missing_column(tmp_path):
+    """Unhappy path for the load_tweets function, which loads nothing if a chunk fails."""
+    engine_string = "sqlite:///%s" % (tmp_path / "tweets.db")
+    database.create_db(engine_string)
+    chunks = [pd.DataFrame({"content": ["a"], "retweets": [1]}),
+              pd.DataFrame({"content": ["b"], "likes": [2]})]
+    with pytest.raises(KeyError):
+        database.load_tweets(engine_string, chunks)
+    assert count_tweets(engine_string) == 0
+
+
+def test_tweet_manager_threads(tmp_path):
+    """Happy path for the TweetManager class adding tweets from several threads."""
+    engine_string = "sqlite:///%s" % (tmp_path / "tweets.db")
+    database.create_db(engine_string)
+    registry = metrics.MetricsRegistry()
+    tweet_manager = database.TweetManager(
+        engine_string=engine_string, metrics=registry,
+        engine_options={"poolclass": sqlalchemy.pool.QueuePool, "pool_size": 2,
+                        "max_overflow": 0, "connect_args": {"check_same_thread": False}})
+
+    def add_tweets(i):
+        for j in range(10):
+            tweet_manager.add_tweet(content="tweet %s-%s" % (i, j), retweets=j)
+
+    threads = [threading.Thread(target=add_tweets, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    tweet_manager.close()
+
+    # Every connection went back to the pool, which never opened more than its size
+    assert count_tweets(engine_string) == 40
+    assert registry.metrics["db_pool_checked_out"].value == 0
+    assert registry.metrics["db_pool_connections_opened_total"].value <= 2
+    assert tweet_manager.stats()["checkout_seconds"]["count"] == 40
+    assert tweet_manager.stats()["commit_seconds"]["count"] == 40
+
+
+def test_tweet_manager_session_scope_rollback(tmp_path):
+    """Unhappy path for the TweetManager class when a unit of work fails."""
+    engine_string = "sqlite:///%s" % (tmp_path / "tweets.db")
+    database.create_db(engine_string)
+    tweet_manager = database.TweetManager(engine_string=engine_string,
+                                          metrics=metrics.MetricsRegistry())
+    with pytest.raises(ValueError):
+        with tweet_manager.session_scope() as session:
+            session.add(database.Tweets(content="tweet", retweets=1))
+            session.flush()
+            raise ValueError("failure after the insert")
+    tweet_manager.close()
+    assert count_tweets(engine_string) == 0
+    assert tweet_manager.stats()["commit_seconds"]["count"] == 0
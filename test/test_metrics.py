@@ -0,0 +1,69 @@
+import pytest
+
+from src import metrics
+
+
+def test_histogram():
+    """Happy path for the Histogram class."""
+    histogram = metrics.Histogram("latency_seconds", "Latency", buckets=(1, 2, 4))
+    for value in [0.5, 1.5, 1.5, 3, 10]:
+        histogram.observe(value)
+    assert histogram.counts == [1, 2, 1, 1]
+    assert histogram.count == 5
+    assert histogram.sum == pytest.approx(16.5)
+    assert histogram.quantile(0.5) == pytest.approx(1.75)
+    assert histogram.quantile(0.99) == 4
+    assert metrics.Histogram("empty", "Empty").summary()["p99"] is None
+
+
+def test_metrics_registry_conflict():
+    """Unhappy path for the MetricsRegistry class."""
+    registry = metrics.MetricsRegistry()
+    counter = registry.counter("requests_total", "Requests")
+    assert registry.counter("requests_total", "Requests") is counter
+    with pytest.raises(ValueError):
+        registry.histogram("requests_total", "Requests")
+
+
+def test_histogram_timer():
+    """Happy path for the timer of the Histogram class, which also times blocks that raise."""
+    histogram = metrics.Histogram("latency_seconds", "Latency")
+    with histogram.timer():
+        pass
+    with pytest.raises(KeyError):
+        with histogram.timer():
+            raise KeyError("missing")
+    assert histogram.count == 2
+    assert 0 <= histogram.sum < 1
+
+
+def test_metrics_registry_render():
+    """Happy path for the render method of the MetricsRegistry class."""
+    registry = metrics.MetricsRegistry()
+    registry.counter("requests_total", "Requests\nserved").inc(3)
+    registry.gauge("queue_depth", "Queue depth").set(2)
+    histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.5, 1))
+    for value in [0.25, 0.75, 2]:
+        histogram.observe(value)
+    assert registry.render() == "\n".join([
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{le="0.5"} 1',
+        'latency_seconds_bucket{le="1"} 2',
+        'latency_seconds_bucket{le="+Inf"} 3',
+        "latency_seconds_sum 3.0",
+        "latency_seconds_count 3",
+        "# HELP queue_depth Queue depth",
+        "# TYPE queue_depth gauge",
+        "queue_depth 2",
+        "# HELP requests_total Requests\\nserved",
+        "# TYPE requests_total counter",
+        "requests_total 3"]) + "\n"
+
+
+def test_metrics_registry_stage():
+    """Unhappy path for the stage method of the MetricsRegistry class."""
+    registry = metrics.MetricsRegistry()
+    assert registry.stage("inference") is registry.metrics["inference_seconds"]
+    with pytest.raises(ValueError):
+        registry.stage("training")
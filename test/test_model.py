@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
 import pytest
+import yaml
 
 from src import model
 
@@ -39,3 +40,163 @@ def test_train_test_split_non_df():
     with pytest.raises(AttributeError):
         model.train_test_split(df_in, content_column="content", label_column="retweets",
                                test_size=0.2, random_state=2021423)
+
+
+def test_calculate_mape(tmp_path):
+    """Happy path for the calculate_mape function with model variants."""
+    rng = np.random.RandomState(0)
+    test_data = rng.randint(1, 1000, size=(40, 45))
+    test_labels = rng.randint(1000, 20000, size=40)
+    output_path = str(tmp_path / "performance.yaml")
+    model.calculate_mape(test_data, test_labels, "models/lstm_model", output_path,
+                         variants={"float32": "models/lstm_weights.npz"}, batch_sizes=[1, 16],
+                         retweet_buckets=[5000, 10000], max_batches=5)
+    with open(output_path) as f:
+        performance = yaml.safe_load(f)
+    keras_model, numpy_model = performance["models"]["keras"], performance["models"]["float32"]
+    assert performance["mape"] == keras_model["accuracy"]["mape"]
+    assert performance["mae"] == keras_model["accuracy"]["mae"]
+    assert numpy_model["accuracy"]["mape"] == pytest.approx(performance["mape"], rel=0.01)
+    assert numpy_model["size_bytes"] < keras_model["size_bytes"]
+    assert [bucket["retweets"] for bucket in keras_model["accuracy"]["buckets"]] == \
+        ["0-5000", "5000-10000", "10000+"]
+    assert sum(bucket["count"] for bucket in keras_model["accuracy"]["buckets"]) == 40
+    assert set(numpy_model["serving"]) == {1, 16}
+    assert numpy_model["serving"][1]["batches"] == 5
+    assert set(numpy_model["serving"][16]["latency_ms"]) == {"p50", "p95", "p99"}
+
+
+def test_calculate_mape_missing_variant(tmp_path):
+    """Unhappy path for the calculate_mape function with a variant that does not exist."""
+    rng = np.random.RandomState(0)
+    with pytest.raises(FileNotFoundError):
+        model.calculate_mape(rng.randint(1, 1000, size=(4, 45)), rng.randint(1, 10, size=4),
+                             "models/lstm_model", str(tmp_path / "performance.yaml"),
+                             variants={"int8": str(tmp_path / "missing.npz")})
+
+
+def test_accuracy_report():
+    """Happy path for the accuracy_report function."""
+    predictions = np.array([[110.4], [90], [1000], [0]])
+    labels = np.array([100, 100, 2000, 4000])
+    report = model.accuracy_report(predictions, labels, retweet_buckets=[1000, 3000])
+    assert report["mape"] == pytest.approx((10 + 10 + 50 + 100) / 4)
+    assert report["mae"] == pytest.approx((10 + 10 + 1000 + 4000) / 4)
+    assert report["buckets"] == [
+        {"retweets": "0-1000", "count": 2, "mape": pytest.approx(10), "mae": pytest.approx(10)},
+        {"retweets": "1000-3000", "count": 1, "mape": pytest.approx(50),
+         "mae": pytest.approx(1000)},
+        {"retweets": "3000+", "count": 1, "mape": pytest.approx(100), "mae": pytest.approx(4000)}]
+
+
+def test_accuracy_report_mismatched_labels():
+    """Unhappy path for the accuracy_report function."""
+    with pytest.raises(ValueError):
+        model.accuracy_report(np.ones(3), np.ones(4))
+
+
+def test_sequence_lengths():
+    """Happy path for the sequence_lengths function."""
+    data = np.array([[4, 2, 0, 0], [3, 0, 5, 0], [0, 0, 0, 0], [1, 2, 3, 4]])
+    assert model.sequence_lengths(data).tolist() == [2, 3, 1, 4]
+
+
+def test_sequence_lengths_non_matrix():
+    """Unhappy path for the sequence_lengths function."""
+    with pytest.raises(IndexError):
+        model.sequence_lengths(np.array([1, 2, 0]))
+
+
+def test_make_dataset():
+    """Happy path for the make_dataset function."""
+    lengths = [1, 3, 8, 2, 9, 7, 1, 10]
+    data = np.array([[i + 1] * n + [0] * (10 - n) for i, n in enumerate(lengths)])
+    labels = np.arange(len(lengths), dtype=np.float32)
+    dataset = model.make_dataset(data, labels, batch_size=2, bucket_boundaries=[5],
+                                 shuffle_buffer=8, seed=0)
+    seen = []
+    for batch, batch_labels in dataset:
+        batch = batch.numpy()
+        # Batches are padded to one step past their longest sequence, which falls in a single
+        # bucket
+        assert batch.shape[1] == min(max(lengths[int(label)] for label in batch_labels.numpy())
+                                     + 1, 10)
+        assert len({lengths[int(label)] < 5 for label in batch_labels.numpy()}) == 1
+        for row, label in zip(batch, batch_labels.numpy()):
+            np.testing.assert_array_equal(row, data[int(label)][:batch.shape[1]])
+        seen.extend(batch_labels.numpy().tolist())
+    assert sorted(seen) == labels.tolist()
+
+
+def test_make_dataset_mismatched_labels():
+    """Unhappy path for the make_dataset function."""
+    with pytest.raises(ValueError):
+        model.make_dataset(np.ones((4, 3), dtype=np.int64), np.ones(3), batch_size=2)
+
+
+def _compile_tiny_model(mask_zero=False):
+    """Helper function to compile a small model for the training tests."""
+    return model.compile_model(20, embedding_params={"output_dim": 2, "input_length": 5,
+                                                     "mask_zero": mask_zero},
+                               lstm_params={"units": 2, "return_sequences": True},
+                               dense_params={"units": 2, "activation": "relu"},
+                               output_params={"units": 1}, dropout=0.1,
+                               compile_params={"loss": "mae", "optimizer": "adam"})
+
+
+def test_fit_model_resume(tmp_path):
+    """Happy path for the fit_model function with early stopping and resumed training."""
+    rng = np.random.RandomState(0)
+    data, labels = rng.randint(1, 20, size=(16, 5)), rng.rand(16)
+    checkpoint = {"checkpoint_dir": str(tmp_path / "checkpoints"), "save_every": 5}
+
+    # A huge min_delta stops training after the second epoch
+    lstm_model = _compile_tiny_model()
+    epoch_seconds = model.fit_model(lstm_model, data, labels, epochs=10, verbose=0,
+                                    validation_split=0.25, model_path=str(tmp_path / "model"),
+                                    early_stopping={"monitor": "loss", "min_delta": 1e9,
+                                                    "patience": 0},
+                                    checkpoint=checkpoint)
+    assert len(epoch_seconds) == 2
+    assert (tmp_path / "checkpoints" / "ckpt-2.index").exists()
+
+    resumed = _compile_tiny_model()
+    epoch_seconds = model.fit_model(resumed, data, labels, epochs=3, verbose=0,
+                                    validation_split=0.25, model_path=str(tmp_path / "model"),
+                                    checkpoint=checkpoint, resume=True)
+    assert len(epoch_seconds) == 1
+    # The optimizer continues counting its steps from the checkpoint
+    assert resumed.optimizer.iterations.numpy() == 3 * lstm_model.optimizer.iterations.numpy() / 2
+
+
+def test_fit_model_resume_without_checkpoint(tmp_path):
+    """Unhappy path for the fit_model function resuming without a checkpoint configuration."""
+    with pytest.raises(ValueError):
+        model.fit_model(_compile_tiny_model(), np.ones((4, 5)), np.ones(4), epochs=1, verbose=0,
+                        validation_split=0.25, model_path=str(tmp_path / "model"), resume=True)
+
+
+def test_fit_model_input_pipeline(tmp_path):
+    """A model trained on trimmed sequences predicts the same for trimmed and padded ones."""
+    rng = np.random.RandomState(0)
+    lengths = rng.randint(1, 6, size=16)
+    data = np.array([list(rng.randint(1, 20, size=n)) + [0] * (5 - n) for n in lengths])
+    lstm_model = _compile_tiny_model(mask_zero=True)
+    model.fit_model(lstm_model, data, rng.rand(16), epochs=2, verbose=0, validation_split=0.25,
+                    model_path=str(tmp_path / "model"),
+                    input_pipeline={"batch_size": 4, "bucket_boundaries": [3]})
+
+    padded = lstm_model.predict(data, verbose=0)
+    for sequence, length, prediction in zip(data, lengths, padded):
+        # Every width the pipeline may pad the sequence to
+        for width in range(min(length + 1, 5), 6):
+            trimmed = lstm_model.predict(sequence[None, :width], verbose=0)
+            np.testing.assert_allclose(trimmed[0], prediction, rtol=1e-5, atol=1e-6)
+
+
+def test_fit_model_input_pipeline_without_mask(tmp_path):
+    """Unhappy path for the fit_model function trimming the padding of a model without a mask."""
+    with pytest.raises(ValueError):
+        model.fit_model(_compile_tiny_model(), np.ones((4, 5)), np.ones(4), epochs=1, verbose=0,
+                        validation_split=0.25, model_path=str(tmp_path / "model"),
+                        input_pipeline={"batch_size": 2})
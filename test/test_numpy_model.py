@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from tensorflow import keras
+
+from src import numpy_model
+
+
+def test_numpy_model(tmp_path):
+    """Happy path for the export_weights function and the NumpyModel class."""
+    weights_path = str(tmp_path / "weights.npz")
+    numpy_model.export_weights("models/lstm_model", weights_path)
+    model = numpy_model.NumpyModel.load(weights_path)
+
+    rng = np.random.RandomState(0)
+    sequences = rng.randint(0, model.embedding.shape[0], size=(50, 45)).astype(np.int32)
+    sequences[:20, 10:] = 0
+    expected = keras.models.load_model("models/lstm_model").predict(sequences, verbose=0)
+    outputs = model.predict(sequences, batch_size=16)
+    assert outputs.shape == (50, 1)
+    np.testing.assert_allclose(outputs, expected, rtol=1e-5, atol=1e-2)
+    assert model.predict(sequences[:0]).shape == (0, 1)
+
+
+def test_numpy_model_mask_zero(tmp_path):
+    """Happy path for the NumpyModel class with a model masking the padding."""
+    from src import model as keras_model
+    lstm_model = keras_model.compile_model(
+        20, embedding_params={"output_dim": 4, "mask_zero": True},
+        lstm_params={"units": 3, "return_sequences": True},
+        dense_params={"units": 2, "activation": "relu"}, output_params={"units": 1},
+        dropout=0.1, compile_params={"loss": "mae", "optimizer": "adam"})
+    sequences = np.array([[3, 4, 5, 0, 0, 0], [7, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 0],
+                          [1, 2, 3, 4, 5, 6]], dtype=np.int32)
+    expected = lstm_model.predict(sequences, verbose=0)
+    lstm_model.save(str(tmp_path / "model"))
+    numpy_model.export_weights(str(tmp_path / "model"), str(tmp_path / "weights.npz"))
+
+    model = numpy_model.NumpyModel.load(str(tmp_path / "weights.npz"))
+    assert model.mask_zero
+    np.testing.assert_allclose(model.predict(sequences), expected, rtol=1e-5, atol=1e-6)
+
+
+def test_export_weights_other_architecture(tmp_path):
+    """Unhappy path for the export_weights function with a model not built by compile_model."""
+    model = keras.Sequential([keras.layers.Dense(1, input_shape=(3,))])
+    model.save(str(tmp_path / "dense_model"))
+    with pytest.raises(ValueError):
+        numpy_model.export_weights(str(tmp_path / "dense_model"), str(tmp_path / "weights.npz"))
+
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_quantize_weights(tmp_path, dtype):
+    """Happy path for the quantize_weights function."""
+    weights_path = str(tmp_path / "weights.npz")
+    quantized_path = str(tmp_path / "quantized.npz")
+    numpy_model.export_weights("models/lstm_model", weights_path)
+    numpy_model.quantize_weights(weights_path, quantized_path, dtype)
+    model = numpy_model.NumpyModel.load(weights_path)
+    quantized = numpy_model.NumpyModel.load(quantized_path)
+    assert quantized.embedding.dtype == np.dtype(dtype)
+    assert quantized.nbytes < model.nbytes
+
+    rng = np.random.RandomState(0)
+    sequences = rng.randint(0, model.embedding.shape[0], size=(50, 45))
+    sequences[:, 15:] = 0
+    expected = model.predict(sequences)
+    np.testing.assert_allclose(quantized.predict(sequences), expected, rtol=0.02)
+
+
+def test_quantize_weights_dtype(tmp_path):
+    """Unhappy path for the quantize_weights function with an unsupported dtype."""
+    with pytest.raises(ValueError):
+        numpy_model.quantize_weights("models/lstm_weights.npz", str(tmp_path / "quantized.npz"),
+                                     "int4")
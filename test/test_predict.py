@@ -0,0 +1,30 @@
+import pandas as pd
+import pytest
+
+from src import predict
+
+PREDICT_CONFIG = {"nltk_data_path": "data/external/nltk_data",
+                  "tokenizer_path": "models/vocab.json",
+                  "padding_type": "post",
+                  "max_length": 45,
+                  "fitted_model_path": "models/lstm_model"}
+
+
+def test_score_data():
+    """Happy path for the score_data and predict_batch functions using the trained model."""
+    df = pd.DataFrame({"content": ["", "the and of", None], "retweets": [1, 2, 3]})
+    scored = predict.score_data(df, "content", "predicted_retweets", batch_size=2,
+                                **PREDICT_CONFIG)
+    assert list(scored.columns) == ["content", "retweets", "predicted_retweets"]
+    assert "predicted_retweets" not in df.columns
+
+    # Batched predictions are the same as one tweet at a time
+    assert list(scored["predicted_retweets"]) == [predict.predict(text or "", **PREDICT_CONFIG)
+                                                 for text in df["content"]]
+
+
+def test_predict_batch_missing_model():
+    """Unhappy path for the predict_batch function."""
+    with pytest.raises(OSError):
+        predict.predict_batch([""], **dict(PREDICT_CONFIG,
+                                           fitted_model_path="models/does_not_exist"))
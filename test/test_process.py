@@ -1,7 +1,10 @@
+import os
+
 import pandas as pd
 import pytest
 
 from src import process
+from src.cache import TweetCache
 
 
 def test_remove_urls():
@@ -93,3 +96,93 @@ def test_process_data_wrong_type():
     df_in = pd.DataFrame([1, 2], columns=["content"])
     with pytest.raises(TypeError):
         process.process_data(df_in, "content", "data/external/nltk_data")
+
+
+def test_tweet_normalizer_normalize_many():
+    """Happy path for the TweetNormalizer.normalize_many method."""
+    normalizer = process.TweetNormalizer("data/external/nltk_data")
+    input_lst = ["This is a unit test!", "Visit www.URL.com for tests"]
+    output_true = ["unit test", "visit test"]
+    output_test = normalizer.normalize_many(input_lst)
+    assert output_true == output_test
+
+
+def test_tweet_normalizer_normalize_non_str():
+    """Unhappy path for the TweetNormalizer.normalize method."""
+    normalizer = process.TweetNormalizer("data/external/nltk_data")
+    with pytest.raises(TypeError):
+        normalizer.normalize(123.456)
+
+
+def test_get_normalizer_registers_path_once():
+    """The NLTK data path is registered once no matter how many tweets are processed."""
+    for _ in range(3):
+        process.remove_stopwords("This is a unit test", "data/external/nltk_data")
+    nltk = process._import_nltk()
+    assert nltk.data.path.count("data/external/nltk_data") == 1
+
+
+def test_process_data_parallel():
+    """Happy path for the process_data function with multiple worker processes."""
+    df_in = pd.DataFrame(["This is a unit test!", "Tests www.URL.com", "This is a unit test too:)"],
+                         columns=["content"])
+    df_true = pd.DataFrame(["unit test", "test", "unit test"], columns=["content"])
+    df_test = process.process_data(df_in, "content", "data/external/nltk_data", workers=2,
+                                   chunksize=1)
+    pd.testing.assert_frame_equal(df_test, df_true)
+
+
+def test_process_data_parallel_wrong_type():
+    """Unhappy path for the process_data function with multiple worker processes."""
+    df_in = pd.DataFrame([1, 2], columns=["content"])
+    with pytest.raises(TypeError):
+        process.process_data(df_in, "content", "data/external/nltk_data", workers=2, chunksize=1)
+
+
+def test_process_data_shared_pool(tmp_path):
+    """Chunks processed with a shared pool match the serial output and reuse the same worker."""
+    lemma_table_path = tmp_path / "lemmas.tsv"
+    lemma_table_path.write_text("unit\ntest\ntests\ttest\n", encoding="utf-8")
+    chunks = [pd.DataFrame(["This is a unit test!", "Tests www.URL.com"], columns=["content"]),
+              pd.DataFrame(["This is a unit test too:)"], columns=["content"])]
+    kwargs = dict(content_column="content", nltk_data_path="data/external/nltk_data",
+                  lemma_table_path=str(lemma_table_path))
+
+    with process.process_pool(kwargs["nltk_data_path"], workers=1,
+                              lemma_table_path=kwargs["lemma_table_path"]) as executor:
+        pids = set()
+        for chunk in chunks:
+            df_test = process.process_data(chunk.copy(), executor=executor, chunksize=1, **kwargs)
+            pd.testing.assert_frame_equal(df_test, process.process_data(chunk.copy(), **kwargs))
+            pids.add(executor.submit(os.getpid).result())
+    assert len(pids) == 1
+
+
+def test_lemma_lookup_load(tmp_path):
+    """Happy path for loading and using a precomputed lemma table."""
+    lemma_table_path = tmp_path / "lemmas.tsv"
+    lemma_table_path.write_text("great\ntests\ttest\n", encoding="utf-8")
+    lemmas = process.LemmaLookup.load(str(lemma_table_path))
+    assert [lemmas.lemmatize(word) for word in ["great", "tests"]] == ["great", "test"]
+    assert lemmas.stats()["table_hits"] == 2
+    assert lemmas.stats()["cache_misses"] == 0
+
+
+def test_lemma_lookup_load_missing_table(caplog):
+    """Unhappy path for loading a lemma table that does not exist."""
+    lemmas = process.LemmaLookup.load("models/does_not_exist.tsv")
+    assert lemmas.table == {}
+    assert "Cannot find lemma table at models/does_not_exist.tsv" in caplog.text
+    assert "run.py pipeline lemmas" in caplog.text
+
+
+def test_process_data_cached(tmp_path):
+    """Cached tweets are taken from the cache instead of being processed again."""
+    tweet_cache = TweetCache(str(tmp_path / "tweets.json"))
+    tweet_cache.put(tweet_cache.key("This is a unit test!"), "cached unit test")
+    df_in = pd.DataFrame(["This is a unit test!"], columns=["content"])
+    df_true = pd.DataFrame(["cached unit test"], columns=["content"])
+    df_test = process.process_data(df_in, "content", "data/external/nltk_data",
+                                   cache=tweet_cache)
+    pd.testing.assert_frame_equal(df_test, df_true)
+    assert tweet_cache.hits == 1
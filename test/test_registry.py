@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from src import registry
+
+
+def test_artifact_version(tmp_path):
+    """Happy path for the artifact_version function."""
+    model_dir = tmp_path / "model"
+    model_dir.mkdir()
+    (model_dir / "weights").write_text("first")
+    version = registry.artifact_version([str(model_dir), None])
+    assert version == registry.artifact_version([str(model_dir)])
+
+    # Modifying a file in the directory changes the version
+    (model_dir / "weights").write_text("second version")
+    assert version != registry.artifact_version([str(model_dir)])
+
+
+def test_model_registry():
+    """Happy path for the ModelRegistry class using the trained model."""
+    model_registry = registry.ModelRegistry("config/config.yaml", watch=False)
+    prediction, version = model_registry.predict("")
+    assert isinstance(prediction, int)
+    assert version == model_registry.version
+    assert not model_registry.reload_if_changed()
+
+    # Tweets normalizing to the same text are predicted once and then served from the cache
+    hits = model_registry.prediction_cache.hits
+    assert model_registry.predict_many(["The", "the!", "and"]) == [(prediction, version)] * 3
+    assert model_registry.prediction_cache.hits == hits + 3
+
+    # Touching the vocabulary swaps in a new version
+    stat = os.stat("models/vocab.json")
+    try:
+        os.utime("models/vocab.json", ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        assert model_registry.reload_if_changed()
+        assert model_registry.version != version
+        assert model_registry.prediction_cache.stats()["size"] == 0
+    finally:
+        os.utime("models/vocab.json", ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    model_registry.close()
+
+
+def test_model_registry_missing_config():
+    """Unhappy path for the ModelRegistry class."""
+    with pytest.raises(FileNotFoundError):
+        registry.ModelRegistry("config/does_not_exist.yaml", watch=False)
@@ -0,0 +1,143 @@
+import asyncio
+import json
+import threading
+
+import sqlalchemy
+
+from src import batcher, database, metrics, serving
+
+
+def call(app, method, path, body=b"", content_type=b"application/x-www-form-urlencoded"):
+    """Send one HTTP request to an ASGI app and collect its response."""
+    scope = {"type": "http", "method": method, "path": path,
+             "headers": [(b"content-type", content_type)]}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(app(scope, receive, send))
+    finally:
+        loop.close()
+    return messages[0]["status"], dict(messages[0]["headers"]), messages[1]["body"]
+
+
+def make_service(tmp_path, predict_fn, max_queue_size=None, **kwargs):
+    """Create a service with a fresh SQLite database."""
+    engine_string = "sqlite:///%s" % (tmp_path / "tweets.db")
+    database.create_db(engine_string)
+    registry = metrics.MetricsRegistry()
+    inference_batcher = batcher.InferenceBatcher(predict_fn, max_wait_ms=1,
+                                                 max_queue_size=max_queue_size, metrics=registry)
+    service = serving.TweetService(inference_batcher,
+                                   database.TweetManager(engine_string=engine_string,
+                                                         metrics=registry),
+                                   "app/templates", "app/static", metrics=registry, **kwargs)
+    return service, engine_string
+
+
+def test_tweet_service(tmp_path):
+    """Happy path for the TweetService class with form and JSON posts."""
+    service, engine_string = make_service(
+        tmp_path, lambda texts: [(len(text), "v1") for text in texts])
+
+    status, headers, body = call(service, "POST", "/tweet", b"tweet_content=make+%3Cb%3Eit")
+    assert status == 200
+    assert b"Predicted Number of Retweets: 10" in body
+    assert b"make &lt;b&gt;it" in body
+
+    status, headers, body = call(service, "POST", "/tweet",
+                                 json.dumps({"tweet_content": "great"}).encode("utf-8"),
+                                 b"application/json")
+    assert status == 200
+    assert json.loads(body.decode("utf-8")) == {"tweet_content": "great", "prediction": 5,
+                                                "model_version": "v1"}
+
+    status, headers, body = call(service, "GET", "/static/basic.css")
+    assert status == 200 and headers[b"content-type"] == b"text/css"
+
+    # Both posts were timed and are exposed to Prometheus
+    status, headers, body = call(service, "GET", "/metrics")
+    assert status == 200 and headers[b"content-type"] == metrics.CONTENT_TYPE.encode("latin-1")
+    assert b"tweet_request_seconds_count 2\n" in body
+    assert b"inference_batch_size_count 2\n" in body
+
+    # The tweets are saved in the background by the time the service is closed
+    service.close()
+    engine = sqlalchemy.create_engine(engine_string)
+    rows = engine.execute("SELECT content, retweets FROM tweets ORDER BY id").fetchall()
+    assert [tuple(row) for row in rows] == [("make <b>it", 10), ("great", 5)]
+
+
+def test_tweet_service_invalid_requests(tmp_path):
+    """Unhappy path for the TweetService class."""
+    release = threading.Event()
+
+    def predict_fn(texts):
+        release.wait(5)
+        return [(0, "v1") for _ in texts]
+
+    service, _ = make_service(tmp_path, predict_fn, max_queue_size=1)
+    assert call(service, "POST", "/tweet", b"{}", b"application/json")[0] == 400
+    assert call(service, "GET", "/static/../../config/flaskconfig.py")[0] == 404
+
+    # Requests are rejected once the queue of pending predictions is full
+    running = service.batcher.submit("running")
+    while not running.running():
+        pass
+    service.batcher.submit("waiting")
+    status, headers, _ = call(service, "POST", "/tweet", b"tweet_content=rejected")
+    release.set()
+    assert status == 503 and headers[b"retry-after"] == b"1"
+    service.close()
+
+
+def test_tweet_service_pending_writes(tmp_path):
+    """Tweets are not saved while too many are waiting for the database."""
+    service, engine_string = make_service(tmp_path, lambda texts: [(1, "v1") for _ in texts],
+                                          max_pending_writes=1)
+    release = threading.Event()
+    add_tweet = service.tweet_manager.add_tweet
+
+    def slow_add_tweet(content, retweets):
+        release.wait(5)
+        add_tweet(content, retweets)
+
+    service.tweet_manager.add_tweet = slow_add_tweet
+    assert call(service, "POST", "/tweet", b"tweet_content=saved")[0] == 200
+    assert call(service, "POST", "/tweet", b"tweet_content=dropped")[0] == 200
+    assert service.pending_writes.value == 1 and service.writes_dropped.value == 1
+    release.set()
+    service.close()
+    assert service.pending_writes.value == 0
+    engine = sqlalchemy.create_engine(engine_string)
+    assert engine.execute("SELECT content FROM tweets").fetchall() == [("saved",)]
+
+
+def test_tweet_service_error_after_response_start(tmp_path):
+    """Unhappy path for the TweetService class failing after the response has started."""
+    service, _ = make_service(tmp_path, lambda texts: [(1, "v1") for _ in texts])
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": []}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            raise ConnectionResetError("client went away")
+        messages.append(message)
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(service(scope, receive, send))
+    finally:
+        loop.close()
+    # No error page is started on top of the response that already started
+    assert [message["type"] for message in messages] == ["http.response.start"]
+    service.close()
@@ -0,0 +1,30 @@
+import pandas as pd
+import pytest
+
+from src import storage
+
+
+@pytest.mark.parametrize("extension", ["csv", "parquet", "feather"])
+def test_save_load_data(tmp_path, extension):
+    """Happy path for saving and loading data in every supported format."""
+    path = str(tmp_path / ("data." + extension))
+    df_true = pd.DataFrame([["unit test", 3000], ["another test", 4000]],
+                           columns=["content", "retweets"])
+    storage.save_data(df_true, path)
+    df_test = storage.load_data(path, memory_map=True)
+    pd.testing.assert_frame_equal(df_test, df_true)
+
+
+def test_save_data_format_override(tmp_path):
+    """The format argument takes precedence over the file extension."""
+    path = str(tmp_path / "data.csv")
+    df_true = pd.DataFrame([["unit test", 3000]], columns=["content", "retweets"])
+    storage.save_data(df_true, path, fmt="parquet")
+    df_test = storage.load_data(path, fmt="parquet")
+    pd.testing.assert_frame_equal(df_test, df_true)
+
+
+def test_get_format_unknown_extension():
+    """Unhappy path for the get_format function."""
+    with pytest.raises(ValueError):
+        storage.get_format("data/pipeline/processed.txt")
@@ -0,0 +1,72 @@
+import pandas as pd
+import pytest
+
+from src import clean, stream
+
+
+def test_infer_dtypes(tmp_path):
+    """Happy path for the infer_dtypes function."""
+    path = tmp_path / "input.csv"
+    pd.DataFrame({"content": ["a", "b", None, "d"], "retweets": [1, 2, 3, None]}).to_csv(
+        path, index=False)
+    dtypes_true = {"content": "object", "retweets": "float64"}
+    dtypes_test = stream.infer_dtypes(path, chunksize=2)
+    assert {column: str(dtype) for column, dtype in dtypes_test.items()} == dtypes_true
+
+
+def test_write_chunks(tmp_path):
+    """Streaming a file in chunks writes the same bytes as processing it all at once."""
+    input_path = tmp_path / "input.csv"
+    full_path = tmp_path / "full.csv"
+    chunked_path = tmp_path / "chunked.csv"
+    pd.DataFrame({"content": ["a", "", "c", "d", "e"], "retweets": [1, 2, 3, 4, None]}).to_csv(
+        input_path, index=False)
+
+    df = pd.read_csv(input_path)
+    df.loc[df["retweets"] > 1].to_csv(full_path, index=False)
+    chunks = stream.read_chunks(input_path, chunksize=2)
+    rows = stream.write_chunks((chunk.loc[chunk["retweets"] > 1] for chunk in chunks),
+                               chunked_path)
+
+    assert rows == 3
+    assert full_path.read_bytes() == chunked_path.read_bytes()
+
+
+def test_read_chunks_missing_file():
+    """Unhappy path for the read_chunks function."""
+    with pytest.raises(FileNotFoundError):
+        next(stream.read_chunks("data/pipeline/does_not_exist.csv", chunksize=2))
+
+
+@pytest.mark.parametrize("extension", ["parquet", "feather"])
+def test_write_chunks_columnar(tmp_path, extension):
+    """Streaming through a columnar file keeps all rows and dtypes."""
+    path = str(tmp_path / ("data." + extension))
+    df_true = pd.DataFrame({"content": ["a", "b", "c", "d", "e"], "retweets": [1, 2, 3, 4, 5]})
+    chunks = (df_true.iloc[i:i + 2] for i in range(0, len(df_true), 2))
+    assert stream.write_chunks(chunks, path) == 5
+
+    df_test = pd.concat(stream.read_chunks(path, chunksize=2), ignore_index=True)
+    pd.testing.assert_frame_equal(df_test, df_true)
+
+
+@pytest.mark.parametrize("extension", ["parquet", "feather"])
+def test_write_chunks_columnar_empty_first_chunk(tmp_path, extension):
+    """Streaming through a columnar file works when clean drops every row of the first chunk."""
+    input_path = tmp_path / "input.csv"
+    path = str(tmp_path / ("data." + extension))
+    pd.DataFrame({"content": ["", "", "a", "b", "c"],
+                  "date": [None, None, "2020-01-01", "2020-01-02", "2020-01-03"],
+                  "retweets": [1, 2, 3, 4, 5]}).to_csv(input_path, index=False)
+    rules = {"drop_empty_content": {"content_column": "content"}}
+    chunks = stream.read_chunks(input_path, chunksize=2)
+    assert stream.write_chunks((clean.clean_data(chunk, rules) for chunk in chunks), path) == 3
+
+    df_test = pd.concat(stream.read_chunks(path, chunksize=2), ignore_index=True)
+    assert df_test["date"].tolist() == ["2020-01-01", "2020-01-02", "2020-01-03"]
+
+    # Only empty chunks give an empty file with the columns of the data
+    chunks = stream.read_chunks(input_path, chunksize=2)
+    assert stream.write_chunks((chunk.iloc[:0] for chunk in chunks), path) == 0
+    assert list(pd.read_parquet(path) if extension == "parquet" else pd.read_feather(path)) == [
+        "content", "date", "retweets"]
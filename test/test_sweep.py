@@ -0,0 +1,63 @@
+import pandas as pd
+import pytest
+import yaml
+
+from src import sweep
+
+
+def test_expand_grid():
+    """Happy path for the expand_grid function."""
+    parameters = {"compile_model.dropout": [0.1, 0.2], "fit_model.epochs": [1, 2, 3]}
+    candidates = sweep.expand_grid(parameters)
+    assert len(candidates) == 6
+    assert candidates[0] == {"compile_model.dropout": 0.1, "fit_model.epochs": 1}
+
+    sampled = sweep.expand_grid(parameters, search="random", samples=4, seed=0)
+    assert len(sampled) == 4
+    assert all(candidate in candidates for candidate in sampled)
+    assert sampled == sweep.expand_grid(parameters, search="random", samples=4, seed=0)
+
+
+def test_expand_grid_other_section():
+    """Unhappy path for the expand_grid function with a parameter outside the swept sections."""
+    with pytest.raises(ValueError):
+        sweep.expand_grid({"train_test_split.test_size": [0.1, 0.2]})
+    with pytest.raises(ValueError):
+        sweep.expand_grid({"fit_model.epochs": [1, 2]}, search="bayesian")
+
+
+def test_apply_parameters():
+    """Happy path for the apply_parameters function."""
+    model_config = {"compile_model": {"lstm_params": {"units": 64}}, "fit_model": {"epochs": 12}}
+    updated = sweep.apply_parameters(model_config, {"compile_model.lstm_params.units": 32,
+                                                    "fit_model.input_pipeline.batch_size": 64})
+    assert updated == {"compile_model": {"lstm_params": {"units": 32}},
+                       "fit_model": {"epochs": 12, "input_pipeline": {"batch_size": 64}}}
+    assert model_config["compile_model"]["lstm_params"]["units"] == 64
+
+
+def test_thread_budget():
+    """Happy path for the thread_budget function."""
+    assert sweep.thread_budget(4, cpu_count=16) == 4
+    assert sweep.thread_budget(3, cpu_count=16) == 5
+    assert sweep.thread_budget(8, cpu_count=2) == 1
+
+
+def test_run_sweep(tmp_path):
+    """Happy path for the run_sweep function."""
+    with open("config/config.yaml", "r") as f:
+        model_config = yaml.load(f, Loader=yaml.FullLoader)["model"]
+    df = pd.DataFrame({"content": ["make america great again", "fake news media",
+                                   "thank you america", "witch hunt"] * 10,
+                       "retweets": [100, 200, 300, 400] * 10})
+    candidates = [{"compile_model.lstm_params.units": 4, "fit_model.epochs": 1,
+                   "fit_model.verbose": 0},
+                  {"compile_model.lstm_params.units": 4, "fit_model.epochs": "one",
+                   "fit_model.verbose": 0}]
+    results = sweep.run_sweep(df, model_config, candidates, str(tmp_path), workers=1)
+    assert len(results) == 2
+    assert results.loc[0, "candidate"] == 0
+    assert results.loc[0, "mape"] >= 0
+    assert results.loc[0, "train_seconds"] > 0
+    # The failed candidate is reported instead of stopping the sweep
+    assert pd.isna(results.loc[1, "mape"]) and results.loc[1, "error"]
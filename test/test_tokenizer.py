@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from src import tokenizer
+
+
+def test_texts_to_padded():
+    """Happy path for the Vocabulary.texts_to_padded method."""
+    vocabulary = tokenizer.Vocabulary(["<OOV>", "great", "people", "country"], oov_token="<OOV>")
+    input_lst = ["Great people!", "great unknown country", ""]
+    output_true = np.array([[2, 3, 0, 0],
+                            [2, 1, 4, 0],
+                            [0, 0, 0, 0]], dtype=np.int32)
+    output_test = vocabulary.texts_to_padded(input_lst, max_length=4, padding="post")
+    np.testing.assert_array_equal(output_test, output_true)
+    assert output_test.dtype == np.int32
+
+
+def test_texts_to_padded_truncate():
+    """Long sequences are truncated from the beginning and padded before, like pad_sequences."""
+    vocabulary = tokenizer.Vocabulary(["great", "people", "country"])
+    input_lst = ["great people country great", "country"]
+    output_true = np.array([[2, 3, 1],
+                            [0, 0, 3]], dtype=np.int32)
+    output_test = vocabulary.texts_to_padded(input_lst, max_length=3)
+    np.testing.assert_array_equal(output_test, output_true)
+
+
+def test_texts_to_padded_wrong_padding():
+    """Unhappy path for the Vocabulary.texts_to_padded method."""
+    vocabulary = tokenizer.Vocabulary(["great"])
+    with pytest.raises(ValueError):
+        vocabulary.texts_to_padded(["great"], max_length=3, padding="middle")
+
+
+def test_load_vocabulary(tmp_path):
+    """A saved vocabulary is loaded once and shared by later calls."""
+    path = str(tmp_path / "vocab.json")
+    tokenizer.Vocabulary(["<OOV>", "great"], oov_token="<OOV>").save(path)
+    vocabulary = tokenizer.load_vocabulary(path)
+    assert tokenizer.load_vocabulary(path) is vocabulary
+    assert vocabulary.word_index == {"<OOV>": 1, "great": 2}